@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+定时分析基准：单进程 vs 并行 worker
+
+用法:
+    python3 benchmarks/bench_analyze.py [--sessions 40] [--workers 1,2,4,8] [--delay 0.2] [--docs 3] [--json]
+
+用 benchmarks/stub_claude.py 代替 claude CLI，每个 session 的分析耗时由 --delay 模拟。
+每种 worker 数都在新的临时 HOME 中运行 scheduled_analyze，直到所有日志分析完，
+报告总耗时、运行次数，以及是否有 session 因并发修改同一文档而丢失。
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, run_script, EN_WORDS
+
+STUB = Path(__file__).parent / "stub_claude.py"
+
+
+def write_logs(logs_dir: Path, n: int, rng: random.Random):
+    day_dir = logs_dir / "2025-01-01"
+    day_dir.mkdir()
+    for i in range(n):
+        session_id = f"{i:08x}"
+        line = json.dumps({"role": "user", "content": " ".join(rng.sample(EN_WORDS, 5))})
+        (day_dir / f"10-{i // 60:02d}-{i % 60:02d}_{session_id}.jsonl").write_text(line + "\n")
+
+
+def run(sessions: int, workers: int, batch_size: int, delay: float, docs: int) -> dict:
+    gangsmem_dir = setup_home()
+    write_logs(gangsmem_dir / "logs", sessions, random.Random(1))
+    (gangsmem_dir / "config.json").write_text(json.dumps({
+        "analyze_workers": workers,
+        "analyze_batch_size": batch_size,
+    }))
+    env = {"CLAUDE_PATH": str(STUB), "STUB_CLAUDE_DELAY": str(delay),
+           "STUB_CLAUDE_DOCS": str(docs)}
+
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        runs += 1
+        result = run_script("scripts/scheduled_analyze.py", env=env)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        if "No pending logs" in result.stdout or runs > sessions:
+            runs -= 1
+            break
+    elapsed = time.perf_counter() - start
+
+    recorded = set()
+    for doc in (gangsmem_dir / "memory").glob("*.md"):
+        match = re.search(r'sources: \[(.*)\]', doc.read_text())
+        recorded.update(s for s in match.group(1).split(", ") if s)
+    return {
+        "workers": workers,
+        "runs": runs,
+        "seconds": round(elapsed, 2),
+        "lost_sessions": sessions - len(recorded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.2, help="每个 session 的模拟分析耗时（秒）")
+    parser.add_argument("--docs", type=int, default=3, help="共享文档数（越少锁竞争越多）")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    home = os.environ.get("HOME")
+    report = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        report.append(run(args.sessions, workers, args.batch_size, args.delay, args.docs))
+    os.environ["HOME"] = home
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"sessions={args.sessions} batch_size={args.batch_size} delay={args.delay}s docs={args.docs}")
+    print(f"{'workers':>8}{'runs':>6}{'seconds':>10}{'lost':>6}")
+    for r in report:
+        print(f"{r['workers']:>8}{r['runs']:>6}{r['seconds']:>10.2f}{r['lost_sessions']:>6}")
+
+
+if __name__ == "__main__":
+    main()
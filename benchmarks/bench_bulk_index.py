@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+索引写入基准：逐条 index_document() vs 批量 index_documents()
+
+用法:
+    python3 benchmarks/bench_bulk_index.py [--docs 10000] [--json]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, make_doc
+
+
+def synthetic_docs(n: int) -> list:
+    """生成 n 篇可直接索引的合成文档"""
+    rng = random.Random(42)
+    docs = []
+    for i in range(n):
+        doc = make_doc(i, rng)
+        docs.append({
+            "id": doc["id"],
+            "title": doc["title"],
+            "keywords": doc["keywords"],
+            "content": doc["body"],
+            "summary": doc["body"][:200],
+        })
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    setup_home()
+    import db
+
+    docs = synthetic_docs(args.docs)
+    report = {"docs": args.docs, "modes": {}}
+
+    def reset():
+        for suffix in ("", "-wal", "-shm"):
+            path = Path(str(db.DB_PATH) + suffix)
+            if path.exists():
+                path.unlink()
+
+    # 原来的方式：每篇文档一个连接、一次提交
+    reset()
+    db.init_db().close()
+    start = time.perf_counter()
+    for doc in docs:
+        db.index_document(doc)
+    report["modes"]["per_doc"] = time.perf_counter() - start
+
+    for name, pragmas in (
+        ("bulk_wal_normal", {"journal_mode": "WAL", "synchronous": "NORMAL"}),
+        ("bulk_delete_full", {"journal_mode": "DELETE", "synchronous": "FULL"}),
+        ("bulk_wal_off", {"journal_mode": "WAL", "synchronous": "OFF"}),
+    ):
+        reset()
+        start = time.perf_counter()
+        with db.IndexWriter(**pragmas) as writer:
+            indexed, failures = writer.index_documents(docs, replace=False)
+        report["modes"][name] = time.perf_counter() - start
+        assert indexed == len(docs) and not failures
+
+    # 批量替换（增量更新路径：先按 id 删除再插入）
+    start = time.perf_counter()
+    db.index_documents(docs[:100])
+    report["modes"]["bulk_replace_100"] = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"docs={args.docs}")
+    baseline = report["modes"]["per_doc"]
+    for name, seconds in report["modes"].items():
+        print(f"{name:<20}{seconds:>10.3f}s{baseline / seconds:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
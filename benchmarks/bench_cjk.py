@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+中文召回基准：旧索引（unicode61 整段中文为一个词） vs cjk 预切分列
+
+用法:
+    python3 benchmarks/bench_cjk.py [--docs 5000] [--queries 200] [--k 5] [--json]
+
+合成文档的正文是不带空格的中文句子夹杂英文单词；每个查询取目标文档中相邻的两个中文词，
+嵌入一句口语化的提问。正文中包含这两个相邻词的文档都算相关文档。
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, EN_WORDS, ZH_WORDS, summarize_ms
+
+
+def make_corpus(n: int, rng: random.Random) -> list:
+    docs = []
+    for i in range(n):
+        sentences = []
+        phrases = []
+        for _ in range(8):
+            words = rng.sample(ZH_WORDS, 4)
+            phrases.append(words)
+            en = " ".join(rng.sample(EN_WORDS, 2))
+            sentences.append(f"{''.join(words)} {en}。")
+        body = "".join(sentences)
+        docs.append({
+            "phrases": phrases,
+            "id": f"doc-{i:06d}",
+            "title": "".join(rng.sample(ZH_WORDS, 2)),
+            "keywords": rng.sample(EN_WORDS, 2),
+            "content": body,
+            "summary": body[:200],
+        })
+    return docs
+
+
+def make_queries(docs: list, n: int, rng: random.Random) -> list:
+    queries = []
+    for _ in range(n):
+        doc = rng.choice(docs)
+        words = rng.choice(doc["phrases"])
+        i = rng.randrange(0, 3)
+        pair = words[i:i + 2]
+        text = f"请问{''.join(pair)}的问题怎么处理"
+        relevant = {d["id"] for d in docs if "".join(pair) in d["content"]}
+        queries.append({"text": text, "relevant": relevant})
+    return queries
+
+
+def build_legacy(path: Path, docs: list):
+    """旧的表结构：没有 cjk 列"""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE VIRTUAL TABLE memories USING fts5(
+            id, title, keywords, content, summary,
+            tokenize='porter unicode61'
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO memories VALUES (?, ?, ?, ?, ?)",
+        [(d["id"], d["title"], " ".join(d["keywords"]), d["content"], d["summary"])
+         for d in docs]
+    )
+    conn.commit()
+    conn.close()
+
+
+def evaluate(path: Path, queries: list, k: int) -> dict:
+    from tokenizer import tokenize, build_fts_query
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    timings = []
+    recall_sum = 0.0
+    hits = 0
+    for q in queries:
+        query = build_fts_query(tokenize(q["text"]), "OR")
+        start = time.perf_counter()
+        try:
+            rows = conn.execute(
+                "SELECT id FROM memories WHERE memories MATCH ? ORDER BY bm25(memories) LIMIT ?",
+                (query, k)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        timings.append(time.perf_counter() - start)
+
+        found = {r[0] for r in rows}
+        relevant = q["relevant"]
+        if relevant:
+            recall_sum += len(found & relevant) / min(k, len(relevant))
+            hits += 1 if found & relevant else 0
+    conn.close()
+
+    return {
+        f"recall@{k}": round(recall_sum / len(queries), 4),
+        "hit_rate": round(hits / len(queries), 4),
+        "latency": summarize_ms(timings),
+        "size_bytes": path.stat().st_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    import db
+
+    rng = random.Random(42)
+    docs = make_corpus(args.docs, rng)
+    queries = make_queries(docs, args.queries, rng)
+
+    legacy_path = gangsmem_dir / "legacy.db"
+    build_legacy(legacy_path, docs)
+
+    with db.IndexWriter() as writer:
+        writer.index_documents(docs, replace=False)
+
+    report = {
+        "docs": args.docs,
+        "queries": args.queries,
+        "legacy": evaluate(legacy_path, queries, args.k),
+        "cjk_column": evaluate(db.DB_PATH, queries, args.k),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"docs={args.docs} queries={args.queries}")
+    print(f"{'index':<12}{'recall@' + str(args.k):>10}{'hit rate':>10}"
+          f"{'p50 (ms)':>10}{'p99 (ms)':>10}{'size (KB)':>12}")
+    for name in ("legacy", "cjk_column"):
+        r = report[name]
+        print(f"{name:<12}{r[f'recall@{args.k}']:>10.3f}{r['hit_rate']:>10.3f}"
+              f"{r['latency']['p50_ms']:>10.2f}{r['latency']['p99_ms']:>10.2f}"
+              f"{r['size_bytes'] / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
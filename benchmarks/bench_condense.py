@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+日志压缩基准：压缩前后的字节数、耗时和确定性
+
+用法:
+    python3 benchmarks/bench_condense.py [--sessions 200] [--turns 20] [--json]
+
+合成带有典型冗余的简化日志（重复提问、长代码块、长调用栈、助手的过渡性短句），
+用 lib/condense.py 压缩，报告：
+    bytes_in / bytes_out / ratio   压缩前后的总字节数
+    p50_ms / max_ms                单个日志的压缩耗时
+    deterministic                  同一输入两次压缩（其中一次在 PYTHONHASHSEED 不同的子进程中）
+                                   输出的哈希是否一致
+另外检查每个日志中的工具列表（used）都保留在摘要中。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import PLUGIN_DIR, EN_WORDS, ZH_WORDS, summarize_ms
+
+TOOLS = ["Read", "Edit", "Write", "Bash", "Grep", "Glob", "WebFetch"]
+CHATTER = ["Let me check the file.", "Now let me run the tests.", "好的，我先看一下配置。",
+           "Perfect!", "让我确认一下。", "I'll update the function now."]
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(EN_WORDS + ZH_WORDS) for _ in range(n))
+
+
+def code_block(rng: random.Random, lines: int) -> str:
+    body = "\n".join(f"    {rng.choice(EN_WORDS)}_{i} = {rng.choice(EN_WORDS)}({i})" for i in range(lines))
+    return f"```python\ndef {rng.choice(EN_WORDS)}():\n{body}\n```"
+
+
+def traceback(rng: random.Random, frames: int) -> str:
+    lines = ["Traceback (most recent call last):"]
+    for i in range(frames):
+        lines.append(f'  File "/app/{rng.choice(EN_WORDS)}.py", line {i * 7 + 3}, in {rng.choice(EN_WORDS)}')
+        lines.append(f"    {rng.choice(EN_WORDS)}({rng.choice(EN_WORDS)})")
+    lines.append(f"ValueError: {sentence(rng, 6)}")
+    return "\n".join(lines)
+
+
+def make_log(rng: random.Random, turns: int) -> bytes:
+    """一个 session 的简化日志（SessionEnd 写入的格式）"""
+    records, asked, used_all = [], [], set()
+    for _ in range(turns):
+        if asked and rng.random() < 0.3:
+            # 重复或几乎相同的提问（改一下大小写和标点）
+            question = rng.choice(asked).upper().rstrip("?") + "?"
+        else:
+            question = sentence(rng, rng.randint(8, 30))
+            if rng.random() < 0.3:
+                question += "\n\n" + traceback(rng, rng.randint(10, 30))
+            asked.append(question)
+        records.append({"role": "user", "content": question})
+
+        used = sorted(rng.sample(TOOLS, rng.randint(0, 3)))
+        used_all.update(used)
+        parts = [rng.choice(CHATTER), sentence(rng, rng.randint(20, 60))]
+        if rng.random() < 0.5:
+            parts.append(code_block(rng, rng.randint(10, 120)))
+        parts.append(rng.choice(CHATTER))
+        record = {"role": "assistant", "content": "\n\n".join(parts)}
+        if used:
+            record["used"] = used
+        records.append(record)
+    records.append({"type": "session_summary", "tools": sorted(used_all), "skills": [], "mcp": []})
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+
+
+def digest_hash(logs: list) -> str:
+    from condense import condense_log
+
+    h = hashlib.sha256()
+    for i, data in enumerate(logs):
+        h.update(condense_log(data, f"s{i:05d}"))
+    return h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    # 内部使用：在子进程中重新生成同样的日志并输出摘要哈希
+    parser.add_argument("--hash-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+    from condense import condense_log
+
+    rng = random.Random(args.seed)
+    logs = [make_log(rng, args.turns) for _ in range(args.sessions)]
+    if args.hash_only:
+        print(digest_hash(logs))
+        return
+
+    timings, bytes_out, tools_kept = [], 0, True
+    for i, data in enumerate(logs):
+        start = time.perf_counter()
+        digest = condense_log(data, f"s{i:05d}")
+        timings.append(time.perf_counter() - start)
+        bytes_out += len(digest)
+        for line in data.splitlines():
+            for tool in json.loads(line).get("used", []):
+                tools_kept = tools_kept and tool.encode() in digest
+
+    env = dict(os.environ, PYTHONHASHSEED="12345")
+    child = subprocess.run(
+        [sys.executable, __file__, "--hash-only", "--sessions", str(args.sessions),
+         "--turns", str(args.turns), "--seed", str(args.seed)],
+        capture_output=True, text=True, env=env, check=True
+    )
+    first = digest_hash(logs)
+
+    bytes_in = sum(len(data) for data in logs)
+    report = {
+        "sessions": args.sessions,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "ratio": round(bytes_out / bytes_in, 4),
+        **summarize_ms(timings),
+        "deterministic": first == digest_hash(logs) == child.stdout.strip(),
+        "tools_kept": tools_kept,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"sessions={report['sessions']} in={bytes_in / 1024:.1f} KB out={bytes_out / 1024:.1f} KB "
+          f"ratio={report['ratio']:.1%}")
+    print(f"per log: p50={report['p50_ms']:.2f} ms max={report['max_ms']:.2f} ms")
+    print(f"deterministic={report['deterministic']} tools_kept={report['tools_kept']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+inject_memory.py 延迟基准：进程内搜索 vs 常驻搜索进程
+
+用法:
+    python3 benchmarks/bench_daemon.py [--docs 2000] [--runs 100] [--json]
+
+两种模式都以子进程方式运行真实的 hook（包含 Python 冷启动），
+输出 p50/p99 延迟。
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, write_corpus, make_prompts, run_script, summarize_ms
+
+
+def time_hook(prompts: list) -> list:
+    """逐个 prompt 运行 hook，返回每次耗时（秒）"""
+    timings = []
+    for prompt in prompts:
+        payload = json.dumps({"session_id": "bench", "prompt": prompt, "cwd": "/tmp"},
+                             ensure_ascii=False)
+        start = time.perf_counter()
+        run_script("hooks/inject_memory.py", input_text=payload)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    write_corpus(gangsmem_dir / "memory", args.docs)
+    run_script("scripts/rebuild_index.py")
+
+    prompts = make_prompts(args.runs)
+
+    # 预热文件系统缓存
+    time_hook(prompts[:5])
+    in_process = time_hook(prompts)
+
+    # 常驻进程在 use_daemon 关闭时不提供搜索
+    (gangsmem_dir / "config.json").write_text(json.dumps({"use_daemon": True}))
+    run_script("scripts/search_daemon.py", "start")
+    try:
+        time_hook(prompts[:5])
+        with_daemon = time_hook(prompts)
+    finally:
+        run_script("scripts/search_daemon.py", "stop")
+
+    report = {
+        "docs": args.docs,
+        "in_process": summarize_ms(in_process),
+        "daemon": summarize_ms(with_daemon),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"docs={args.docs} runs={args.runs}")
+    print(f"{'mode':<12}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+    for mode in ("in_process", "daemon"):
+        stats = report[mode]
+        print(f"{mode:<12}{stats['p50_ms']:>12.2f}{stats['p99_ms']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
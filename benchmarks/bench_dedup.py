@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+近似重复检测基准：MinHash + LSH 的耗时随文档数的变化，以及与两两比较的对比
+
+用法:
+    python3 benchmarks/bench_dedup.py [--sizes 1000,5000,10000,50000] [--dup-rate 0.05] [--no-numpy] [--json]
+
+合成文档（benchmarks/common.make_doc），其中 dup-rate 比例的文档是另一篇文档改动几个词后的副本。报告：
+    signature_s / lsh_s    计算签名、分桶并确认相似对的耗时
+    candidate_pairs        LSH 给出的候选对数（只有这些需要比较相似度）
+    recall / precision     对注入的重复对的召回率和准确率
+    all_pairs_s            两两比较签名的耗时（文档数不超过 --all-pairs-max 时实测，否则按平方外推）
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import PLUGIN_DIR, make_doc
+
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+
+# 副本中替换的词数（正文约 120 个词）
+EDITS = 3
+
+
+def make_corpus(n: int, dup_rate: float, seed: int = 42):
+    """返回 (文本列表, 注入的重复对集合)"""
+    rng = random.Random(seed)
+    n_dups = int(n * dup_rate)
+    texts = []
+    for i in range(n - n_dups):
+        doc = make_doc(i, rng)
+        texts.append(f"{doc['title']}\n{' '.join(doc['keywords'])}\n{doc['body']}")
+    pairs = set()
+    for _ in range(n_dups):
+        source = rng.randrange(n - n_dups)
+        words = texts[source].split(" ")
+        for _ in range(EDITS):
+            words[rng.randrange(len(words))] = rng.choice(["fixed", "补充", "updated", "注意"])
+        pairs.add((source, len(texts)))
+        texts.append(" ".join(words))
+    return texts, pairs
+
+
+def all_pairs(index, threshold: float) -> int:
+    """两两比较签名（对照）"""
+    found = 0
+    for i in range(index.count):
+        for j in range(i + 1, index.count):
+            if index.similarity(i, j) >= threshold:
+                found += 1
+    return found
+
+
+def run(n: int, dup_rate: float, threshold: float, use_numpy: bool, all_pairs_max: int) -> dict:
+    from dedup import MinHashIndex
+
+    texts, injected = make_corpus(n, dup_rate)
+
+    start = time.perf_counter()
+    index = MinHashIndex(texts, threshold, use_numpy=use_numpy)
+    signature_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = {(i, j) for i, j, _ in index.similar_pairs()}
+    lsh_s = time.perf_counter() - start
+
+    # 同一篇文档的两个副本之间也是重复对
+    by_source = {}
+    for source, dup in injected:
+        by_source.setdefault(source, [source]).append(dup)
+    expected = {(a, b) for group in by_source.values() for a in group for b in group if a < b}
+
+    sample = min(n, all_pairs_max)
+    start = time.perf_counter()
+    all_pairs(MinHashIndex(texts[:sample], threshold, use_numpy=use_numpy), threshold)
+    all_pairs_s = (time.perf_counter() - start) * (n / sample) ** 2
+
+    return {
+        "docs": n,
+        "numpy": index.use_numpy,
+        "signature_s": round(signature_s, 3),
+        "lsh_s": round(lsh_s, 3),
+        "candidate_pairs": index.stats["candidate_pairs"],
+        "similar_pairs": len(found),
+        "recall": round(len(found & expected) / len(expected), 4) if expected else 1.0,
+        "precision": round(len(found & expected) / len(found), 4) if found else 1.0,
+        "all_pairs_s": round(all_pairs_s, 1),
+        "all_pairs_measured": sample == n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,5000,10000,50000")
+    parser.add_argument("--dup-rate", type=float, default=0.05)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--all-pairs-max", type=int, default=1000)
+    parser.add_argument("--no-numpy", action="store_true", help="强制使用纯 Python 实现")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    results = [run(int(n), args.dup_rate, args.threshold, not args.no_numpy, args.all_pairs_max)
+               for n in args.sizes.split(",")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"numpy={results[0]['numpy']} threshold={args.threshold} dup_rate={args.dup_rate}")
+    print(f"{'docs':>7}{'sig (s)':>9}{'lsh (s)':>9}{'cand':>8}{'recall':>8}{'prec':>7}{'all-pairs (s)':>15}")
+    for r in results:
+        mark = "" if r["all_pairs_measured"] else "*"
+        print(f"{r['docs']:>7}{r['signature_s']:>9.2f}{r['lsh_s']:>9.2f}{r['candidate_pairs']:>8}"
+              f"{r['recall']:>8.1%}{r['precision']:>7.1%}{r['all_pairs_s']:>14.1f}{mark}")
+    print("* extrapolated from --all-pairs-max docs")
+
+
+if __name__ == "__main__":
+    main()
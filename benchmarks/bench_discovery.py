@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+待分析日志发现基准：rglob + stat 全量扫描 vs 高水位增量扫描
+
+用法:
+    python3 benchmarks/bench_discovery.py [--days 365] [--per-day 30] [--runs 5] [--json]
+
+合成一年的日志目录，历史日志全部标记为已分析，然后只在最新的日期写入少量新日志，
+模拟每晚定时分析的场景。报告：
+    legacy       原实现：rglob("*.jsonl") + 每个文件 stat + 排序 + 列表查找
+    full_scan    第一次运行或 --rescan：扫描全部分区并登记到台账
+    watermarked  之后的运行：只扫描高水位前一天及之后的分区
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import date, timedelta
+from itertools import islice
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, summarize_ms
+
+NEW_LOGS = 5
+
+
+def write_logs(logs_dir: Path, days: int, per_day: int) -> str:
+    """写入合成日志目录，返回最新的日期"""
+    start = date(2025, 1, 1)
+    day = start
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat()
+        day_dir = logs_dir / day
+        day_dir.mkdir()
+        for s in range(per_day):
+            name = f"{s // 60:02d}-{s % 60:02d}-00_{d:04d}{s:04d}-aaaa-bbbb.jsonl"
+            (day_dir / name).write_text('{"role": "user", "content": "x"}\n')
+    return day
+
+
+def legacy_discover(logs_dir: Path, analyzed: list) -> list:
+    """原来的 get_pending_logs"""
+    pending = []
+    for log_file in logs_dir.rglob("*.jsonl"):
+        session_id = log_file.stem.split("_")[-1][:8]
+        if session_id not in analyzed:
+            pending.append((log_file, session_id))
+    pending.sort(key=lambda x: x[0].stat().st_mtime)
+    return pending
+
+
+def discover(ledger, logs_dir: Path, rescan: bool) -> list:
+    from logstore import get_log
+
+    ledger.discover(logs_dir, rescan=rescan)
+    pending = ((get_log(key, logs_dir), sid) for key, sid in ledger.iter_pending())
+    return list(islice(pending, 5))
+
+
+def timed(fn, runs: int, *args) -> dict:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return summarize_ms(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-day", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    logs_dir = gangsmem_dir / "logs"
+    newest = write_logs(logs_dir, args.days, args.per_day)
+
+    from ledger import Ledger
+
+    # 历史日志全部已分析
+    ledger = Ledger()
+    ledger.discover(logs_dir)
+    ledger.mark_done([key for key, _ in ledger.iter_pending()])
+    analyzed = [p.stem.split("_")[-1][:8] for p in logs_dir.rglob("*.jsonl")]
+
+    for i in range(NEW_LOGS):
+        (logs_dir / newest / f"23-59-{i:02d}_new{i:05d}-cccc.jsonl").write_text("{}\n")
+
+    report = {
+        "days": args.days,
+        "logs": args.days * args.per_day + NEW_LOGS,
+        "legacy": timed(legacy_discover, args.runs, logs_dir, analyzed),
+        "full_scan": timed(discover, args.runs, ledger, logs_dir, True),
+        "watermarked": timed(discover, args.runs, ledger, logs_dir, False),
+    }
+    found = discover(ledger, logs_dir, False)
+    report["pending_found"] = len(found)
+    ledger.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"days={report['days']} logs={report['logs']} new={NEW_LOGS} found={report['pending_found']}")
+    print(f"{'mode':<14}{'p50 (ms)':>10}{'max (ms)':>10}")
+    for mode in ("legacy", "full_scan", "watermarked"):
+        r = report[mode]
+        print(f"{mode:<14}{r['p50_ms']:>10.2f}{r['max_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
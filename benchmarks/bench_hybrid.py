@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+混合检索基准：仅 bm25 vs bm25 + 向量融合（需要 numpy）
+
+用法:
+    python3 benchmarks/bench_hybrid.py [--docs 1000,10000] [--queries 200] [--min-score 0.1] [--noise-margin 1.5] [--json]
+
+每个规模生成主题记忆库（common.write_topic_corpus）并开启 vector_search 重建索引，
+然后用三组 prompt 比较两种模式：
+    exact      使用目标文档的主题词（两种模式都应该找到）
+    variant    同样的英文主题词，但有拼写错误或被连写，不含中文主题词，bm25 没有相同的词
+    unrelated  记忆库中没有的伪词，统计被注入了结果的比例（越低越好）
+报告 recall@3（目标文档在注入结果中的比例）和进程内检索的 p50/p95 耗时（与常驻搜索进程一致，
+不含 Python 启动）；另外单独报告 hook 进程中 import numpy 并打开向量索引的耗时。
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, write_topic_corpus, make_vocabulary, run_script, summarize_ms
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """删掉或交换一个字符"""
+    if len(word) <= 4:
+        return word + word[-1]
+    i = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def make_queries(docs: list, vocab_size: int, n: int, rng: random.Random) -> dict:
+    targets = rng.sample(docs, min(n, len(docs)))
+    exact, variant = [], []
+    for doc in targets:
+        en = doc["topic_en"]
+        exact.append((doc["id"], f"{en[0]} {en[1]} {doc['topic_zh']}的问题怎么处理"))
+        if rng.random() < 0.5:
+            words = [typo(w, rng) for w in en]
+        else:
+            words = [en[0] + en[1], typo(en[2], rng)]
+        variant.append((doc["id"], f"{' '.join(words)} 的问题怎么处理"))
+    # 词表之外的伪词：与记忆库的词有相同的音节，但没有任何文档包含它们
+    outside = make_vocabulary(vocab_size + 3 * len(targets))[vocab_size:]
+    unrelated = [(None, f"{' '.join(outside[3 * i:3 * i + 3])} 的问题怎么处理") for i in range(len(targets))]
+    return {"exact": exact, "variant": variant, "unrelated": unrelated}
+
+
+def evaluate(queries: list, config: dict) -> dict:
+    from db import get_read_connection
+    from retrieval import find_memories
+
+    conn = get_read_connection()
+    timings, hits, injected = [], 0, 0
+    for target, prompt in queries:
+        start = time.perf_counter()
+        results = find_memories(prompt, config, conn=conn)
+        timings.append(time.perf_counter() - start)
+        injected += bool(results)
+        hits += any(r["id"] == target for r in results)
+    conn.close()
+    stats = summarize_ms(timings)
+    return {
+        "recall@3": round(hits / len(queries), 4),
+        "injected": round(injected / len(queries), 4),
+        "p50_ms": stats["p50_ms"],
+        "p95_ms": stats["p95_ms"],
+    }
+
+
+def cold_open_ms() -> float:
+    """新进程中 import numpy 并打开向量索引的耗时"""
+    code = ("import sys, time; t = time.perf_counter(); sys.path.insert(0, 'lib'); import vectors; "
+            "vectors.load_cached(); print((time.perf_counter() - t) * 1000)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=str(Path(__file__).parent.parent))
+    return round(float(result.stdout.strip() or 0), 1)
+
+
+def run(gangsmem_dir: Path, n: int, n_queries: int, min_score: float, noise_margin: float) -> dict:
+    # 各个规模共用同一个 HOME（lib 模块在导入时就确定了路径），每次换掉整个记忆库后全量重建
+    memory_dir = gangsmem_dir / "memory"
+    for path in memory_dir.glob("*.md"):
+        path.unlink()
+    vocab_size = max(20000, n * 2)
+    docs = write_topic_corpus(memory_dir, n, vocab_size=vocab_size)
+    (gangsmem_dir / "config.json").write_text(json.dumps({
+        "vector_search": True, "vector_min_score": min_score,
+        "vector_noise_margin": noise_margin,
+    }))
+    start = time.perf_counter()
+    result = run_script("scripts/rebuild_index.py", "--full")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    build_s = time.perf_counter() - start
+
+    from config import get_config
+
+    config = get_config()
+    queries = make_queries(docs, vocab_size, n_queries, random.Random(11))
+    report = {"docs": n, "rebuild_s": round(build_s, 2), "cold_open_ms": cold_open_ms()}
+    for mode, vector in (("bm25", False), ("hybrid", True)):
+        mode_config = dict(config, vector_search=vector)
+        report[mode] = {name: evaluate(qs, mode_config) for name, qs in queries.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", default="1000,10000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise-margin", type=float, default=1.5, help="vector_noise_margin")
+    parser.add_argument("--min-score", type=float, default=0.1, help="vector_min_score")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("numpy is required for vector search", file=sys.stderr)
+        sys.exit(1)
+
+    gangsmem_dir = setup_home()
+    reports = [run(gangsmem_dir, int(n), args.queries, args.min_score, args.noise_margin)
+               for n in args.docs.split(",")]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    for r in reports:
+        print(f"docs={r['docs']} rebuild={r['rebuild_s']}s cold numpy+open={r['cold_open_ms']} ms")
+        print(f"  {'mode':<8}{'queries':<11}{'recall@3':>9}{'injected':>10}{'p50 ms':>9}{'p95 ms':>9}")
+        for mode in ("bm25", "hybrid"):
+            for name, m in r[mode].items():
+                print(f"  {mode:<8}{name:<11}{m['recall@3']:>9.1%}{m['injected']:>10.1%}"
+                      f"{m['p50_ms']:>9.2f}{m['p95_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
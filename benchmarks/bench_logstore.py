@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+日志存储基准：每个 session 一个文件 vs 按天归档的压缩日志
+
+用法:
+    python3 benchmarks/bench_logstore.py [--days 180] [--per-day 40] [--json]
+
+报告文件数、磁盘占用（按 4 KiB 块计）、列出全部日志的耗时和随机读取单个 session 的耗时。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, EN_WORDS, ZH_WORDS, summarize_ms
+
+BLOCK = 4096
+
+
+def write_logs(logs_dir: Path, days: int, per_day: int, rng: random.Random):
+    """写入合成的 session 日志（格式与 session_end.save_log 一致）"""
+    start = date(2025, 1, 1)
+    for d in range(days):
+        day_dir = logs_dir / (start + timedelta(days=d)).isoformat()
+        day_dir.mkdir()
+        for s in range(per_day):
+            lines = []
+            for turn in range(rng.randint(3, 12)):
+                lines.append({"role": "user", "ts": f"t{turn}",
+                              "content": f"{rng.choice(ZH_WORDS)} {rng.choice(EN_WORDS)} 怎么处理？"})
+                lines.append({"role": "assistant", "ts": f"t{turn}",
+                              "content": " ".join(rng.choice(EN_WORDS + ZH_WORDS) for _ in range(60)),
+                              "tools": ["Read", "Edit"]})
+            name = f"{s // 3600:02d}-{s // 60 % 60:02d}-{s % 60:02d}_{rng.getrandbits(32):08x}.jsonl"
+            with open(day_dir / name, "w", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def disk_usage(logs_dir: Path) -> dict:
+    files = [p for p in logs_dir.rglob("*") if p.is_file()]
+    sizes = [p.stat().st_size for p in files]
+    return {
+        "files": len(files),
+        "bytes": sum(sizes),
+        "disk_bytes": sum((s + BLOCK - 1) // BLOCK * BLOCK for s in sizes),
+    }
+
+
+def measure(logs_dir: Path, rng: random.Random, reads: int) -> dict:
+    from logstore import iter_logs, read_log
+
+    start = time.perf_counter()
+    entries = list(iter_logs(logs_dir))
+    list_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for entry in rng.sample(entries, min(reads, len(entries))):
+        start = time.perf_counter()
+        read_log(entry, logs_dir)
+        timings.append(time.perf_counter() - start)
+
+    report = disk_usage(logs_dir)
+    report["logs"] = len(entries)
+    report["list_ms"] = round(list_ms, 2)
+    report["read"] = summarize_ms(timings)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--per-day", type=int, default=40)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    logs_dir = gangsmem_dir / "logs"
+    write_logs(logs_dir, args.days, args.per_day, random.Random(5))
+
+    from logstore import roll_logs
+
+    report = {"files": measure(logs_dir, random.Random(9), args.reads)}
+    start = time.perf_counter()
+    roll_logs(logs_dir, today="2100-01-01")
+    report["roll_seconds"] = round(time.perf_counter() - start, 2)
+    report["rolled"] = measure(logs_dir, random.Random(9), args.reads)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"days={args.days} per_day={args.per_day} roll={report['roll_seconds']}s")
+    print(f"{'layout':<8}{'logs':>8}{'files':>8}{'MB':>8}{'disk MB':>9}{'list ms':>9}{'read p50':>10}{'read p99':>10}")
+    for layout in ("files", "rolled"):
+        r = report[layout]
+        print(f"{layout:<8}{r['logs']:>8}{r['files']:>8}{r['bytes'] / 1e6:>8.1f}{r['disk_bytes'] / 1e6:>9.1f}"
+              f"{r['list_ms']:>9.1f}{r['read']['p50_ms']:>10.3f}{r['read']['p99_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
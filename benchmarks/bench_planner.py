@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+查询规划基准：不同 prompt 长度下，全部词 OR vs IDF 裁剪后的查询延迟
+
+用法:
+    python3 benchmarks/bench_planner.py [--docs 5000] [--runs 30] [--json]
+
+延迟包含分词、查询规划（读取 memories_vocab）和 MATCH。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, write_corpus, EN_WORDS, ZH_WORDS, summarize_ms
+
+PROMPT_LENGTHS = [20, 100, 500, 2000, 8000]
+
+
+def make_prompt(length: int, rng: random.Random) -> str:
+    """生成大约 length 个字符的中英混合 prompt（模拟粘贴的长文本）"""
+    parts = []
+    size = 0
+    while size < length:
+        if rng.random() < 0.5:
+            word = rng.choice(ZH_WORDS) + rng.choice(ZH_WORDS)
+        else:
+            word = rng.choice(EN_WORDS) + " "
+        parts.append(word)
+        size += len(word)
+    return "".join(parts)[:length]
+
+
+def run(prompts: list, planned: bool, conn, config: dict) -> dict:
+    from db import search
+    from planner import plan_query
+    from tokenizer import tokenize, build_fts_query
+
+    timings = []
+    terms = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        tokens = tokenize(prompt)
+        if planned:
+            tokens = plan_query(conn, tokens, config)
+        query = build_fts_query(tokens, "OR")
+        if query:
+            search(query, limit=3, conn=conn)
+        timings.append(time.perf_counter() - start)
+        terms.append(len(tokens))
+    stats = summarize_ms(timings)
+    stats["avg_terms"] = round(sum(terms) / len(terms), 1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    write_corpus(gangsmem_dir / "memory", args.docs)
+
+    import rebuild_index
+    from config import DEFAULT_CONFIG
+    from db import get_read_connection
+
+    rebuild_index.rebuild_index(full=True)
+    conn = get_read_connection()
+
+    rng = random.Random(3)
+    report = {"docs": args.docs, "lengths": {}}
+    for length in PROMPT_LENGTHS:
+        prompts = [make_prompt(length, rng) for _ in range(args.runs)]
+        report["lengths"][length] = {
+            "all_terms": run(prompts, False, conn, DEFAULT_CONFIG),
+            "planned": run(prompts, True, conn, DEFAULT_CONFIG),
+        }
+    conn.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"docs={args.docs} runs={args.runs}")
+    print(f"{'chars':>6}  {'mode':<10}{'terms':>8}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+    for length, modes in report["lengths"].items():
+        for mode, stats in modes.items():
+            print(f"{length:>6}  {mode:<10}{stats['avg_terms']:>8}"
+                  f"{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+检索基准：注入路径的召回质量和延迟
+
+用法:
+    python3 benchmarks/bench_retrieval.py [--sizes 1000,10000,100000] [--queries 200] [--k 3]
+                                          [--hook] [--hook-queries 50] [--daemon]
+                                          [--output result.json] [--compare baseline.json] [--json]
+
+每个规模生成中英混合的主题记忆库（common.write_topic_corpus），全量重建索引后，
+用带标注（目标文档）的几组 prompt 走真实的检索流程（retrieval.find_memories：
+tokenize -> plan_query -> build_fts_query -> search，使用当前的 config 默认值）：
+    en      两个英文主题词组成的问句
+    zh      中文主题词组成的问句
+    mixed   中文主题词 + 一个英文主题词
+    long    约 1500 字符的粘贴内容（日志、代码），主题词夹在其中
+    none    记忆库中没有的词，不应注入任何结果（只统计 injected 比例）
+报告 recall@1、recall@k、MRR（前 10 个结果）、injected（有结果的比例）和 p50/p95/p99 延迟，
+以及建索引耗时和 search.db 大小。
+
+--hook 另外以子进程方式运行真实的 hooks/inject_memory.py（包含 Python 冷启动，--daemon 时
+先启动常驻搜索进程），从输出的标题判断命中，报告同样的指标。
+
+--output 把结果写成 JSON，--compare 与之前保存的 JSON 逐项比较（例如改动分词或排序前后各跑一次）。
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import (PLUGIN_DIR, setup_home, write_topic_corpus, make_vocabulary, run_script,
+                    summarize_ms)
+
+RESULT_VERSION = 1
+MRR_DEPTH = 10
+ZH_RATIO = 0.3
+LONG_PROMPT_CHARS = 1500
+QUERY_SETS = ("en", "zh", "mixed", "long", "none")
+# 注入文本中每条结果的标题行："[1] 标题"
+TITLE_LINE = re.compile(r"^\[\d+\] (.*)$", re.MULTILINE)
+
+
+def make_queries(docs: list, vocab_size: int, n: int, rng: random.Random) -> dict:
+    """生成带标注的 prompt：{集合名: [(目标文档 id 或 None, prompt)]}"""
+    targets = rng.sample(docs, min(n, len(docs)))
+    filler = make_vocabulary(2000)
+    sets = {name: [] for name in QUERY_SETS}
+    for doc in targets:
+        en, zh = doc["topic_en"], doc["topic_zh"]
+        sets["en"].append((doc["id"], f"how do I fix the {en[0]} {en[1]} error"))
+        sets["zh"].append((doc["id"], f"{zh}的问题怎么解决"))
+        sets["mixed"].append((doc["id"], f"{zh}里的 {en[2]} 怎么配置"))
+
+        words = []
+        while sum(len(w) + 1 for w in words) < LONG_PROMPT_CHARS:
+            words.append(rng.choice(filler))
+        for word in (en[0], en[1], zh):
+            words.insert(rng.randrange(len(words)), word)
+        sets["long"].append((doc["id"], "下面的日志是什么问题？\n" + " ".join(words)))
+
+    # 词表之外的伪词：与记忆库的词有相同的音节，但没有任何文档包含它们
+    outside = make_vocabulary(vocab_size + 2 * len(targets))[vocab_size:]
+    sets["none"] = [(None, f"how do I fix the {outside[2 * i]} {outside[2 * i + 1]} error")
+                    for i in range(len(targets))]
+    return sets
+
+
+def score(ranked_ids: list, target, k: int) -> dict:
+    """单个 prompt 的命中情况"""
+    rank = ranked_ids.index(target) + 1 if target in ranked_ids else None
+    return {
+        "hit@1": rank == 1,
+        "hit@k": rank is not None and rank <= k,
+        "rr": 1.0 / rank if rank else 0.0,
+        "injected": bool(ranked_ids),
+    }
+
+
+def summarize(scores: list, timings: list, labelled: bool, k: int) -> dict:
+    n = len(scores)
+    report = {"n": n, "injected": round(sum(s["injected"] for s in scores) / n, 4)}
+    if labelled:
+        report["recall@1"] = round(sum(s["hit@1"] for s in scores) / n, 4)
+        report[f"recall@{k}"] = round(sum(s["hit@k"] for s in scores) / n, 4)
+        report["mrr"] = round(sum(s["rr"] for s in scores) / n, 4)
+    stats = summarize_ms(timings)
+    report.update({key: stats[key] for key in ("p50_ms", "p95_ms", "p99_ms")})
+    return report
+
+
+def evaluate_in_process(queries: dict, config: dict, k: int) -> dict:
+    """进程内调用 find_memories（与常驻搜索进程中的路径相同）"""
+    from db import get_read_connection
+    from retrieval import find_memories
+
+    config = dict(config, max_inject_results=max(k, MRR_DEPTH))
+    conn = get_read_connection()
+    # 预热：页缓存、分词器和查询规划的缓存
+    for _, prompt in queries["en"][:20]:
+        find_memories(prompt, config, conn=conn)
+
+    report = {}
+    for name, items in queries.items():
+        scores, timings = [], []
+        for target, prompt in items:
+            start = time.perf_counter()
+            results = find_memories(prompt, config, conn=conn)
+            timings.append(time.perf_counter() - start)
+            scores.append(score([r["id"] for r in results], target, k))
+        report[name] = summarize(scores, timings, name != "none", k)
+    conn.close()
+    return report
+
+
+def evaluate_hook(queries: dict, docs: list, gangsmem_dir: Path, k: int, n: int, daemon: bool) -> dict:
+    """以子进程运行 hooks/inject_memory.py，按输出中的标题判断命中"""
+    config_path = gangsmem_dir / "config.json"
+    config = json.loads(config_path.read_text()) if config_path.exists() else {}
+    config_path.write_text(json.dumps(dict(config, max_inject_results=max(k, MRR_DEPTH),
+                                           max_inject_chars=100000, use_daemon=daemon)))
+    ids_by_title = {doc["title"]: doc["id"] for doc in docs}
+
+    if daemon:
+        run_script("scripts/search_daemon.py", "start")
+    try:
+        report = {}
+        for name, items in queries.items():
+            scores, timings = [], []
+            for target, prompt in items[:n]:
+                payload = json.dumps({"session_id": "bench", "prompt": prompt, "cwd": "/tmp"},
+                                     ensure_ascii=False)
+                start = time.perf_counter()
+                result = run_script("hooks/inject_memory.py", input_text=payload)
+                timings.append(time.perf_counter() - start)
+                ranked = [ids_by_title.get(t.strip()) for t in TITLE_LINE.findall(result.stdout)]
+                scores.append(score(ranked, target, k))
+            report[name] = summarize(scores, timings, name != "none", k)
+        return report
+    finally:
+        if daemon:
+            run_script("scripts/search_daemon.py", "stop")
+        config_path.write_text(json.dumps(config))
+
+
+def run(gangsmem_dir: Path, n: int, args) -> dict:
+    # 各个规模共用同一个 HOME（lib 模块在导入时就确定了路径），每次换掉整个记忆库后全量重建
+    memory_dir = gangsmem_dir / "memory"
+    for path in memory_dir.glob("*.md"):
+        path.unlink()
+    vocab_size = max(20000, n * 2)
+    start = time.perf_counter()
+    docs = write_topic_corpus(memory_dir, n, vocab_size=vocab_size, zh_ratio=ZH_RATIO)
+    generate_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = run_script("scripts/rebuild_index.py", "--full")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    build_s = time.perf_counter() - start
+
+    from config import get_config
+    from db import DB_PATH
+
+    queries = make_queries(docs, vocab_size, args.queries, random.Random(11))
+    report = {
+        "docs": n,
+        "generate_s": round(generate_s, 2),
+        "rebuild_s": round(build_s, 2),
+        "index_bytes": DB_PATH.stat().st_size,
+        "in_process": evaluate_in_process(queries, get_config(), args.k),
+    }
+    if args.hook:
+        report["hook"] = evaluate_hook(queries, docs, gangsmem_dir, args.k, args.hook_queries, args.daemon)
+    return report
+
+
+def git_revision() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(PLUGIN_DIR),
+                            capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def compare(current: dict, baseline: dict):
+    """逐项打印与基线的差异（只比较两次都有的规模和指标）"""
+    print(f"compare {baseline.get('revision', '?')} -> {current.get('revision', '?')}")
+    if baseline.get("queries") != current.get("queries") or baseline.get("k") != current.get("k"):
+        print(f"  note: baseline used queries={baseline.get('queries')} k={baseline.get('k')}")
+    base_sizes = {r["docs"]: r for r in baseline.get("sizes", [])}
+    for r in current["sizes"]:
+        base = base_sizes.get(r["docs"])
+        if base is None:
+            continue
+        print(f"docs={r['docs']}  index {base['index_bytes']:,} -> {r['index_bytes']:,} bytes  "
+              f"rebuild {base['rebuild_s']} -> {r['rebuild_s']} s")
+        for mode in ("in_process", "hook"):
+            for name, metrics in r.get(mode, {}).items():
+                old = base.get(mode, {}).get(name)
+                if not old:
+                    continue
+                deltas = []
+                for key, value in metrics.items():
+                    if key == "n" or key not in old:
+                        continue
+                    diff = value - old[key]
+                    deltas.append(f"{key} {old[key]} -> {value} ({diff:+.4g})")
+                print(f"  {mode:<11}{name:<7}" + ", ".join(deltas))
+
+
+def print_report(report: dict, k: int):
+    print(f"revision={report['revision']} sqlite={report['sqlite']} k={k}")
+    for r in report["sizes"]:
+        print(f"docs={r['docs']} rebuild={r['rebuild_s']}s index={r['index_bytes'] / 1e6:.1f} MB")
+        print(f"  {'mode':<11}{'queries':<8}{'R@1':>7}{f'R@{k}':>7}{'MRR':>7}{'inject':>8}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for mode in ("in_process", "hook"):
+            for name, m in r.get(mode, {}).items():
+                recall = (f"{m['recall@1']:>7.1%}{m[f'recall@{k}']:>7.1%}{m['mrr']:>7.3f}"
+                          if "mrr" in m else f"{'-':>7}{'-':>7}{'-':>7}")
+                print(f"  {mode:<11}{name:<8}{recall}{m['injected']:>8.1%}"
+                      f"{m['p50_ms']:>9.2f}{m['p95_ms']:>9.2f}{m['p99_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200, help="每组 prompt 数")
+    parser.add_argument("--k", type=int, default=3, help="recall@k（默认与 max_inject_results 相同）")
+    parser.add_argument("--hook", action="store_true", help="另外以子进程运行 inject_memory.py")
+    parser.add_argument("--hook-queries", type=int, default=50, help="--hook 时每组运行的 prompt 数")
+    parser.add_argument("--daemon", action="store_true", help="--hook 时先启动常驻搜索进程")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 比较")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    report = {
+        "version": RESULT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "queries": args.queries,
+        "k": args.k,
+        "sizes": [run(gangsmem_dir, int(n), args) for n in args.sizes.split(",")],
+    }
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.k)
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+候选文档路由基准：用本地索引为日志找候选文档的召回率、耗时和 prompt 体积
+
+用法:
+    python3 benchmarks/bench_routing.py [--docs 2000] [--logs 200] [--top-k 3] [--json]
+
+合成记忆库和日志：每个日志围绕一篇目标文档展开（提到标题中的词和正文中的一部分词，
+夹杂无关的词和助手的过渡性短句）。报告：
+    recall@k          目标文档出现在该日志的 top_k 候选中的比例
+    p50_ms / p95_ms   为一个日志查找候选的耗时
+    docs_listed       不做路由时模型需要从中判断的文档数（Glob 整个 memory 目录）与路由后的候选数
+    prompt_bytes      候选列表在 prompt 中的字节数
+
+对话轮数和每批耗时取决于真实的 claude，用 scheduled_analyze.py 与 scheduled_analyze.py --no-routing
+分别运行后比较结束时的 "Per batch" 一行。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, write_corpus, run_script, summarize_ms, EN_WORDS, ZH_WORDS
+
+
+def make_log(doc: dict, rng: random.Random) -> bytes:
+    """围绕一篇文档的对话日志"""
+    body = doc["body"].split()
+    noise = rng.sample(EN_WORDS + ZH_WORDS, 6)
+    records = [
+        {"role": "user", "content": f"{doc['title']} 这个问题怎么处理？{' '.join(noise[:3])}"},
+        {"role": "assistant", "content": "Let me check.\n\n" + " ".join(rng.sample(body, 15)),
+         "used": ["Read", "Bash"]},
+        {"role": "user", "content": " ".join(rng.sample(body, 6) + noise[3:])},
+        {"role": "assistant", "content": " ".join(rng.sample(body, 20))},
+    ]
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--logs", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    docs = write_corpus(gangsmem_dir / "memory", args.docs)
+    result = run_script("scripts/rebuild_index.py", "--full")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    from condense import condense_log
+    from config import get_config
+    from db import get_read_connection
+    from retrieval import find_candidates
+    from scheduled_analyze import format_candidates
+
+    config = get_config()
+    rng = random.Random(3)
+    targets = rng.sample(docs, min(args.logs, len(docs)))
+
+    conn = get_read_connection()
+    timings, hits, listed, prompt_bytes = [], 0, [], []
+    for i, doc in enumerate(targets):
+        digest = condense_log(make_log(doc, rng), f"s{i:05d}").decode("utf-8")
+        start = time.perf_counter()
+        candidates = find_candidates([digest], config, per_text=args.top_k, conn=conn)
+        timings.append(time.perf_counter() - start)
+        hits += any(c["id"] == doc["id"] for c in candidates)
+        listed.append(len(candidates))
+        prompt_bytes.append(len(format_candidates(candidates).encode("utf-8")))
+    conn.close()
+
+    report = {
+        "docs": args.docs,
+        "logs": len(targets),
+        "top_k": args.top_k,
+        f"recall@{args.top_k}": round(hits / len(targets), 4),
+        **summarize_ms(timings),
+        "docs_listed_without_routing": args.docs,
+        "docs_listed_with_routing": round(sum(listed) / len(listed), 2),
+        "prompt_bytes": round(sum(prompt_bytes) / len(prompt_bytes)),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"docs={report['docs']} logs={report['logs']} top_k={args.top_k}")
+    print(f"recall@{args.top_k}={report[f'recall@{args.top_k}']:.1%}  "
+          f"p50={report['p50_ms']:.2f} ms  p95={report['p95_ms']:.2f} ms")
+    print(f"docs to consider per log: {args.docs} -> {report['docs_listed_with_routing']} "
+          f"({report['prompt_bytes']} bytes of candidates in the prompt)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+项目范围检索基准：其他项目的同类记忆是否还会挤掉当前项目的记忆，项目变多时候选集合和延迟是否不变
+
+用法:
+    python3 benchmarks/bench_scope.py [--docs 5000] [--projects 2,10,100] [--queries 200]
+                                      [--global-ratio 0.2] [--json]
+
+每个项目数下生成同样的主题记忆库（common.write_topic_corpus），其中 global-ratio 比例是通用文档
+（没有 project），其余每篇属于一个项目，并在另一个项目中有一篇内容相同的"孪生"文档
+（同一类问题在不同 repo 中的记录）。以目标文档所在的项目目录为 cwd，走真实的检索流程
+（retrieval.find_memories）：
+    scoped   project_scope 开启：先搜索当前项目，不够 max_inject_results 篇时再搜索通用文档
+    global   project_scope 关闭：搜索整个索引
+报告 recall@1（排第一的是目标文档，而不是另一个项目的孪生文档）、other（结果中属于其他项目的
+文档比例）、candidates（实际搜索的范围内 MATCH 命中的行数，中位数）、fallback（需要再搜索通用
+文档的比例）和 p50/p95 延迟。
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, write_topic_corpus, run_script, summarize_ms
+
+K = 3
+
+
+def assign_projects(memory_dir: Path, docs: list, projects: list, global_ratio: float,
+                    rng: random.Random) -> dict:
+    """
+    给文档写入 project，并为属于项目的文档在另一个项目中写一篇孪生文档
+    （一半的孪生文档更新日期更新，不按项目范围检索时排在目标文档前面）
+
+    Returns:
+        {doc id: project}（通用文档为空字符串）
+    """
+    owner = {}
+    for i, doc in enumerate(docs):
+        path = memory_dir / f"{doc['id']}.md"
+        text = path.read_text(encoding="utf-8")
+        if rng.random() < global_ratio:
+            owner[doc["id"]] = ""
+            continue
+        k = i % len(projects)
+        project, other = projects[k], projects[(k + 1) % len(projects)]
+        path.write_text(text.replace("\nsources:", f"\nproject: {project}\nsources:", 1), encoding="utf-8")
+        twin_id = "twin-" + doc["id"]
+        twin = text.replace(f"id: {doc['id']}", f"id: {twin_id}", 1)
+        twin = twin.replace("\nsources:", f"\nproject: {other}\nsources:", 1)
+        if rng.random() < 0.5:
+            twin = twin.replace("\nupdated: 2025-01-01", "\nupdated: 2025-06-01", 1)
+        (memory_dir / f"{twin_id}.md").write_text(twin, encoding="utf-8")
+        owner[doc["id"]] = project
+        owner[twin_id] = other
+    return owner
+
+
+def candidate_rows(conn, prompt: str, config: dict, scopes: list) -> int:
+    """各个范围内 MATCH 命中的行数之和（scopes 为空时为整个索引）"""
+    from planner import plan_query
+    from tokenizer import tokenize, build_fts_query
+
+    query = build_fts_query(plan_query(conn, tokenize(prompt), config), "OR")
+    if not query:
+        return 0
+    matches = [f"scope : {scope} AND ({query})" for scope in scopes] or [query]
+    return sum(conn.execute("SELECT count(*) FROM memories WHERE memories MATCH ?", (m,)).fetchone()[0]
+               for m in matches)
+
+
+def evaluate(queries: list, owner: dict, config: dict, scoped: bool) -> dict:
+    from db import get_read_connection
+    from retrieval import find_memories
+    from scope import GLOBAL_SCOPE, scope_token
+    from telemetry import Trace
+
+    config = dict(config, project_scope=scoped, max_inject_results=K)
+    conn = get_read_connection()
+    for target, cwd, prompt in queries[:20]:
+        find_memories(prompt, config, conn=conn, cwd=cwd)
+
+    hits, other, total, fallbacks, candidates, timings = 0, 0, 0, 0, [], []
+    for target, cwd, prompt in queries:
+        trace = Trace("bench")
+        start = time.perf_counter()
+        results = find_memories(prompt, config, conn=conn, cwd=cwd, trace=trace)
+        timings.append(time.perf_counter() - start)
+
+        ids = [r["id"] for r in results]
+        hits += bool(ids) and ids[0] == target
+        other += sum(1 for i in ids if owner.get(i) not in ("", cwd))
+        total += len(ids)
+        fallback = "scope_fallback" in trace.counts
+        fallbacks += fallback
+        scopes = []
+        if scoped:
+            scopes = [scope_token(cwd)] + ([GLOBAL_SCOPE] if fallback else [])
+        candidates.append(candidate_rows(conn, prompt, config, scopes))
+    conn.close()
+
+    n = len(queries)
+    stats = summarize_ms(timings)
+    return {
+        "n": n,
+        "recall@1": round(hits / n, 4),
+        "other": round(other / total, 4) if total else 0.0,
+        "candidates": statistics.median(candidates),
+        "fallback": round(fallbacks / n, 4),
+        "p50_ms": stats["p50_ms"],
+        "p95_ms": stats["p95_ms"],
+    }
+
+
+def run(gangsmem_dir: Path, n_projects: int, args) -> dict:
+    memory_dir = gangsmem_dir / "memory"
+    for path in memory_dir.glob("*.md"):
+        path.unlink()
+    rng = random.Random(3)
+    docs = write_topic_corpus(memory_dir, args.docs)
+    projects = [str(gangsmem_dir.parent / "work" / f"project-{i:03d}") for i in range(n_projects)]
+    owner = assign_projects(memory_dir, docs, projects, args.global_ratio, rng)
+
+    result = run_script("scripts/rebuild_index.py", "--full")
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    from config import get_config
+
+    targets = rng.sample([d for d in docs if owner[d["id"]]], min(args.queries, len(docs)))
+    queries = [(d["id"], owner[d["id"]], f"how do I fix the {d['topic_en'][0]} {d['topic_en'][1]} error")
+               for d in targets]
+    config = get_config()
+    return {
+        "projects": n_projects,
+        "documents": len(owner),
+        "scoped": evaluate(queries, owner, config, True),
+        "global": evaluate(queries, owner, config, False),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=5000, help="主题文档数（不含孪生文档）")
+    parser.add_argument("--projects", default="2,10,100")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--global-ratio", type=float, default=0.2, help="通用文档的比例")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    report = [run(gangsmem_dir, int(p), args) for p in args.projects.split(",")]
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"  {'projects':>8}{'docs':>8}  {'mode':<8}{'R@1':>7}{'other':>7}{'cand':>8}{'fallback':>10}"
+          f"{'p50 ms':>9}{'p95 ms':>9}")
+    for r in report:
+        for mode in ("scoped", "global"):
+            m = r[mode]
+            print(f"  {r['projects']:>8}{r['documents']:>8}  {mode:<8}{m['recall@1']:>7.1%}{m['other']:>7.1%}"
+                  f"{m['candidates']:>8}{m['fallback']:>10.1%}{m['p50_ms']:>9.2f}{m['p95_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Transcript 解析基准：逐行 json.loads + 全量列表 vs 流式预筛选
+
+用法:
+    python3 benchmarks/bench_transcript.py [--mb 200] [--json]
+
+合成 transcript 的大部分体积是 tool_result（文件内容、命令输出），
+与真实会话的分布一致。报告耗时和峰值内存（tracemalloc）。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import setup_home, EN_WORDS, ZH_WORDS
+
+
+def write_transcript(path: Path, target_bytes: int, rng: random.Random) -> int:
+    """写入一个合成 transcript，返回用户/助手消息轮数"""
+    turns = 0
+    size = 0
+    payload = " ".join(rng.choice(EN_WORDS) for _ in range(6000))
+    with open(path, "w", encoding="utf-8") as f:
+        while size < target_bytes:
+            turns += 1
+            records = [
+                {"type": "user", "timestamp": f"t{turns}",
+                 "message": {"role": "user",
+                             "content": f"{rng.choice(ZH_WORDS)} {rng.choice(EN_WORDS)} 怎么处理？"}},
+                {"type": "assistant", "timestamp": f"t{turns}",
+                 "message": {"role": "assistant", "content": [
+                     {"type": "text", "text": "我先看一下相关文件。"},
+                     {"type": "tool_use", "id": f"u{turns}", "name": "Read",
+                      "input": {"file_path": f"/src/{rng.choice(EN_WORDS)}.py"}},
+                 ]}},
+                {"type": "user", "timestamp": f"t{turns}",
+                 "message": {"role": "user", "content": [
+                     {"type": "tool_result", "tool_use_id": f"u{turns}", "content": payload},
+                 ]}},
+                {"type": "system", "timestamp": f"t{turns}", "content": "hook output"},
+                {"type": "assistant", "timestamp": f"t{turns}",
+                 "message": {"role": "assistant", "content": [
+                     {"type": "text", "text": "问题出在配置上，修改如下。"},
+                 ]}},
+            ]
+            for record in records:
+                line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                f.write(line)
+                size += len(line.encode("utf-8"))
+    return turns
+
+
+def legacy_parse(path: Path) -> list:
+    """原来的实现：每行都 json.loads，用户消息原样保留（包括 tool_result），结果全部放在列表中"""
+    from transcript import parse_assistant_message_simplified
+
+    messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if obj.get("type") == "user":
+                content = obj.get("message", {}).get("content", "")
+                if content:
+                    messages.append({"role": "user", "content": content,
+                                     "ts": obj.get("timestamp", "")})
+            elif obj.get("type") == "assistant":
+                msg, _, _, _ = parse_assistant_message_simplified(obj)
+                if msg:
+                    messages.append(msg)
+    return messages
+
+
+def streaming_write(path: Path, out: Path) -> int:
+    from transcript import iter_transcript_simplified
+
+    count = 0
+    with open(out, "w", encoding="utf-8") as f:
+        for msg in iter_transcript_simplified(str(path)):
+            f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def measure(fn, *args) -> dict:
+    """耗时和峰值内存分两次测量（tracemalloc 本身会拖慢执行）"""
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(result) if isinstance(result, list) else result
+    return {"seconds": round(elapsed, 3), "peak_mb": round(peak / 1e6, 2), "records": count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=int, default=200, help="transcript 大小（MB）")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    gangsmem_dir = setup_home()
+    transcript = gangsmem_dir / "transcript.jsonl"
+    write_transcript(transcript, args.mb * 1_000_000, random.Random(1))
+
+    report = {
+        "transcript_mb": round(transcript.stat().st_size / 1e6, 1),
+        "legacy": measure(legacy_parse, transcript),
+        "streaming": measure(streaming_write, transcript, gangsmem_dir / "out.jsonl"),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"transcript={report['transcript_mb']} MB")
+    print(f"{'mode':<12}{'seconds':>10}{'peak MB':>10}{'records':>10}")
+    for mode in ("legacy", "streaming"):
+        r = report[mode]
+        print(f"{mode:<12}{r['seconds']:>10.3f}{r['peak_mb']:>10.2f}{r['records']:>10}")
+
+
+if __name__ == "__main__":
+    main()
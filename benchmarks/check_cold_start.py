@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+冷启动预算检查：inject_memory.py 处理空 prompt 的导入耗时和总耗时
+
+用法:
+    python3 benchmarks/check_cold_start.py [--runs 30] [--json]
+
+每次提问都会冷启动一次 inject_memory.py，空 prompt（以及大多数不需要检索的路径）
+应该只付出解释器启动和解析输入的代价。检查三项，任何一项超出预算时以状态码 1 退出：
+    modules   空 prompt 不应导入的模块（pathlib、typing、sqlite3、socket 等），与耗时无关，结果稳定
+    imports   -X importtime 中 hook 自己引入的模块（裸解释器启动时没有的）self 耗时之和（5 次取中位数）
+    wall      子进程总耗时的中位数减去 `python3 -c pass` 的中位数
+另外报告非空 prompt（没有索引、没有常驻进程）的耗时，只用于参考。
+
+测量前先预编译 lib/（与 session_start.py 相同），测的是有 .pyc 时的稳定状态。
+在临时 HOME 下运行（common.setup_home），不读写真实的记忆库。
+tests/test_cold_start.py 调用 check()，随测试一起运行。
+"""
+
+import argparse
+import compileall
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from common import PLUGIN_DIR, setup_home
+
+HOOK = str(PLUGIN_DIR / "hooks/inject_memory.py")
+EMPTY_PROMPT = json.dumps({"session_id": "bench", "prompt": "", "cwd": "/tmp"})
+PROMPT = json.dumps({"session_id": "bench", "prompt": "how do I fix the sqlite index", "cwd": "/tmp"})
+
+# 预算（毫秒）：当前实现约 12~20 ms，模块级导入 pathlib + typing 时约 35 ms
+IMPORT_BUDGET_MS = 30.0
+WALL_BUDGET_MS = 30.0
+IMPORT_RUNS = 5
+# 空 prompt 不应导入的模块
+FORBIDDEN_MODULES = ("pathlib", "typing", "sqlite3", "socket", "subprocess", "hashlib", "datetime",
+                     "config", "db", "retrieval", "daemon")
+
+
+def import_times(args: list, input_text: str = "") -> dict:
+    """-X importtime 的 {模块名: self 耗时（毫秒）}，IMPORT_RUNS 次取中位数"""
+    samples = {}
+    for _ in range(IMPORT_RUNS):
+        result = subprocess.run([sys.executable, "-X", "importtime", *args], input=input_text,
+                                capture_output=True, text=True)
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, _, name = line[len("import time:"):].split("|")
+            samples.setdefault(name.strip(), []).append(int(self_us) / 1000)
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def wall_ms(commands: list, runs: int) -> list:
+    """
+    各命令子进程总耗时的中位数（毫秒）
+
+    commands 为 [(参数, stdin)]，每一轮依次运行所有命令，机器负载的变化对各命令的影响相同
+    """
+    timings = [[] for _ in commands]
+    for _ in range(runs):
+        for i, (args, input_text) in enumerate(commands):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], input=input_text, capture_output=True, text=True)
+            timings[i].append((time.perf_counter() - start) * 1000)
+    return [round(statistics.median(t), 2) for t in timings]
+
+
+def check(runs: int) -> dict:
+    baseline = import_times(["-c", "pass"])
+    hook = import_times([HOOK], EMPTY_PROMPT)
+    added = {name: ms for name, ms in hook.items() if name not in baseline}
+    forbidden = [name for name in FORBIDDEN_MODULES if name in added]
+    import_ms = round(sum(added.values()), 2)
+
+    bare, empty, prompt = wall_ms([(["-c", "pass"], ""), ([HOOK], EMPTY_PROMPT), ([HOOK], PROMPT)], runs)
+    overhead = round(empty - bare, 2)
+
+    return {
+        "runs": runs,
+        "modules": {"imported": sorted(added), "forbidden": forbidden, "ok": not forbidden},
+        "imports": {"ms": import_ms, "budget_ms": IMPORT_BUDGET_MS, "ok": import_ms <= IMPORT_BUDGET_MS,
+                    "slowest": sorted(added.items(), key=lambda item: -item[1])[:5]},
+        "wall": {"bare_ms": bare, "empty_prompt_ms": empty, "overhead_ms": overhead,
+                 "budget_ms": WALL_BUDGET_MS, "ok": overhead <= WALL_BUDGET_MS},
+        "prompt_ms": prompt,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=30, help="每项耗时的运行次数（取中位数）")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    setup_home()
+    compileall.compile_dir(str(PLUGIN_DIR / "lib"), maxlevels=0, quiet=2)
+    report = check(args.runs)
+    ok = all(report[key]["ok"] for key in ("modules", "imports", "wall"))
+
+    if args.json:
+        print(json.dumps(dict(report, ok=ok), indent=2))
+    else:
+        m, i, w = report["modules"], report["imports"], report["wall"]
+        print(f"modules  {'ok' if m['ok'] else 'FAIL'}  {len(m['imported'])} imported"
+              + (f", forbidden: {', '.join(m['forbidden'])}" if m["forbidden"] else ""))
+        print(f"imports  {'ok' if i['ok'] else 'FAIL'}  {i['ms']:.2f} ms (budget {i['budget_ms']:.0f} ms)  "
+              "slowest: " + ", ".join(f"{name} {ms:.2f}" for name, ms in i["slowest"]))
+        print(f"wall     {'ok' if w['ok'] else 'FAIL'}  empty prompt {w['empty_prompt_ms']:.1f} ms - "
+              f"bare python {w['bare_ms']:.1f} ms = {w['overhead_ms']:.1f} ms (budget {w['budget_ms']:.0f} ms)")
+        print(f"prompt   {report['prompt_ms']:.1f} ms (no index, no daemon; not checked)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+基准测试公共工具
+
+所有基准测试都在临时 HOME 下运行（~/.gangsmem 指向临时目录），
+不会影响真实的记忆库。必须在导入 lib 模块之前调用 setup_home()。
+"""
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PLUGIN_DIR = Path(__file__).parent.parent
+
+EN_WORDS = [
+    "python", "sqlite", "index", "query", "cache", "docker", "network", "latency",
+    "thread", "process", "socket", "config", "deploy", "kubernetes", "react", "hook",
+    "token", "parser", "compile", "memory", "buffer", "stream", "schema", "migrate",
+    "logging", "profile", "benchmark", "timeout", "retry", "async", "commit", "branch",
+    "rebase", "merge", "vector", "search", "ranking", "shard", "replica", "backup",
+    "golang", "rust", "typescript", "webpack", "nginx", "redis", "postgres", "kafka",
+]
+
+ZH_WORDS = [
+    "数据库", "索引", "查询", "缓存", "部署", "网络", "延迟", "线程", "进程", "配置",
+    "分词", "内存", "日志", "性能", "超时", "重试", "异步", "提交", "分支", "合并",
+    "向量", "搜索", "排序", "备份", "容器", "编译", "调试", "测试", "接口", "权限",
+    "证书", "代理", "镜像", "依赖", "版本", "迁移", "监控", "告警", "队列", "事务",
+]
+
+
+def setup_home(prefix: str = "gm-") -> Path:
+    """创建临时 HOME 并返回其中的 ~/.gangsmem 目录"""
+    home = Path(tempfile.mkdtemp(prefix=prefix))
+    os.environ["HOME"] = str(home)
+    gangsmem_dir = home / ".gangsmem"
+    (gangsmem_dir / "memory").mkdir(parents=True)
+    (gangsmem_dir / "logs").mkdir()
+    sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+    sys.path.insert(0, str(PLUGIN_DIR / "scripts"))
+    return gangsmem_dir
+
+
+def make_doc(i: int, rng: random.Random, body_words: int = 120) -> Dict:
+    """生成一篇中英混合的合成记忆文档"""
+    topic_en = rng.sample(EN_WORDS, 3)
+    topic_zh = rng.sample(ZH_WORDS, 2)
+    words = []
+    for _ in range(body_words):
+        if rng.random() < 0.5:
+            words.append(rng.choice(EN_WORDS))
+        else:
+            words.append(rng.choice(ZH_WORDS))
+    return {
+        "id": f"doc-{i:06d}",
+        "title": f"{topic_zh[0]}{topic_zh[1]} {' '.join(topic_en)}",
+        "keywords": topic_en + topic_zh,
+        "body": " ".join(words),
+    }
+
+
+def render_markdown(doc: Dict, updated: str = "2025-01-01") -> str:
+    """把合成文档渲染成 memory/*.md 格式"""
+    keywords = ", ".join(doc["keywords"])
+    return (
+        "---\n"
+        f"id: {doc['id']}\n"
+        f"title: {doc['title']}\n"
+        f"keywords: [{keywords}]\n"
+        f"created: {updated}\n"
+        f"updated: {updated}\n"
+        "sources: [bench]\n"
+        "---\n\n"
+        f"# {doc['title']}\n\n"
+        "## 核心内容\n"
+        f"{doc['body']}\n"
+    )
+
+
+def write_corpus(memory_dir: Path, n: int, seed: int = 42) -> List[Dict]:
+    """在 memory_dir 下写入 n 篇合成文档"""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        doc = make_doc(i, rng)
+        (memory_dir / f"{doc['id']}.md").write_text(render_markdown(doc), encoding="utf-8")
+        docs.append(doc)
+    return docs
+
+
+SYLLABLES = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+CJK_CHARS = [chr(0x4E00 + i) for i in range(0, 6000, 3)]
+
+
+def make_vocabulary(n: int, seed: int = 5) -> List[str]:
+    """生成 n 个不重复的伪英文词（2~4 个音节），下标即词频排名"""
+    rng = random.Random(seed)
+    vocab, seen = [], set()
+    while len(vocab) < n:
+        word = "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocab.append(word)
+    return vocab
+
+
+def make_zh_vocabulary(n: int, seed: int = 6) -> List[str]:
+    """生成 n 个不重复的伪中文词（两个字），下标即词频排名"""
+    rng = random.Random(seed)
+    vocab, seen = [], set()
+    while len(vocab) < n:
+        word = "".join(rng.sample(CJK_CHARS, 2))
+        if word not in seen:
+            seen.add(word)
+            vocab.append(word)
+    return vocab
+
+
+def zipf_weights(n: int) -> List[float]:
+    """Zipf 分布（排名 r 的权重为 1/r）的累积权重，用于 random.choices(cum_weights=...)"""
+    cum_weights = []
+    total = 0.0
+    for rank in range(n):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+    return cum_weights
+
+
+def write_topic_corpus(memory_dir: Path, n: int, vocab_size: int = 20000, seed: int = 42,
+                       body_words: int = 120, zh_ratio: float = 0.0) -> List[Dict]:
+    """
+    在 memory_dir 下写入 n 篇主题文档（比 write_corpus 更接近真实记忆库的词分布）
+
+    每篇文档有 3 个英文主题词（取自词表中低频的部分）和 1 个中文主题词，出现在标题、keywords
+    和正文中；正文其余的词按 Zipf 分布从整个词表中抽取，其中 zh_ratio 比例的词取自伪中文词表。
+    返回的文档带有 topic_en / topic_zh 字段。
+    """
+    rng = random.Random(seed)
+    vocab = make_vocabulary(vocab_size)
+    cum_weights = zipf_weights(vocab_size)
+    zh_vocab = make_zh_vocabulary(vocab_size // 4) if zh_ratio > 0 else []
+    zh_weights = zipf_weights(len(zh_vocab))
+    rare = vocab[vocab_size // 10:]
+
+    docs = []
+    for i in range(n):
+        topic_en = rng.sample(rare, 3)
+        topic_zh = "".join(rng.sample(CJK_CHARS, 2))
+        words = rng.choices(vocab, cum_weights=cum_weights, k=body_words)
+        if zh_vocab:
+            zh_words = rng.choices(zh_vocab, cum_weights=zh_weights, k=body_words)
+            words = [zh if rng.random() < zh_ratio else en for en, zh in zip(words, zh_words)]
+        for _ in range(body_words // 10):
+            words[rng.randrange(body_words)] = rng.choice(topic_en)
+        words.insert(rng.randrange(body_words), topic_zh)
+        doc = {
+            "id": f"doc-{i:06d}",
+            "title": f"{topic_zh} {' '.join(topic_en)}",
+            "keywords": topic_en + [topic_zh],
+            "body": " ".join(words),
+            "topic_en": topic_en,
+            "topic_zh": topic_zh,
+        }
+        (memory_dir / f"{doc['id']}.md").write_text(render_markdown(doc), encoding="utf-8")
+        docs.append(doc)
+    return docs
+
+
+def make_prompts(n: int, seed: int = 7) -> List[str]:
+    """生成一组中英混合的测试 prompt"""
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(n):
+        parts = rng.sample(EN_WORDS, 2) + rng.sample(ZH_WORDS, 2)
+        prompts.append(f"怎么解决 {parts[0]} 的{parts[2]}问题，{parts[1]} {parts[3]}")
+    return prompts
+
+
+def run_script(script: str, *args: str, env: Optional[Dict] = None,
+               input_text: Optional[str] = None) -> subprocess.CompletedProcess:
+    """以当前（临时）HOME 运行插件中的脚本"""
+    run_env = dict(os.environ)
+    if env:
+        run_env.update(env)
+    return subprocess.run(
+        [sys.executable, str(PLUGIN_DIR / script), *args],
+        input=input_text,
+        capture_output=True,
+        text=True,
+        env=run_env
+    )
+
+
+def percentile(values: List[float], p: float) -> float:
+    """计算百分位数（最近秩）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def summarize_ms(values: List[float]) -> Dict:
+    """把秒为单位的耗时汇总成毫秒统计"""
+    ms = [v * 1000 for v in values]
+    return {
+        "n": len(ms),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+    }
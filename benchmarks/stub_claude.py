@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+代替 claude CLI 的桩程序（用于 scheduled_analyze 的基准和手动验证）
+
+用法（由 scheduled_analyze 调用）:
+    CLAUDE_PATH=benchmarks/stub_claude.py python3 scripts/scheduled_analyze.py
+
+从 prompt 中取出日志路径（或内嵌的日志摘要）和 session id，把每个 session id 追加到一个共享的
+记忆文档（按日志内容的哈希从少量文档中选择，故意制造多个 worker 修改同一文档的情况）。
+prompt 可以跟在 -p 后面，也可以从 stdin 读入。带 --output-format json 时像 claude 一样输出
+result 消息（num_turns 按桩程序实际执行的操作计算：没有候选文档时先 Glob 一次，每个 session 读写各一次）。
+读-改-写之间停顿 STUB_CLAUDE_DELAY 秒；prompt 中包含文档锁说明时按说明加锁。
+
+环境变量:
+    STUB_CLAUDE_DELAY   每个文档修改的停顿（秒，默认 0.05）
+    STUB_CLAUDE_DOCS    共享文档数（默认 3）
+    STUB_CLAUDE_FAIL    设置后以退出码 1 结束（模拟分析失败）
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MEMORY_DIR = Path.home() / ".gangsmem" / "memory"
+
+
+def main():
+    args = sys.argv[1:]
+    i = args.index("-p") + 1 if "-p" in args else len(args)
+    prompt = args[i] if i < len(args) and not args[i].startswith("--") else sys.stdin.read()
+    if os.environ.get("STUB_CLAUDE_FAIL"):
+        print("stub failure", file=sys.stderr)
+        sys.exit(1)
+
+    start = time.monotonic()
+    delay = float(os.environ.get("STUB_CLAUDE_DELAY", "0.05"))
+    n_docs = int(os.environ.get("STUB_CLAUDE_DOCS", "3"))
+
+    # (session id, 内容)：日志文件路径，或 "### session <id>" 开头的摘要
+    sessions = [(Path(path).stem.split("_")[-1], Path(path).read_bytes())
+                for path in re.findall(r'^- (/\S+\.jsonl)$', prompt, re.MULTILINE)]
+    sessions += [(m.group(1), m.group(0).encode())
+                 for m in re.finditer(r'^### session (\S+)\n(?:(?!### session ).*\n?)*', prompt, re.MULTILINE)]
+    lock = re.search(r'^(python3 \S+memlock\.py) acquire (\S+) <', prompt, re.MULTILINE)
+
+    for session_id, content in sessions:
+        doc_id = f"stub-{int(hashlib.sha1(content).hexdigest(), 16) % n_docs}"
+
+        if lock:
+            command, owner = lock.group(1).split(), lock.group(2)
+            subprocess.run(command + ["acquire", owner, doc_id], check=True, capture_output=True)
+
+        doc = MEMORY_DIR / f"{doc_id}.md"
+        sources = doc.read_text().split("sources: [", 1)[1].split("]", 1)[0].split(", ") \
+            if doc.exists() else []
+        time.sleep(delay)
+        sources = [s for s in sources if s] + [session_id]
+        doc.write_text(
+            "---\n"
+            f"id: {doc_id}\n"
+            f"title: stub {doc_id}\n"
+            "keywords: [stub]\n"
+            f"sources: [{', '.join(sources)}]\n"
+            "---\n\n"
+            f"# stub {doc_id}\n"
+        )
+
+        if lock:
+            subprocess.run(command + ["release", owner, doc_id], check=True, capture_output=True)
+
+    message = f"stub analyzed {len(sessions)} logs"
+    output_format = args[args.index("--output-format") + 1] if "--output-format" in args else "text"
+    if output_format == "json":
+        turns = 2 * len(sessions) + (0 if "候选文档" in prompt else 1)
+        print(json.dumps({"type": "result", "subtype": "success", "is_error": False,
+                          "num_turns": turns, "duration_ms": int((time.monotonic() - start) * 1000),
+                          "result": message}))
+    else:
+        print(message)
+
+
+if __name__ == "__main__":
+    main()
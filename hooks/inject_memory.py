@@ -10,37 +10,80 @@ UserPromptSubmit Hook: 搜索相关记忆并注入
 }
 
 输出 (stdout): 相关记忆内容（会被注入到 Claude 上下文）
+
+优先请求常驻搜索进程（scripts/search_daemon.py），不可用时回退到进程内搜索。
+cwd 用于按项目范围检索：先搜索当前项目的记忆，不够时再搜索通用记忆（见 lib/scope.py）。
+每次运行的分段耗时和结果（hit / empty / skipped）记入 metrics.log（见 lib/telemetry.py）。
+
+每次提问都会冷启动这个脚本：模块级只导入 sys / os，其余模块用到时才导入（空 prompt 只需要 json），
+常驻进程的 socket 不存在时不导入 daemon。冷启动预算检查：python3 benchmarks/check_cold_start.py
 """
 
 import sys
 import os
-import json
-from pathlib import Path
 
-PLUGIN_DIR = Path(os.environ.get("CLAUDE_PLUGIN_ROOT", Path(__file__).parent.parent))
-GANGSMEM_DIR = Path.home() / ".gangsmem"
-CONFIG_FILE = GANGSMEM_DIR / "config.json"
+PLUGIN_DIR = os.environ.get("CLAUDE_PLUGIN_ROOT",
+                            os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 添加 lib 到 path
-sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+sys.path.insert(0, os.path.join(PLUGIN_DIR, "lib"))
+
+# 与 daemon.SOCKET_PATH 相同
+SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".gangsmem", "search.sock")
+
+# 常驻进程响应超时（秒），超时后回退到进程内搜索
+DAEMON_TIMEOUT = 0.5
+
+
+def search_via_daemon(input_data: dict, trace):
+    """
+    通过常驻搜索进程获取注入内容
+
+    Returns:
+        注入文本；常驻进程不存在或超时时返回 None
+    """
+    if not os.path.exists(SOCKET_PATH):
+        return None
+    from daemon import query_daemon
+    trace.mark("import")
+    response = query_daemon(
+        {"prompt": input_data.get("prompt", ""), "cwd": input_data.get("cwd", "")},
+        timeout=DAEMON_TIMEOUT
+    )
+    trace.mark("ipc")
+    if not response or "output" not in response:
+        if response and response.get("error"):
+            trace.merge({}, error=response["error"])
+        return None
+    trace.merge(response.get("ms") or {}, response.get("n"), response.get("error"), within="ipc")
+    trace.count("daemon")
+    return response["output"]
+
+
+def search_in_process(prompt: str, cwd: str, trace) -> str:
+    """进程内搜索（常驻进程不可用时的回退路径）"""
+    from config import get_config
+    from db import db_exists
+    # db 会加载 sqlite3，算在 import 里，config 只统计读取配置
+    trace.mark("import")
+
+    config = get_config()
+    trace.mark("config")
+    if not config.get("auto_inject", True):
+        return ""
+
+    # 检查数据库是否存在
+    if not db_exists():
+        return ""
 
+    from retrieval import render_for_prompt
+    trace.mark("import")
+    return render_for_prompt(prompt, config, trace=trace, cwd=cwd)
 
-def get_config() -> dict:
-    """读取配置"""
-    if CONFIG_FILE.exists():
-        try:
-            return json.loads(CONFIG_FILE.read_text())
-        except Exception:
-            pass
-    return {
-        "auto_inject": True,
-        "max_inject_results": 3,
-        "max_inject_chars": 1000,
-        "use_jieba": False
-    }
 
+def main(trace):
+    import json
 
-def main():
     # 读取 hook 输入
     try:
         input_data = json.load(sys.stdin)
@@ -51,72 +94,25 @@ def main():
     if not prompt:
         return
 
-    # 读取配置
-    config = get_config()
-    if not config.get("auto_inject", True):
-        return
-
-    # 检查数据库是否存在
-    from db import db_exists, search
-    if not db_exists():
-        return
-
-    # 分词
-    from tokenizer import tokenize, build_fts_query
-    tokens = tokenize(prompt, use_jieba=config.get("use_jieba", False))
-    if not tokens:
-        return
-
-    # 构建查询
-    query = build_fts_query(tokens, "OR")
-    if not query:
-        return
-
-    # 搜索
-    max_results = config.get("max_inject_results", 3)
-    results = search(query, limit=max_results)
-
-    if not results:
-        return
-
-    # 输出注入内容
-    max_chars = config.get("max_inject_chars", 1000)
-    output_inject_content(results, max_chars)
-
-
-def output_inject_content(results: list, max_chars: int):
-    """输出注入内容到 stdout"""
-    print("<related-memories>")
-    print("以下是可能相关的历史知识，请自行判断是否有用：")
-    print()
-
-    total_chars = 0
-    for i, r in enumerate(results, 1):
-        title = r.get("title", "Untitled")
-        summary = r.get("summary", "")
-
-        # 截断摘要
-        remaining = max_chars - total_chars
-        if remaining <= 0:
-            break
-
-        if len(summary) > remaining:
-            summary = summary[:remaining] + "..."
-
-        print(f"[{i}] {title}")
-        print(f"    {summary}")
-        print()
-
-        total_chars += len(summary)
+    output = search_via_daemon(input_data, trace)
+    if output is None:
+        output = search_in_process(prompt, input_data.get("cwd", ""), trace)
 
-    print("</related-memories>")
+    if output:
+        print(output)
+    # 没有走到检索（关闭了自动注入、还没有索引）时没有 results 计数
+    trace.record("hit" if output else "empty" if "results" in trace.counts else "skipped")
 
 
 if __name__ == "__main__":
+    from telemetry import Trace
+    trace = Trace("inject")
     try:
-        main()
+        main(trace)
     except Exception as e:
         # 错误输出到 stderr，不影响 Claude Code
         print(f"[gangsmem] Error: {e}", file=sys.stderr)
+        trace.error(e)
+        trace.record("error")
         # 正常退出，不阻塞
         sys.exit(0)
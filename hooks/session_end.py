@@ -7,6 +7,11 @@ SessionEnd Hook: 保存对话日志（简化版）
 - Claude 的核心回复（摘要）
 - 使用的 tools/skills/mcp（只记录名称）
 - 不记录 tool 的完整返回结果
+
+增量捕获：同一个 session 再次结束时只解析上次之后追加的内容，
+并跳过已经写入过的消息（见 lib/capture.py）。
+
+每次运行的分段耗时和结果（saved / empty / skipped / error）记入 metrics.log（见 lib/telemetry.py）。
 """
 
 import sys
@@ -14,6 +19,7 @@ import os
 import json
 from pathlib import Path
 from datetime import datetime
+from typing import Iterable
 
 PLUGIN_DIR = Path(os.environ.get("CLAUDE_PLUGIN_ROOT", Path(__file__).parent.parent))
 GANGSMEM_DIR = Path.home() / ".gangsmem"
@@ -27,28 +33,57 @@ def log(msg: str):
     print(f"[gangsmem] {msg}", file=sys.stderr)
 
 
-def save_log(session_id: str, messages: list):
-    """保存简化的日志"""
-    if not messages:
-        return
+def save_log(session_id: str, messages: Iterable[dict]) -> int:
+    """
+    保存简化的日志（边解析边写入）
 
-    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    先写入临时文件，完成后再重命名，避免分析脚本读到写了一半的日志。
+    日期目录只在不存在时（当天第一次写入）创建。
 
+    Returns:
+        写入的记录数
+    """
     now = datetime.now()
     date_dir = LOGS_DIR / now.strftime("%Y-%m-%d")
-    date_dir.mkdir(exist_ok=True)
 
-    filename = f"{now.strftime('%H-%M-%S')}_{session_id[:8]}.jsonl"
+    # 文件名保留完整的 session id（分析台账以它为键）；
+    # 同一秒内多次捕获同一个 session 时不能覆盖之前的增量
+    safe_id = "".join(c if c.isalnum() or c in "-." else "-" for c in session_id)
+    stamp = now.strftime('%H-%M-%S')
+    filename = f"{stamp}_{safe_id}.jsonl"
+    n = 0
+    while (date_dir / filename).exists():
+        n += 1
+        filename = f"{stamp}-{n}_{safe_id}.jsonl"
     log_file = date_dir / filename
+    tmp_file = date_dir / (filename + ".tmp")
+
+    try:
+        f = open(tmp_file, "w", encoding="utf-8")
+    except FileNotFoundError:
+        date_dir.mkdir(parents=True, exist_ok=True)
+        f = open(tmp_file, "w", encoding="utf-8")
+
+    count = 0
+    try:
+        with f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+                count += 1
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
 
-    with open(log_file, "w", encoding="utf-8") as f:
-        for msg in messages:
-            f.write(json.dumps(msg, ensure_ascii=False) + "\n")
+    if count == 0:
+        tmp_file.unlink(missing_ok=True)
+        return 0
 
-    log(f"Saved {len(messages)} messages to {log_file.name}")
+    os.replace(tmp_file, log_file)
+    log(f"Saved {count} messages to {log_file.name}")
+    return count
 
 
-def main():
+def main(trace):
     try:
         input_data = json.load(sys.stdin)
     except json.JSONDecodeError:
@@ -60,22 +95,42 @@ def main():
 
     if not transcript_path:
         log("No transcript_path provided")
+        trace.record("skipped")
         return
 
-    # 解析并简化 transcript
+    # 从上次的位置开始流式解析，只写入新增且未写入过的消息
     try:
-        from transcript import parse_transcript_simplified
-        messages = parse_transcript_simplified(transcript_path)
+        from capture import Capture
+        from transcript import TranscriptCursor, iter_transcript_simplified
+
+        capture = Capture(session_id, transcript_path)
+        trace.mark("open")
+        try:
+            cursor = TranscriptCursor(capture.offset)
+            messages = iter_transcript_simplified(transcript_path, cursor)
+            count = save_log(session_id, capture.filter_new(messages))
+            trace.mark("capture")
+            capture.commit(cursor.offset)
+            trace.mark("commit")
+        finally:
+            capture.close()
     except Exception as e:
         log(f"Failed to parse transcript: {e}")
+        trace.error(e)
+        trace.record("error")
         return
 
-    save_log(session_id, messages)
+    trace.count("messages", count)
+    trace.record("saved" if count else "empty")
 
 
 if __name__ == "__main__":
+    from telemetry import Trace
+    trace = Trace("session_end")
     try:
-        main()
+        main(trace)
     except Exception as e:
         print(f"[gangsmem] Fatal error: {e}", file=sys.stderr)
+        trace.error(e)
+        trace.record("error")
         sys.exit(0)
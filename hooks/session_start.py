@@ -2,7 +2,8 @@
 """
 SessionStart Hook: 确保 launchd 定时任务已配置
 
-在 session 开始时检查并安装 launchd 定时任务
+在 session 开始时检查并安装 launchd 定时任务，预编译 lib/ 的字节码，
+并在配置了 use_daemon 时启动常驻搜索进程
 """
 
 import sys
@@ -14,6 +15,8 @@ from pathlib import Path
 PLUGIN_DIR = Path(os.environ.get("CLAUDE_PLUGIN_ROOT", Path(__file__).parent.parent))
 GANGSMEM_DIR = Path.home() / ".gangsmem"
 
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+
 
 def log(msg: str):
     """输出日志到 stderr"""
@@ -55,6 +58,32 @@ def install_launchd():
         log(f"Failed to install launchd: {e}")
 
 
+def precompile():
+    """
+    预编译 lib/ 的字节码（只重新编译有变化的文件）
+
+    每次提问都会冷启动 inject_memory.py。插件目录不可写或设置了 PYTHONDONTWRITEBYTECODE 时
+    Python 不会缓存 .pyc，每次都要从源码编译用到的 lib 模块（空 prompt 多约 10 ms）；
+    compileall 不受 PYTHONDONTWRITEBYTECODE 影响，导入时仍会使用已有的 .pyc。
+    """
+    import compileall
+    try:
+        compileall.compile_dir(str(PLUGIN_DIR / "lib"), maxlevels=0, quiet=2)
+    except Exception as e:
+        log(f"Failed to precompile lib: {e}")
+
+
+def ensure_daemon():
+    """按配置启动常驻搜索进程"""
+    from config import get_config
+    if not get_config().get("use_daemon", False):
+        return
+
+    from daemon import start_daemon
+    if not start_daemon():
+        log("Failed to start search daemon")
+
+
 def main():
     # 读取 hook 输入
     try:
@@ -64,12 +93,15 @@ def main():
 
     # 确保目录存在
     ensure_dirs()
+    precompile()
 
     # 检查并安装 launchd
     if not is_launchd_installed():
         log("First run - configuring scheduled task...")
         install_launchd()
 
+    ensure_daemon()
+
 
 if __name__ == "__main__":
     try:
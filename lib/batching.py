@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+分析批次规划
+
+按日志内容的大小（字节）打包批次，而不是固定个数：
+- 小日志合并到一批，直到达到 max_bytes 或 max_items
+- 超过 max_bytes 的日志按行切成多段，每段单独成为一个工作项（写到临时目录）
+- 待分析日志从台账中逐个领取，只在真正要放进批次时才领取
+- 开启日志压缩时按压缩后的摘要大小计算
+- 领取后读取失败（日志损坏、读不出来）的日志直接记为失败，继续下一个日志
+
+一个日志的所有分段都分析成功后才算完成（见 Progress）。
+"""
+
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from logstore import EXTRACT_DIR, LOGS_DIR, LogEntry, log_size, materialize, read_log
+
+
+class WorkItem(NamedTuple):
+    """一个日志或日志的一段"""
+    entry: LogEntry
+    session_id: str
+    path: Path          # 可以直接 Read 的文件
+    size: int           # 字节数
+    raw_size: int       # 对应的原始日志字节数（压缩前；分段时只记在第一段）
+    part: int = 1       # 第几段（从 1 开始）
+    parts: int = 1      # 总段数
+
+
+def split_lines(data: bytes, max_bytes: int) -> List[bytes]:
+    """按行切分，每段不超过 max_bytes（单行超过上限时单独成段）"""
+    chunks, current, size = [], [], 0
+    for line in data.splitlines(keepends=True):
+        if current and size + len(line) > max_bytes:
+            chunks.append(b"".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append(b"".join(current))
+    return chunks
+
+
+def work_items(entry: LogEntry, session_id: str, max_bytes: int,
+               logs_dir: Path = LOGS_DIR, extract_dir: Path = EXTRACT_DIR,
+               condense: Optional[Callable[[bytes, str], bytes]] = None) -> List[WorkItem]:
+    """
+    把一个日志变成工作项（超过 max_bytes 时切分）
+
+    Args:
+        condense: 压缩函数 (日志内容, session_id) -> 摘要（见 lib/condense.py）；
+            给出时工作项是摘要文件（.digest.md），大小按摘要计算
+    """
+    if condense is None:
+        size = log_size(entry, logs_dir)
+        if size <= max_bytes:
+            return [WorkItem(entry, session_id, materialize(entry, logs_dir, extract_dir), size, size)]
+        raw = read_log(entry, logs_dir)
+        data, suffix = raw, ".jsonl"
+    else:
+        raw = read_log(entry, logs_dir)
+        data, suffix = condense(raw, session_id), ".digest.md"
+
+    stem = Path(entry.name).stem
+    target_dir = extract_dir / entry.day
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    chunks = split_lines(data, max_bytes) if len(data) > max_bytes else [data]
+    items = []
+    for i, chunk in enumerate(chunks, 1):
+        name = f"{stem}{suffix}" if len(chunks) == 1 else f"{stem}.part{i}of{len(chunks)}{suffix}"
+        path = target_dir / name
+        path.write_bytes(chunk)
+        # 原始大小记在第一段上，汇总时不重复计算
+        items.append(WorkItem(entry, session_id, path, len(chunk),
+                              len(raw) if i == 1 else 0, i, len(chunks)))
+    return items
+
+
+class BatchPlanner:
+    """
+    从待分析日志流中打包批次（线程安全）
+
+    Args:
+        pending: (LogEntry, session_id) 的有序流
+        claim: 领取一个日志（key -> 是否领取成功）
+        max_bytes: 每批的字节预算
+        max_items: 每批最多的工作项数
+        condense: 日志压缩函数（见 work_items）
+        fail: 领取后读取失败时调用 (key, 错误信息)，应在台账中记为失败（为空时什么也不做）
+    """
+
+    def __init__(self, pending: Iterator[Tuple[LogEntry, str]], claim: Callable[[str], bool],
+                 max_bytes: int, max_items: int,
+                 logs_dir: Path = LOGS_DIR, extract_dir: Path = EXTRACT_DIR,
+                 condense: Optional[Callable[[bytes, str], bytes]] = None,
+                 fail: Optional[Callable[[str, str], None]] = None):
+        self.pending = pending
+        self.claim = claim
+        self.fail = fail
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.logs_dir = logs_dir
+        self.extract_dir = extract_dir
+        self.condense = condense
+        self.buffer = deque()
+        self.lock = threading.Lock()
+
+    def _fill(self) -> bool:
+        for entry, session_id in self.pending:
+            if not self.claim(entry.key):
+                continue  # 被另一个分析进程领走了
+            try:
+                items = work_items(entry, session_id, self.max_bytes,
+                                   self.logs_dir, self.extract_dir, self.condense)
+            except Exception as e:
+                # 已经领取：不记为失败的话要等领取超时，而且异常会中断整个分析
+                if self.fail is not None:
+                    self.fail(entry.key, f"{type(e).__name__}: {e}")
+                continue
+            self.buffer.extend(items)
+            return True
+        return False
+
+    def next_batch(self) -> List[WorkItem]:
+        """下一批工作项，没有待分析的日志时返回空列表"""
+        with self.lock:
+            batch, used = [], 0
+            while len(batch) < self.max_items:
+                if not self.buffer and not self._fill():
+                    break
+                item = self.buffer[0]
+                if batch and used + item.size > self.max_bytes:
+                    break
+                batch.append(self.buffer.popleft())
+                used += item.size
+            return batch
+
+    def leftover_keys(self) -> List[str]:
+        """已领取但还没有放进批次的日志"""
+        with self.lock:
+            return list(dict.fromkeys(item.entry.key for item in self.buffer))
+
+
+class Progress:
+    """按日志汇总各分段的分析结果"""
+
+    def __init__(self):
+        self.remaining: Dict[str, int] = {}
+        self.errors: Dict[str, Optional[str]] = {}
+        self.lock = threading.Lock()
+
+    def record(self, batch: List[WorkItem], ok: bool, error: Optional[str] = None):
+        """
+        记录一批的结果
+
+        Returns:
+            (成功完成的日志 key, 失败的日志 key)：所有分段都有结果后才返回
+        """
+        succeeded, failed = [], []
+        with self.lock:
+            for item in batch:
+                key = item.entry.key
+                self.remaining.setdefault(key, item.parts)
+                self.remaining[key] -= 1
+                if not ok:
+                    self.errors[key] = error or "failed"
+                if self.remaining[key] == 0:
+                    del self.remaining[key]
+                    if key in self.errors:
+                        failed.append(key)
+                    else:
+                        succeeded.append(key)
+        return succeeded, failed
+
+    def error(self, key: str) -> Optional[str]:
+        return self.errors.get(key)
+
+    def incomplete_keys(self) -> List[str]:
+        """部分分段还没有分析的日志"""
+        with self.lock:
+            return list(self.remaining)
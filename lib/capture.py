@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+增量捕获：按 session 记录 transcript 的解析位置，并对消息去重
+
+长会话和恢复（resume）的会话会多次触发 SessionEnd。每次只解析上次位置之后追加的内容，
+日志文件只包含新增部分；恢复的会话会把之前的消息复制到新的 transcript 中，
+通过消息内容哈希跳过已经写入过的消息。
+
+数据保存在 ~/.gangsmem/capture.db:
+    checkpoints:    session_id -> transcript 路径、已解析的字节偏移、偏移前一段内容的哈希
+    seen_messages:  已写入日志的消息哈希
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+CAPTURE_DB = GANGSMEM_DIR / "capture.db"
+
+# 校验哈希覆盖偏移前的字节数
+TAIL_BYTES = 4096
+
+# 消息哈希保留天数
+SEEN_RETENTION_DAYS = 180
+
+
+def get_connection() -> sqlite3.Connection:
+    """打开 capture.db（不存在则创建）"""
+    GANGSMEM_DIR.mkdir(exist_ok=True)
+    conn = sqlite3.connect(CAPTURE_DB, timeout=10)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints(
+            session_id TEXT PRIMARY KEY,
+            transcript_path TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            tail_hash TEXT NOT NULL,
+            updated REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS seen_messages(
+            hash TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            created REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS seen_created ON seen_messages(created)")
+    return conn
+
+
+def tail_hash(path: Path, offset: int) -> str:
+    """offset 之前 TAIL_BYTES 字节的哈希，用于确认 transcript 没有被改写"""
+    start = max(0, offset - TAIL_BYTES)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(offset - start)
+    return hashlib.sha1(data).hexdigest()
+
+
+def message_hash(msg: Dict) -> str:
+    """消息内容哈希（角色 + 时间戳 + 内容）"""
+    key = json.dumps(
+        [msg.get("role"), msg.get("ts"), msg.get("content")],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class Capture:
+    """
+    单次捕获
+
+    用法:
+        capture = Capture(session_id, transcript_path)
+        cursor = TranscriptCursor(capture.offset)
+        save_log(session_id, capture.filter_new(iter_transcript_simplified(path, cursor)))
+        capture.commit(cursor.offset)
+
+    只有调用 commit() 后偏移和消息哈希才会保存；中途失败时下次从原位置重新解析。
+    """
+
+    def __init__(self, session_id: str, transcript_path: str):
+        self.session_id = session_id
+        self.path = Path(transcript_path)
+        self.conn = get_connection()
+        self.offset = self._load_offset()
+        self.new_hashes: List[str] = []
+
+    def _load_offset(self) -> int:
+        row = self.conn.execute(
+            "SELECT transcript_path, offset, tail_hash FROM checkpoints WHERE session_id = ?",
+            (self.session_id,)
+        ).fetchone()
+        if not row:
+            return 0
+
+        path, offset, expected = row
+        # transcript 换了位置、被截断或被改写时从头解析（消息哈希会去掉重复部分）
+        try:
+            if path != str(self.path) or self.path.stat().st_size < offset:
+                return 0
+            if tail_hash(self.path, offset) != expected:
+                return 0
+        except OSError:
+            return 0
+        return offset
+
+    def _is_seen(self, digest: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM seen_messages WHERE hash = ?", (digest,)
+        ).fetchone() is not None
+
+    def filter_new(self, messages: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        过滤掉已经写入过日志的消息
+
+        会话摘要（session_summary）不参与去重，但没有新消息时也不输出
+        """
+        pending = set()
+        for msg in messages:
+            if msg.get("type") == "session_summary":
+                if self.new_hashes:
+                    yield msg
+                continue
+
+            digest = message_hash(msg)
+            if digest in pending or self._is_seen(digest):
+                continue
+            pending.add(digest)
+            self.new_hashes.append(digest)
+            yield msg
+
+    def commit(self, offset: int):
+        """保存新的解析位置和消息哈希"""
+        now = time.time()
+        try:
+            digest = tail_hash(self.path, offset)
+        except OSError:
+            offset, digest = 0, ""
+
+        with self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO checkpoints(session_id, transcript_path, offset, tail_hash, updated)
+                VALUES (?, ?, ?, ?, ?)
+            """, (self.session_id, str(self.path), offset, digest, now))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen_messages(hash, session_id, created) VALUES (?, ?, ?)",
+                [(h, self.session_id, now) for h in self.new_hashes]
+            )
+            self.conn.execute(
+                "DELETE FROM seen_messages WHERE created < ?",
+                (now - SEEN_RETENTION_DAYS * 86400,)
+            )
+        self.new_hashes = []
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+日志压缩：把简化日志（SessionEnd 写入的 JSONL）整理成紧凑的摘要，直接放进分析 prompt
+
+完全在本地按固定规则处理，同样的输入总是得到同样的输出：
+- 重复或几乎相同的用户提问只保留第一次，并记录重复次数
+- 过长的代码块只保留开头和结尾几行
+- 过长的调用栈只保留开头和结尾几帧
+- 去掉助手的过渡性短句（"让我看一下……"、"Let me check……"）
+- 保留每轮用到的工具（used）和会话的工具汇总
+- 保留会话的项目根目录和读写过的文件（分析时写入文档的 project / files，见 lib/scope.py）
+
+输出格式（Markdown）:
+    ### session <id>
+    *project: /path/to/repo | files: lib/db.py, README.md*
+    **Q1** 用户提问
+    **A** 助手回复
+    *tools: Edit, Read*
+    ...
+    *session tools: ... | skills: ... | mcp: ...*
+"""
+
+import json
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+# 代码块超过这么多行时截断，保留开头和结尾
+CODE_MAX_LINES = 30
+CODE_HEAD_LINES = 12
+CODE_TAIL_LINES = 5
+
+# 调用栈超过这么多帧时截断
+TRACE_MAX_FRAMES = 8
+TRACE_KEEP_FRAMES = 3
+
+# 单条消息的最大字符数（截断时保留开头和结尾）
+USER_MAX_CHARS = 2000
+ASSISTANT_MAX_CHARS = 3000
+
+# 摘要中最多列出的文件数
+SUMMARY_MAX_FILES = 30
+
+# 与最近这么多条不同的提问比较相似度
+DEDUP_WINDOW = 8
+DEDUP_RATIO = 0.9
+# 相似度只比较提问的开头和结尾（SequenceMatcher 对长文本是平方复杂度）
+DEDUP_HEAD_CHARS = 300
+DEDUP_TAIL_CHARS = 100
+
+# 过渡性短句：只有一行、很短、以这些开头，并且不含代码、路径和数字（见 CHATTER_KEEP_PATTERN）。
+# 英文开头必须是完整的词（"OkHttp"、"Surefire" 不算），中文只用几乎只出现在过渡句中的开头
+# （"现在的默认端口……"、"首先需要……" 这类开头也常见于正式的回答）
+CHATTER_MAX_CHARS = 120
+CHATTER_PATTERN = re.compile(
+    r"^((let me|let's|now let me|now i'll|i'll|i will|i'm going to|first,? let me|next,? i'll|"
+    r"okay|ok|great|perfect|sure|got it)\b(?!['’-])|"
+    r"让我|我先|我来|接下来我|好的|好，|明白)",
+    re.IGNORECASE
+)
+# 含有这些内容的短句可能带有知识（代码、路径、文件名、数字），不当作过渡句
+CHATTER_KEEP_PATTERN = re.compile(r"[`/\\\d=<>{}()\[\]]|\w\.\w")
+
+CODE_FENCE = re.compile(r"^\s*(```|~~~)")
+# Python: File "...", line N；JS/Java/Go: at xxx (file:line) / at file:line
+FRAME_PATTERN = re.compile(r'^\s+(File ".*", line \d+|at \S.*(\(.*:\d+(:\d+)?\)|:\d+(:\d+)?))')
+NORMALIZE_PATTERN = re.compile(r"\W+")
+
+
+def message_text(content) -> str:
+    """消息内容转成文本（旧日志中用户消息可能是 block 列表，丢弃 tool_result）"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif isinstance(block, dict) and block.get("type") == "text":
+                parts.append(block.get("text", ""))
+        return "\n".join(p for p in parts if p)
+    return ""
+
+
+def clip(text: str, max_chars: int) -> str:
+    """超过 max_chars 时保留开头 2/3 和结尾 1/3"""
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head].rstrip()}\n…（省略 {len(text) - head - tail} 字）…\n{text[-tail:].lstrip()}"
+
+
+def _trim_code(lines: List[str]) -> List[str]:
+    """lines 为代码块内部的行（不含围栏）"""
+    if len(lines) <= CODE_MAX_LINES:
+        return lines
+    omitted = len(lines) - CODE_HEAD_LINES - CODE_TAIL_LINES
+    return lines[:CODE_HEAD_LINES] + [f"… {omitted} lines omitted …"] + lines[-CODE_TAIL_LINES:]
+
+
+def _trim_frames(frames: List[str]) -> List[str]:
+    if len(frames) <= TRACE_MAX_FRAMES:
+        return frames
+    omitted = len(frames) - 2 * TRACE_KEEP_FRAMES
+    return frames[:TRACE_KEEP_FRAMES] + [f"  … {omitted} frames omitted …"] + frames[-TRACE_KEEP_FRAMES:]
+
+
+def condense_text(text: str) -> str:
+    """截断文本中的长代码块和长调用栈"""
+    out: List[str] = []
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if CODE_FENCE.match(line):
+            fence = CODE_FENCE.match(line).group(1)
+            j = i + 1
+            while j < len(lines) and not lines[j].lstrip().startswith(fence):
+                j += 1
+            out.append(line)
+            out.extend(_trim_code(lines[i + 1:j]))
+            if j < len(lines):
+                out.append(lines[j])
+            i = j + 1
+            continue
+
+        if FRAME_PATTERN.match(line):
+            # 一段连续的调用栈（Python 的帧下面还有一行源码）
+            frames = []
+            j = i
+            while j < len(lines) and FRAME_PATTERN.match(lines[j]):
+                frame = lines[j]
+                if (j + 1 < len(lines) and lines[j].lstrip().startswith("File ")
+                        and lines[j + 1].startswith("    ") and not FRAME_PATTERN.match(lines[j + 1])):
+                    frame += "\n" + lines[j + 1]
+                    j += 1
+                frames.append(frame)
+                j += 1
+            out.extend(_trim_frames(frames))
+            i = j
+            continue
+
+        out.append(line)
+        i += 1
+    return "\n".join(out).strip()
+
+
+def drop_chatter(text: str) -> Tuple[str, int]:
+    """
+    去掉助手回复中单独成段的过渡性短句
+
+    Returns:
+        (剩下的文本, 去掉的段数)
+    """
+    paragraphs = re.split(r"\n\s*\n", text.strip())
+    kept = [p for p in paragraphs if not is_chatter(p.strip())]
+    return "\n\n".join(kept), len(paragraphs) - len(kept)
+
+
+def is_chatter(paragraph: str) -> bool:
+    """一段是否只是过渡性短句（一行、很短、以过渡语开头、不含代码、路径和数字）"""
+    return (len(paragraph) <= CHATTER_MAX_CHARS and "\n" not in paragraph
+            and CHATTER_PATTERN.match(paragraph) is not None
+            and CHATTER_KEEP_PATTERN.search(paragraph) is None)
+
+
+def normalize_prompt(text: str) -> str:
+    """用于判断重复提问：小写、去标点和空白"""
+    return NORMALIZE_PATTERN.sub(" ", text.lower()).strip()
+
+
+def similar(a: str, b: str) -> bool:
+    """两个规范化后的提问是否几乎相同"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > max(len(a), len(b)) * (1 - DEDUP_RATIO):
+        return False
+    limit = DEDUP_HEAD_CHARS + DEDUP_TAIL_CHARS
+    if len(a) > limit:
+        a = a[:DEDUP_HEAD_CHARS] + a[-DEDUP_TAIL_CHARS:]
+    if len(b) > limit:
+        b = b[:DEDUP_HEAD_CHARS] + b[-DEDUP_TAIL_CHARS:]
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    # 先用两个快速的上界排除明显不同的提问
+    return (matcher.real_quick_ratio() >= DEDUP_RATIO and matcher.quick_ratio() >= DEDUP_RATIO
+            and matcher.ratio() >= DEDUP_RATIO)
+
+
+class _Turn:
+    def __init__(self, question: str):
+        self.question = question
+        self.repeats = 0
+        self.answers: List[str] = []
+        self.tools: List[str] = []
+
+
+def condense_records(records: List[Dict], session_id: str = "") -> Tuple[str, Dict[str, int]]:
+    """
+    把简化日志的记录整理成摘要
+
+    Returns:
+        (摘要文本, 统计 {turns, duplicate_prompts, dropped_chatter})
+    """
+    turns: List[_Turn] = []
+    recent: List[Tuple[str, _Turn]] = []
+    summary: Optional[Dict] = None
+    stats = {"turns": 0, "duplicate_prompts": 0, "dropped_chatter": 0}
+
+    current: Optional[_Turn] = None
+    for record in records:
+        if record.get("type") == "session_summary":
+            summary = record
+            continue
+
+        role = record.get("role")
+        text = message_text(record.get("content", "")).strip()
+
+        if role == "user":
+            if not text:
+                continue
+            key = normalize_prompt(text)
+            duplicate = next((turn for seen_key, turn in recent if similar(key, seen_key)), None)
+            if duplicate is not None:
+                duplicate.repeats += 1
+                stats["duplicate_prompts"] += 1
+                current = duplicate
+                continue
+
+            current = _Turn(clip(condense_text(text), USER_MAX_CHARS))
+            turns.append(current)
+            recent.append((key, current))
+            recent = recent[-DEDUP_WINDOW:]
+
+        elif role == "assistant":
+            if current is None:
+                current = _Turn("")
+                turns.append(current)
+            for tool in record.get("used", []):
+                if tool not in current.tools:
+                    current.tools.append(tool)
+            answer, dropped = drop_chatter(text)
+            stats["dropped_chatter"] += dropped
+            if not answer:
+                continue
+            current.answers.append(clip(condense_text(answer), ASSISTANT_MAX_CHARS))
+
+    lines = [f"### session {session_id}".rstrip()]
+    n = 0
+    for turn in turns:
+        if turn.question:
+            n += 1
+            repeat = f"（重复 {turn.repeats} 次）" if turn.repeats else ""
+            lines.append(f"**Q{n}**{repeat} {turn.question}")
+        for answer in turn.answers:
+            lines.append(f"**A** {answer}")
+        if turn.tools:
+            lines.append(f"*tools: {', '.join(sorted(turn.tools))}*")
+    stats["turns"] = n
+
+    if summary:
+        parts = [f"{name}: {', '.join(summary.get(name, []))}"
+                 for name in ("tools", "skills", "mcp") if summary.get(name)]
+        if parts:
+            lines.append(f"*session {' | '.join(parts)}*")
+
+        files = summary.get("files", [])
+        scope = [f"project: {summary['project']}"] if summary.get("project") else []
+        if files:
+            more = f" 等 {len(files)} 个" if len(files) > SUMMARY_MAX_FILES else ""
+            scope.append(f"files: {', '.join(files[:SUMMARY_MAX_FILES])}{more}")
+        if scope:
+            lines.insert(1, f"*{' | '.join(scope)}*")
+
+    return "\n".join(lines) + "\n", stats
+
+
+def condense_log(data: bytes, session_id: str = "") -> bytes:
+    """压缩一个 JSONL 日志（损坏的行跳过）"""
+    records = []
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    digest, _ = condense_records(records, session_id)
+    return digest.encode("utf-8")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""配置读取"""
+
+import json
+from pathlib import Path
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+CONFIG_FILE = GANGSMEM_DIR / "config.json"
+
+DEFAULT_CONFIG = {
+    "auto_inject": True,
+    "max_inject_results": 3,
+    "max_inject_chars": 1000,
+    # 每条结果注入的片段长度：取最佳小节中与 prompt 匹配的部分（见 db.search），0 表示只用固定摘要
+    "inject_excerpt_chars": 200,
+    "use_jieba": False,
+    # 按项目范围检索（见 lib/scope.py）：先搜索当前项目的文档，不够时再搜索通用文档
+    "project_scope": True,
+    # 查询规划（见 lib/planner.py）：最多保留的查询词数、文档频率比例上限
+    "query_max_terms": 32,
+    "query_max_df_ratio": 0.5,
+    # 词存在性过滤器（见 lib/presence.py）及其假阳性率
+    "presence_filter": True,
+    "presence_filter_fp_rate": 0.01,
+    # 排序（见 db.Ranking）：各列的 bm25 权重；按 updated 日期的时间衰减（权重、半衰期天数）；
+    # 按注入次数加权（0 表示不用）
+    "rank_weights": {"id": 1.0, "title": 4.0, "keywords": 3.0, "content": 1.0, "summary": 0.5, "cjk": 1.0,
+                     "files": 2.0, "scope": 0.0},
+    "rank_recency_weight": 0.3,
+    "rank_half_life_days": 180,
+    "rank_usage_weight": 0.1,
+    # 向量检索（见 lib/vectors.py，需要 numpy）：与 bm25 结果融合；向量维度；
+    # 余弦相似度下限及比噪声最大值至少高出几个标准差；每一路参与融合的候选数
+    "vector_search": False,
+    "vector_dim": 1024,
+    "vector_min_score": 0.1,
+    "vector_noise_margin": 1.5,
+    "fusion_candidates": 20,
+    # 常驻搜索进程（见 lib/daemon.py）
+    "use_daemon": False,
+    "daemon_idle_timeout": 3600,
+    # 日志存储："files" 每个 session 一个文件；"rolled" 已结束的日期归档成一个压缩文件（见 lib/logstore.py）
+    "log_storage": "files",
+    # 定时分析：并行的分析进程数；每批的字节预算和日志数上限；每次运行的时间预算（秒）
+    "analyze_workers": 1,
+    "analyze_batch_bytes": 300000,
+    "analyze_batch_size": 20,
+    "analyze_time_budget": 1800,
+    # 分析失败的日志最多尝试的次数
+    "analyze_max_attempts": 3,
+    # 分析前在本地把日志压缩成摘要放进 prompt（见 lib/condense.py）
+    "analyze_condense": True,
+    # 分析前用搜索索引为每个日志找出最相关的几篇文档放进 prompt（0 表示不做）
+    "analyze_route_top_k": 3,
+}
+
+
+def get_config() -> dict:
+    """读取配置（缺失的项使用默认值）"""
+    config = dict(DEFAULT_CONFIG)
+    try:
+        config.update(json.loads(CONFIG_FILE.read_text()))
+    except Exception:
+        # 没有配置文件（不单独检查，少一次 stat）或格式错误时使用默认值
+        pass
+    return config
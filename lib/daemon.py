@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+常驻搜索进程（可选）
+
+每次 prompt 都冷启动 inject_memory.py 需要重新加载 Python、db/tokenizer、
+config.json 并打开新的 SQLite 连接。常驻进程把这些状态保持在内存中，
+通过 ~/.gangsmem/search.sock（Unix domain socket）响应搜索请求。
+
+协议：一个连接一次请求，客户端发送一行 JSON 并关闭写端，
+服务端返回一行 JSON 后关闭连接。
+
+    请求: {"prompt": "...", "cwd": "..."}
+    响应: {"output": "<要注入的文本，可能为空>", "ms": {各段耗时（毫秒）}, "error": "<可选>"}
+
+耗时和出错由发起请求的 hook 合并到自己的记录中（见 lib/telemetry.py），常驻进程不写 metrics.log。
+
+inject_memory.py 每次冷启动都会导入这个模块（query_daemon），模块级只导入客户端需要的内置模块，
+路径用字符串（不导入 pathlib、typing，约省 10 ms）；服务端用到的模块在函数内导入。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+
+GANGSMEM_DIR = os.path.join(os.path.expanduser("~"), ".gangsmem")
+SOCKET_PATH = os.path.join(GANGSMEM_DIR, "search.sock")
+PID_FILE = os.path.join(GANGSMEM_DIR, "daemon.pid")
+DAEMON_LOG = os.path.join(GANGSMEM_DIR, "daemon.log")
+
+# 单个请求最大字节数（prompt 可能是很长的粘贴内容）
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+
+
+def query_daemon(payload: dict, timeout: float = 0.5) -> dict | None:
+    """
+    向常驻进程发送请求
+
+    Args:
+        payload: 请求内容
+        timeout: 总超时（秒）
+
+    Returns:
+        响应字典；进程不存在、超时或出错时返回 None（调用方应回退到进程内搜索）
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(SOCKET_PATH)
+            sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+
+            chunks = []
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                sock.settimeout(remaining)
+                data = sock.recv(65536)
+                if not data:
+                    break
+                chunks.append(data)
+
+        return json.loads(b"".join(chunks).decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def is_running() -> bool:
+    """检查常驻进程是否在响应"""
+    return query_daemon({"ping": True}, timeout=0.2) is not None
+
+
+def start_daemon() -> bool:
+    """在后台启动常驻进程（已在运行则直接返回）"""
+    import subprocess
+    import sys
+
+    if is_running():
+        return True
+
+    os.makedirs(GANGSMEM_DIR, exist_ok=True)
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "scripts", "search_daemon.py")
+    with open(DAEMON_LOG, "a", encoding="utf-8") as log_file:
+        subprocess.Popen(
+            [sys.executable, script, "run"],
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=log_file,
+            start_new_session=True,
+            close_fds=True
+        )
+
+    # 等待 socket 就绪
+    for _ in range(50):
+        if is_running():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def stop_daemon() -> bool:
+    """停止常驻进程"""
+    import signal
+
+    try:
+        with open(PID_FILE) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, signal.SIGTERM)
+        return True
+    except (ValueError, OSError):
+        return False
+
+
+class SearchDaemon:
+    """保持数据库连接、配置和分词器常驻的搜索服务"""
+
+    def __init__(self, idle_timeout: float | None = None):
+        self.conn = None  # sqlite3.Connection（只读，数据库文件被替换时重新打开）
+        self.db_key = None
+        self.config: dict = {}
+        self.config_mtime = None
+        self.idle_timeout = idle_timeout
+        self.running = False
+
+    def _refresh_config(self):
+        """config.json 变化时重新读取"""
+        from config import CONFIG_FILE, get_config
+        try:
+            mtime = CONFIG_FILE.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self.config_mtime or not self.config:
+            self.config = get_config()
+            self.config_mtime = mtime
+
+    def _refresh_connection(self):
+        """数据库文件被替换（inode 变化）时重新打开连接，返回当前连接（没有数据库时为 None）"""
+        from db import DB_PATH, get_read_connection
+        try:
+            st = DB_PATH.stat()
+            key = (st.st_dev, st.st_ino)
+        except OSError:
+            key = None
+
+        if key != self.db_key:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+            if key is not None:
+                self.conn = get_read_connection()
+            self.db_key = key
+        return self.conn
+
+    def handle(self, payload: dict) -> dict:
+        """处理单个请求"""
+        if payload.get("ping"):
+            return {"pong": True, "pid": os.getpid()}
+
+        from retrieval import render_for_prompt
+        from telemetry import Trace
+        trace = Trace("daemon")
+        self._refresh_config()
+        trace.mark("config")
+        if not self.config.get("use_daemon", False):
+            # 关闭了 use_daemon：处理完这个请求后退出（hook 收到没有 output 的响应时回退到进程内搜索），
+            # 不再用可能已经过时的状态继续提供搜索
+            self.running = False
+            return {"disabled": True, "ms": trace.rounded()}
+        conn = self._refresh_connection()
+        trace.mark("open_db")
+        if conn is None:
+            return {"output": "", "ms": trace.rounded()}
+
+        output = render_for_prompt(payload.get("prompt", ""), self.config, conn=conn, trace=trace,
+                                   cwd=payload.get("cwd", ""))
+        response = {"output": output, "ms": trace.rounded()}
+        if trace.counts:
+            response["n"] = trace.counts
+        if trace.errors:
+            response["error"] = trace.errors[0]
+        return response
+
+    def _serve_client(self, client: socket.socket):
+        client.settimeout(1.0)
+        chunks = []
+        size = 0
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+            size += len(data)
+            if size > MAX_REQUEST_BYTES:
+                return
+
+        try:
+            payload = json.loads(b"".join(chunks).decode("utf-8"))
+            response = self.handle(payload)
+        except Exception as e:
+            response = {"error": str(e)}
+
+        client.sendall(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def _cleanup(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        for path in (SOCKET_PATH, PID_FILE):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def serve_forever(self):
+        """监听 socket 直到收到 SIGTERM 或空闲超时"""
+        import select
+        import signal
+
+        os.makedirs(GANGSMEM_DIR, exist_ok=True)
+
+        # 清理上次异常退出留下的 socket
+        if os.path.exists(SOCKET_PATH):
+            if is_running():
+                raise RuntimeError("daemon already running")
+            os.unlink(SOCKET_PATH)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(SOCKET_PATH)
+        os.chmod(SOCKET_PATH, 0o600)
+        server.listen(16)
+        with open(PID_FILE, "w") as f:
+            f.write(str(os.getpid()))
+
+        def _stop(signum, frame):
+            self.running = False
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        # 预热：提前加载模块、配置和连接
+        self._refresh_config()
+        self._refresh_connection()
+        if self.idle_timeout is None:
+            self.idle_timeout = self.config.get("daemon_idle_timeout", 3600)
+
+        self.running = True
+        last_request = time.monotonic()
+        try:
+            while self.running:
+                try:
+                    readable, _, _ = select.select([server], [], [], 1.0)
+                except InterruptedError:
+                    continue
+                if not readable:
+                    if self.idle_timeout and time.monotonic() - last_request > self.idle_timeout:
+                        break
+                    continue
+
+                client, _ = server.accept()
+                with client:
+                    try:
+                        self._serve_client(client)
+                    except OSError:
+                        pass
+                last_request = time.monotonic()
+        finally:
+            server.close()
+            self._cleanup()
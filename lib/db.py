@@ -1,12 +1,60 @@
 #!/usr/bin/env python3
-"""SQLite FTS5 数据库操作"""
+"""
+SQLite FTS5 数据库操作
 
+索引使用 WAL 模式：写入（增量更新）不会阻塞读取。
+全量重建写入影子库 search.db.shadow，完成后通过 rename 原子替换 search.db，
+搜索端始终只读打开，永远看不到空的或写了一半的索引。
+
+每篇文档按 `## ` 小节拆成多行（见 split_sections），每行带有文档的 id、title、keywords、summary、
+项目范围（files、scope，见 lib/scope.py）和一个小节的正文。搜索时每篇文档只取得分最好的一节，注入时用该节中与查询匹配的片段代替固定的摘要。
+
+memories 是 contentless 的 FTS5 表（content=''），只保存倒排索引，不保存正文和 cjk 列的副本；
+显示用的 title、summary 等保存在小表 documents 中，每行对应的文档和小节保存在 sections 中。
+片段只在需要时从 markdown 文件中读取该节的正文生成（见 _add_excerpts）。
+
+SQLite 3.43 之前 contentless 表不能删除行（删除需要提供原来的各列值），增量更新时只删除
+sections 中的行，倒排索引中留下的旧行搜索时通过 sections 过滤掉；旧行超过 STALE_ROWS_RATIO 时
+由 rebuild_index 全量重建（见 needs_compaction）。
+"""
+
+import os
+import fcntl
+import json
+import math
+import re
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, NamedTuple, Optional, Iterable, Tuple, Set
+
+from scope import scope_token
+from tokenizer import CJK_PATTERN, segment_cjk
 
 GANGSMEM_DIR = Path.home() / ".gangsmem"
+MEMORY_DIR = GANGSMEM_DIR / "memory"
 DB_PATH = GANGSMEM_DIR / "search.db"
+SHADOW_PATH = GANGSMEM_DIR / "search.db.shadow"
+LOCK_PATH = GANGSMEM_DIR / "index.lock"
+# 索引清单（scripts/rebuild_index.py 维护：文件名 -> 文档 id、mtime、大小、内容哈希）
+MANIFEST_PATH = GANGSMEM_DIR / "index_manifest.json"
+
+# 索引结构版本（PRAGMA user_version），不一致时需要全量重建
+#   1: 增加 cjk 列（中文 2-4 字预切分）
+#   2: 增加 memories_vocab（词频统计）和 index_meta
+#   3: 增加 doc_signals（排序用的文档信号：更新日期、注入次数）
+#   4: 按 ## 小节分块，每节一行，增加 section 列
+#   5: 增加 files 和 scope 列（项目范围）
+#   6: memories 改为 contentless 表，显示用的列移到 documents 和 sections
+SCHEMA_VERSION = 6
+
+# 倒排索引中已删除的旧行超过行数的这个比例时需要全量重建
+STALE_ROWS_RATIO = 0.2
+
+# 只读连接的忙等待超时（毫秒）；WAL 模式下读取几乎不会被阻塞
+READ_BUSY_TIMEOUT_MS = 200
 
 
 def db_exists() -> bool:
@@ -15,68 +63,770 @@ def db_exists() -> bool:
 
 
 def get_connection() -> sqlite3.Connection:
-    """获取数据库连接"""
+    """获取数据库连接（可写）"""
     GANGSMEM_DIR.mkdir(exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 
-def init_db() -> sqlite3.Connection:
-    """初始化 FTS5 数据库"""
-    conn = get_connection()
+def get_read_connection() -> sqlite3.Connection:
+    """获取只读连接（搜索热路径使用）"""
+    path = str(DB_PATH).replace("%", "%25").replace("?", "%3f").replace("#", "%23")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True,
+                           timeout=READ_BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {READ_BUSY_TIMEOUT_MS}")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+@contextmanager
+def index_lock():
+    """
+    索引写锁（进程间互斥）
+
+    增量更新和影子库替换都必须持有这把锁，避免并发写入
+    """
+    GANGSMEM_DIR.mkdir(exist_ok=True)
+    with open(LOCK_PATH, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def discard_shadow():
+    """删除残留的影子库"""
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        try:
+            os.unlink(str(SHADOW_PATH) + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def swap_in_shadow():
+    """
+    用影子库原子替换当前索引（调用方需持有 index_lock）
+
+    影子库由 IndexWriter 写完并关闭后不带 -wal/-shm 文件。
+    替换前先把旧库的 WAL 合并回主文件并删除 -wal/-shm，
+    否则新库会和旧库的 WAL 配对，读到错误的页。
+    仍持有旧库连接的读者继续读旧文件，直到重新打开。
+    """
+    if DB_PATH.exists():
+        try:
+            conn = sqlite3.connect(DB_PATH, timeout=1.0)
+            try:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+    for suffix in ("-wal", "-shm"):
+        try:
+            os.unlink(str(DB_PATH) + suffix)
+        except FileNotFoundError:
+            pass
+
+    os.replace(SHADOW_PATH, DB_PATH)
+
+
+def create_schema(conn: sqlite3.Connection):
+    """
+    创建 FTS5 表（已存在则跳过）
+
+    cjk 列保存 title/keywords/content 中中文片段的 2-4 字组合（见 tokenizer.segment_cjk），
+    与查询端的切分方式一致；files 为文档涉及的文件路径，scope 为所属项目的标记词
+    （见 scope.scope_token，按列过滤，不参与排序）。memories 不保存列的值，
+    sections 的 rowid 与 memories 一致，part 为该节在 split_sections 结果中的序号，
+    section 为小节标题（开头部分为空）；documents 的 path 为 markdown 文件（相对于 MEMORY_DIR）
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'memories'"
+    ).fetchone()
+    if exists:
+        return
+
     conn.execute("""
-        CREATE VIRTUAL TABLE IF NOT EXISTS memories USING fts5(
+        CREATE VIRTUAL TABLE memories USING fts5(
             id,
             title,
             keywords,
             content,
             summary,
+            cjk,
+            files,
+            scope,
+            content='',
             tokenize='porter unicode61'
         )
     """)
+    # 每个词出现在多少行（小节）中（查询规划用）
+    conn.execute("CREATE VIRTUAL TABLE memories_vocab USING fts5vocab(memories, row)")
+    conn.execute("""
+        CREATE TABLE sections(
+            rowid INTEGER PRIMARY KEY,
+            id TEXT NOT NULL,
+            part INTEGER NOT NULL,
+            section TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX sections_id ON sections(id)")
+    conn.execute("""
+        CREATE TABLE documents(
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            keywords TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            scope TEXT NOT NULL,
+            path TEXT
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE index_meta(
+            key TEXT PRIMARY KEY,
+            value
+        )
+    """)
+    # 排序信号（见 search）：updated_day 为 updated 日期的 date.toordinal()，usage 为 ln(1 + 注入次数)
+    conn.execute("""
+        CREATE TABLE doc_signals(
+            id TEXT PRIMARY KEY,
+            updated_day INTEGER,
+            usage REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def schema_is_current() -> bool:
+    """当前索引的结构版本是否与代码一致"""
+    if not db_exists():
+        return False
+    try:
+        conn = get_read_connection()
+        try:
+            return conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+
+def init_db() -> sqlite3.Connection:
+    """初始化 FTS5 数据库"""
+    conn = get_connection()
+    create_schema(conn)
     conn.commit()
     return conn
 
 
-def search(query: str, limit: int = 5) -> List[Dict]:
+# memories 表中参与 bm25 的列（bm25() 的权重参数按这个顺序传入）
+RANK_COLUMNS = ("id", "title", "keywords", "content", "summary", "cjk", "files", "scope")
+# content 列的序号（snippet() 的参数）
+CONTENT_COLUMN = RANK_COLUMNS.index("content")
+
+
+class Ranking(NamedTuple):
+    """
+    search() 的排序参数
+
+    score = bm25(各列加权) * 时间衰减 * 使用加权（bm25 为负数，越小越相关）
+    - 时间衰减：1 - recency_weight + recency_weight / (1 + 距 updated 的天数 / half_life_days)，
+      刚更新的文档为 1，经过 half_life_days 天衰减一半的 recency_weight
+    - 使用加权：1 + usage_weight * ln(1 + 注入次数)
+    两个信号在建索引时写入 doc_signals，排序仍是一条 SQL。
     """
-    全文搜索记忆文档
+    # scope 列只用来过滤（见 search 的 scope 参数），不参与得分
+    weights: Tuple[float, ...] = tuple(0.0 if column == "scope" else 1.0 for column in RANK_COLUMNS)
+    recency_weight: float = 0.0
+    half_life_days: float = 180.0
+    usage_weight: float = 0.0
+    today: int = 0
+
+
+def _search_sql(ranking: Ranking, signals: bool) -> str:
+    """
+    搜索语句：先在倒排索引中按得分取前 :limit 行，再从 sections 和 documents 读取这几行的显示列
+
+    倒排索引中已删除的旧行在 sections 中没有对应的行，id 为 NULL（调用方跳过）
+    """
+    weights = ", ".join(f"{float(w)!r}" for w in ranking.weights)
+    if not signals:
+        ranked = f"""
+            SELECT rowid, bm25(memories, {weights}) as score
+            FROM memories
+            WHERE memories MATCH :query
+            ORDER BY score
+            LIMIT :limit
+        """
+    else:
+        ranked = f"""
+            SELECT m.rowid, bm25(memories, {weights})
+                   * (1.0 - :recency + :recency / (1.0 + max(0, :today - COALESCE(g.updated_day, :today)) / :half_life))
+                   * (1.0 + :usage * COALESCE(g.usage, 0.0)) as score
+            FROM memories m
+            JOIN sections x ON x.rowid = m.rowid
+            LEFT JOIN doc_signals g ON g.id = x.id
+            WHERE memories MATCH :query
+            ORDER BY score
+            LIMIT :limit
+        """
+    return f"""
+        SELECT r.rowid, s.id, d.title, d.keywords, d.summary, s.section, s.part, d.path, r.score
+        FROM ({ranked}) r
+        LEFT JOIN sections s ON s.rowid = r.rowid
+        LEFT JOIN documents d ON d.id = s.id
+        ORDER BY r.score
+    """
+
+
+def _legacy_search_sql(ranking: Ranking, signals: bool, sections: bool = True) -> str:
+    """结构版本 6 之前的索引（memories 保存了各列的值）的搜索语句"""
+    weights = ", ".join(f"{float(w)!r}" for w in ranking.weights)
+    # 旧结构的索引没有 section 列（每篇文档一行）
+    section = "section" if sections else "'' as section"
+    if not signals:
+        return f"""
+            SELECT rowid, id, title, keywords, summary, {section}, NULL as part, NULL as path,
+                   bm25(memories, {weights}) as score
+            FROM memories
+            WHERE memories MATCH :query
+            ORDER BY score
+            LIMIT :limit
+        """
+    return f"""
+        SELECT m.rowid, m.id, m.title, m.keywords, m.summary, {section}, NULL as part, NULL as path,
+               bm25(memories, {weights})
+               * (1.0 - :recency + :recency / (1.0 + max(0, :today - COALESCE(s.updated_day, :today)) / :half_life))
+               * (1.0 + :usage * COALESCE(s.usage, 0.0)) as score
+        FROM memories m
+        LEFT JOIN doc_signals s ON s.id = m.id
+        WHERE memories MATCH :query
+        ORDER BY score
+        LIMIT :limit
+    """
+
+
+# 每篇文档只取得分最好的一节：按得分多取若干行后在 Python 中去重（每篇第一次出现的就是最好的一节）。
+# 比 row_number() OVER (PARTITION BY id) 快，窗口函数要对全部匹配行排序（bm25() 也不能直接用在窗口里）
+SECTION_FETCH_FACTOR = 4
+
+
+# 片段中标记匹配词的字符（不会出现在正文中），截取时以第一个匹配词为中心
+_HIT_START, _HIT_END = "\x02", "\x03"
+# snippet() 最多返回的词数（FTS5 的上限为 64）
+SNIPPET_TOKENS = 64
+
+
+def _excerpt(snippet: str, max_chars: int) -> str:
+    """
+    把 snippet() 的结果整理成注入用的片段：去掉标题行（小节标题另外显示），合并空白，
+    以第一个匹配词为中心截取 max_chars 个字符（中文连续的一段在 unicode61 中是一个词，可能很长）
+    """
+    lines = [line for line in snippet.split("\n")
+             if not line.replace(_HIT_START, "").lstrip().startswith("#")]
+    marked = " ".join(" ".join(lines).split())
+    # 第一个匹配词之前没有标记，它在去掉标记后的文本中位置不变
+    hit = max(marked.find(_HIT_START), 0)
+    text = marked.replace(_HIT_START, "").replace(_HIT_END, "")
+    if len(text) <= max_chars:
+        return text
+    start = max(0, min(hit - max_chars // 4, len(text) - max_chars))
+    return ("…" if start > 0 else "") + text[start:start + max_chars] + "…"
+
+
+# markdown 的 frontmatter（与 rebuild_index.parse_frontmatter 一致，正文从它之后开始）
+FRONTMATTER = re.compile(r"^---\s*\n.*?\n---\s*\n", re.DOTALL)
+
+
+def _read_section(path: str, part: int, heading: str) -> Optional[str]:
+    """
+    从 markdown 文件中读取第 part 节的正文（path 相对于 MEMORY_DIR）
+
+    文件在建索引之后被修改过（下次重建之前）时按小节标题查找，找不到或文件已不存在时返回 None
+    """
+    try:
+        text = (MEMORY_DIR / path).read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+    match = FRONTMATTER.match(text)
+    chunks = split_sections(text[match.end():] if match else text)
+    if part is not None and part < len(chunks) and chunks[part][0] == heading:
+        return chunks[part][1]
+    for chunk_heading, chunk in chunks:
+        if chunk_heading == heading:
+            return chunk
+    return None
+
+
+# 生成片段、分词用的内存连接（每个线程一个：sqlite3 连接不能在创建它的线程之外使用）
+_scratch = threading.local()
+
+
+def _mark_cjk(query: str, chunk: str) -> Optional[str]:
+    """
+    在原文中标出查询里的中文 n-gram（同 snippet() 的标记），没有出现时返回 None
+
+    unicode61 把一段连续中文当作一个词，中文查询词只能命中 cjk 列的预切分，
+    content 列的 snippet() 标不出来
+    """
+    grams = sorted(set(CJK_PATTERN.findall(query)), key=len, reverse=True)
+    if not grams:
+        return None
+    marked, n = re.subn("|".join(map(re.escape, grams)), lambda m: _HIT_START + m.group() + _HIT_END, chunk)
+    return marked if n else None
+
+
+def _add_excerpts(query: str, results: List[Dict], max_chars: int):
+    """
+    为每个结果取所在小节中与查询匹配的片段
+
+    索引中没有正文：只读取选中的几节，写入一个内存中的同结构 FTS5 表，用同一个查询的 snippet()
+    标出匹配词（分词与索引一致）。正文中没有匹配词时改为直接查找查询中的中文 n-gram（_mark_cjk），
+    仍然没有（只匹配了标题、关键词）的节取开头部分。
+    """
+    chunks: Dict[int, str] = {}
+    for i, result in enumerate(results):
+        if result.get("path"):
+            chunk = _read_section(result["path"], result["part"], result["section"])
+            if chunk:
+                chunks[i] = chunk
+    if not chunks:
+        return
+
+    conn = getattr(_scratch, "snippet", None)
+    if conn is None:
+        conn = _scratch.snippet = sqlite3.connect(":memory:", isolation_level=None)
+        conn.execute(
+            f"CREATE VIRTUAL TABLE s USING fts5({', '.join(RANK_COLUMNS)}, tokenize='porter unicode61')"
+        )
+
+    # 用完后回滚（比逐行 DELETE 快得多，FTS5 删除一行要重新分词）
+    conn.execute("BEGIN")
+    try:
+        conn.executemany("INSERT INTO s(rowid, content) VALUES (?, ?)", chunks.items())
+        snippets = dict(conn.execute(f"""
+            SELECT rowid, snippet(s, {CONTENT_COLUMN}, ?, ?, '…', {SNIPPET_TOKENS})
+            FROM s
+            WHERE s MATCH ?
+        """, (_HIT_START, _HIT_END, query)))
+    finally:
+        conn.execute("ROLLBACK")
+    for i, chunk in chunks.items():
+        results[i]["excerpt"] = _excerpt(snippets.get(i) or _mark_cjk(query, chunk) or chunk, max_chars)
+
+
+def search(query: str, limit: int = 5,
+           conn: Optional[sqlite3.Connection] = None,
+           ranking: Optional[Ranking] = None, trace=None,
+           excerpt_chars: int = 0, scope: Optional[str] = None) -> List[Dict]:
+    """
+    全文搜索记忆文档（每篇文档只返回得分最好的一节）
 
     Args:
         query: 搜索词（支持 FTS5 语法，如 "word1 OR word2"）
         limit: 返回结果数量限制
+        conn: 复用的连接（由调用方负责关闭），为空则临时打开
+        ranking: 排序参数，为空时按各列等权的 bm25 排序
+        trace: telemetry.Trace，查询出错时记入其中（仍然返回空列表）
+        excerpt_chars: 大于 0 时为每个结果取该节中与查询匹配的片段（excerpt），最多这么多字符
+        scope: 只搜索 scope 列为这个标记词的文档（见 scope.scope_token），为空时搜索全部
 
     Returns:
-        匹配的文档列表，包含 id, title, summary, score
+        匹配的文档列表，包含 id, title, keywords, summary, section（最佳小节的标题）,
+        rowid（该节所在的行）, part（该节的序号）, path（markdown 文件，相对于 MEMORY_DIR）,
+        score，以及 excerpt（需要时）
     """
-    if not db_exists():
-        return []
+    own_conn = conn is None
+    if own_conn:
+        if not db_exists():
+            return []
+        try:
+            conn = get_read_connection()
+        except sqlite3.OperationalError as e:
+            if trace is not None:
+                trace.error(e)
+            return []
 
-    conn = get_connection()
+    ranking = ranking or Ranking()
+    signals = ranking.recency_weight > 0 or ranking.usage_weight > 0
+    params = {
+        # 先与 scope 的倒排列表求交集，候选集合只有这个范围内的文档
+        "query": f"scope : {scope} AND ({query})" if scope else query, "limit": limit,
+        "recency": float(ranking.recency_weight), "half_life": max(float(ranking.half_life_days), 1.0),
+        "usage": float(ranking.usage_weight), "today": ranking.today or date.today().toordinal(),
+    }
     try:
-        cursor = conn.execute("""
-            SELECT id, title, summary, bm25(memories) as score
-            FROM memories
-            WHERE memories MATCH ?
-            ORDER BY score
-            LIMIT ?
-        """, (query, limit))
-
-        results = []
-        for row in cursor:
-            results.append({
-                "id": row["id"],
-                "title": row["title"],
-                "summary": row["summary"],
-                "score": row["score"]
-            })
+        legacy = False
+        sections = True
+        fetch = limit * SECTION_FETCH_FACTOR
+        while True:
+            params["limit"] = fetch
+            sql = _legacy_search_sql(ranking, signals, sections) if legacy else _search_sql(ranking, signals)
+            try:
+                rows = conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                # 旧结构的索引还没有 sections/documents、doc_signals、section 或 scope 列（重建后即可），
+                # 先不用这些
+                if not legacy and "no such table" in str(e) and ("sections" in str(e) or "documents" in str(e)):
+                    legacy = True
+                elif signals and "doc_signals" in str(e):
+                    signals = False
+                elif sections and "section" in str(e):
+                    sections = False
+                elif params["query"] != query and "scope" in str(e):
+                    params["query"] = query
+                else:
+                    raise
+                continue
+
+            results = []
+            seen = set()
+            for row in rows:
+                # 已删除的旧行（id 为 NULL）和同一篇文档得分较低的小节
+                if row["id"] is None or row["id"] in seen:
+                    continue
+                seen.add(row["id"])
+                results.append({
+                    "id": row["id"],
+                    "title": row["title"],
+                    "keywords": row["keywords"],
+                    "summary": row["summary"],
+                    "section": row["section"],
+                    "rowid": row["rowid"],
+                    "part": row["part"],
+                    "path": row["path"],
+                    "score": row["score"]
+                })
+                if len(results) >= limit:
+                    break
+            # 结果不够且可能还有更多行时（某些文档的很多小节都匹配），多取一些再试
+            if len(results) >= limit or len(rows) < fetch:
+                break
+            fetch *= SECTION_FETCH_FACTOR
+
+        if excerpt_chars > 0:
+            _add_excerpts(query, results, excerpt_chars)
         return results
-    except sqlite3.OperationalError:
-        # 查询语法错误等
+    except sqlite3.OperationalError as e:
+        # 查询语法错误、数据库被锁或损坏等
+        if trace is not None:
+            trace.error(e)
         return []
     finally:
-        conn.close()
+        if own_conn:
+            conn.close()
+
+
+# 小节标题（二级标题）和代码块边界
+SECTION_HEADING = re.compile(r"^##\s+(.+?)\s*#*\s*$")
+CODE_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+def split_sections(content: str) -> List[Tuple[str, str]]:
+    """
+    按 `## ` 二级标题把正文拆成小节（代码块中的 ## 不算标题）
+
+    Returns:
+        [(小节标题, 小节正文), ...]，第一个 ## 之前的部分标题为空；
+        只有标题没有正文的部分（如只有 `# 标题` 的开头）并入下一节，没有下一节时并入上一节
+    """
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    in_fence = False
+    for line in content.split("\n"):
+        if CODE_FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = SECTION_HEADING.match(line)
+            if match:
+                sections.append((match.group(1), []))
+        sections[-1][1].append(line)
+
+    chunks: List[Tuple[str, str]] = []
+    pending: List[str] = []
+    for heading, lines in sections:
+        pending.extend(lines)
+        if any(line.strip() and not line.lstrip().startswith("#") for line in lines):
+            chunks.append((heading, "\n".join(pending).strip()))
+            pending = []
+    if not chunks:
+        return [("", content)]
+    if any(line.strip() for line in pending):
+        heading, text = chunks[-1]
+        chunks[-1] = (heading, text + "\n\n" + "\n".join(pending).strip())
+    return chunks
+
+
+def document_rows(doc: Dict) -> List[Tuple[str, ...]]:
+    """把文档字典转换成各小节的行（见 split_sections）：memories 的各列（RANK_COLUMNS 的顺序）和小节标题"""
+    keywords = doc.get("keywords", [])
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    files = doc.get("files", [])
+    if isinstance(files, str):
+        files = [files]
+    doc_id = str(doc["id"])
+    title = str(doc["title"])
+    keywords_str = " ".join(keywords)
+    summary = str(doc["summary"])
+    files_str = "\n".join(str(f) for f in files)
+    scope = scope_token(str(doc.get("project") or ""))
+    return [
+        (doc_id, title, keywords_str, chunk, summary,
+         segment_cjk("\n".join((title, keywords_str, chunk))), files_str, scope, heading)
+        for heading, chunk in split_sections(str(doc["content"]))
+    ]
+
+
+def day_number(value) -> Optional[int]:
+    """frontmatter 中的日期（YYYY-MM-DD 开头）-> date.toordinal()，无法解析时为 None"""
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+
+def _id_match_query(doc_id: str) -> str:
+    """按 id 列做短语匹配的 FTS5 查询（结构版本 6 之前的索引按 id 读取文档时用，避免全表扫描）"""
+    return 'id : "' + doc_id.replace('"', '""') + '"'
+
+
+class IndexWriter:
+    """
+    批量写入会话：复用同一个连接，所有写入在一个事务中完成
+
+    用法:
+        with IndexWriter() as writer:
+            writer.clear()
+            indexed, failures = writer.index_documents(docs)
+
+    正常退出时提交，发生异常时回滚。
+
+    Args:
+        db_path: 数据库文件，默认 DB_PATH
+        journal_mode: PRAGMA journal_mode（None 表示不修改）
+        synchronous: PRAGMA synchronous（OFF / NORMAL / FULL）
+        cache_size: PRAGMA cache_size（负数表示 KiB）
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, journal_mode: Optional[str] = "WAL",
+                 synchronous: Optional[str] = "NORMAL", cache_size: Optional[int] = -65536):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> "IndexWriter":
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 手动管理事务
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+        if self.journal_mode:
+            self.conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        if self.synchronous:
+            self.conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        if self.cache_size is not None:
+            self.conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        create_schema(self.conn)
+        self.conn.execute("BEGIN")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._update_meta()
+                self.conn.execute("COMMIT")
+            else:
+                self.conn.execute("ROLLBACK")
+        finally:
+            self.conn.close()
+            self.conn = None
+        return False
+
+    def _update_meta(self):
+        """
+        提交前更新行数和索引代数（读取端据此判断缓存是否失效）
+
+        doc_count 是倒排索引中的行（小节）数（包括已删除的旧行），与 memories_vocab 中的文档频率口径一致
+        """
+        self.conn.execute("""
+            INSERT OR REPLACE INTO index_meta(key, value)
+            VALUES ('doc_count', (SELECT count(*) FROM memories))
+        """)
+        self.conn.execute("""
+            INSERT OR REPLACE INTO index_meta(key, value)
+            VALUES ('generation', COALESCE(
+                (SELECT value FROM index_meta WHERE key = 'generation'), 0) + 1)
+        """)
+
+    def clear(self):
+        """清空索引"""
+        self.conn.execute("INSERT INTO memories(memories) VALUES ('delete-all')")
+        for table in ("sections", "documents", "doc_signals"):
+            self.conn.execute(f"DELETE FROM {table}")
+        self.conn.execute("DELETE FROM index_meta WHERE key = 'stale_rows'")
+
+    def delete_documents(self, doc_ids: Iterable[str]) -> int:
+        """
+        按 id 删除文档（包括它的所有小节），返回删除的行数
+
+        contentless 表不能删除行，倒排索引中的旧行留到下次全量重建，行数累计到 index_meta 的 stale_rows
+        """
+        deleted = 0
+        for doc_id in doc_ids:
+            cursor = self.conn.execute("DELETE FROM sections WHERE id = ?", (doc_id,))
+            deleted += max(cursor.rowcount, 0)
+            self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self.conn.execute("DELETE FROM doc_signals WHERE id = ?", (doc_id,))
+        if deleted:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO index_meta(key, value)
+                VALUES ('stale_rows', COALESCE(
+                    (SELECT value FROM index_meta WHERE key = 'stale_rows'), 0) + ?)
+            """, (deleted,))
+        return deleted
+
+    def _write_signals(self, docs: Dict[str, Dict]):
+        """写入新索引文档的排序信号（注入次数由 set_usage 写入）"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO doc_signals(id, updated_day, usage) VALUES (?, ?, 0)",
+            ((doc_id, day_number(doc.get("updated", ""))) for doc_id, doc in docs.items())
+        )
+
+    def set_usage(self, counts: Dict[str, int]):
+        """写入各文档的注入次数（不在索引中的 id 忽略）"""
+        self.conn.executemany(
+            "UPDATE doc_signals SET usage = ? WHERE id = ?",
+            ((math.log1p(max(count, 0)), doc_id) for doc_id, count in counts.items())
+        )
+
+    def _insert(self, rows_by_id: Dict[str, List[Tuple]], by_id: Dict[str, Dict]):
+        """写入文档的各行（rowid 接在倒排索引中最大的 rowid 之后，不与已删除的旧行重复）"""
+        rowid = self.conn.execute("SELECT COALESCE(max(rowid), 0) FROM memories").fetchone()[0]
+        index_rows, section_rows, doc_rows = [], [], []
+        for doc_id, rows in rows_by_id.items():
+            for part, row in enumerate(rows):
+                rowid += 1
+                index_rows.append((rowid,) + row[:len(RANK_COLUMNS)])
+                section_rows.append((rowid, doc_id, part, row[-1]))
+            _, title, keywords, _, summary, _, _, scope, _ = rows[0]
+            path = by_id[doc_id].get("path")
+            doc_rows.append((doc_id, title, keywords, summary, scope, str(path) if path else None))
+
+        self.conn.executemany("""
+            INSERT INTO memories(rowid, id, title, keywords, content, summary, cjk, files, scope)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, index_rows)
+        self.conn.executemany("INSERT INTO sections(rowid, id, part, section) VALUES (?, ?, ?, ?)",
+                              section_rows)
+        self.conn.executemany("""
+            INSERT OR REPLACE INTO documents(id, title, keywords, summary, scope, path)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, doc_rows)
+        self._write_signals(by_id)
+
+    def index_documents(self, docs: Iterable[Dict],
+                        replace: bool = True) -> Tuple[int, List[Tuple[str, str]]]:
+        """
+        批量索引文档
+
+        Args:
+            docs: 文档字典（id, title, keywords, content, summary，可选 updated、project、files，
+                  以及 path：markdown 文件，相对于 MEMORY_DIR，生成片段时从中读取正文）
+            replace: 是否先删除同 id 的旧文档（清空后写入时可以关闭）
+
+        Returns:
+            (成功数量, [(doc_id, 错误信息), ...])，单个文档失败不影响其他文档
+        """
+        rows_by_id: Dict[str, List[Tuple]] = {}
+        by_id: Dict[str, Dict] = {}
+        failures: List[Tuple[str, str]] = []
+        for doc in docs:
+            try:
+                rows = document_rows(doc)
+                rows_by_id[rows[0][0]] = rows
+                by_id[rows[0][0]] = doc
+            except (KeyError, TypeError) as e:
+                failures.append((str(doc.get("id", "?")), f"invalid document: {e}"))
+
+        if not rows_by_id:
+            return 0, failures
+
+        if replace:
+            self.delete_documents(rows_by_id)
+
+        self.conn.execute("SAVEPOINT bulk_insert")
+        try:
+            self._insert(rows_by_id, by_id)
+            self.conn.execute("RELEASE bulk_insert")
+            return len(rows_by_id), failures
+        except sqlite3.Error:
+            self.conn.execute("ROLLBACK TO bulk_insert")
+            self.conn.execute("RELEASE bulk_insert")
+
+        # 整批失败时逐篇写入，找出出错的文档
+        indexed = 0
+        for doc_id, rows in rows_by_id.items():
+            self.conn.execute("SAVEPOINT single_insert")
+            try:
+                self._insert({doc_id: rows}, {doc_id: by_id[doc_id]})
+                self.conn.execute("RELEASE single_insert")
+                indexed += 1
+            except sqlite3.Error as e:
+                self.conn.execute("ROLLBACK TO single_insert")
+                self.conn.execute("RELEASE single_insert")
+                failures.append((doc_id, str(e)))
+        return indexed, failures
+
+
+def _invalidate_manifest(doc_ids: Optional[Set[str]] = None, paths: Iterable[str] = ()):
+    """
+    让下次增量重建从文件重新索引这些文档（调用方需持有 index_lock）
+
+    单篇写入不经过 rebuild_index：清单中这些文档的条目（以及 paths 中的文件）标记为已修改，
+    下次增量重建重新读取文件，文件已不存在时删除索引。doc_ids 为 None 时删除整个清单（改为全量重建）。
+    """
+    if doc_ids is None:
+        MANIFEST_PATH.unlink(missing_ok=True)
+        return
+    try:
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return  # 没有清单时下次本来就是全量重建
+    files = manifest.get("files", {})
+    for name, entry in files.items():
+        if entry.get("id") in doc_ids:
+            files[name] = dict(entry, mtime=None, size=None, hash=None)
+    for name, doc_id in paths:
+        files.setdefault(name, {"id": doc_id, "mtime": None, "size": None, "hash": None})
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def index_documents(docs: Iterable[Dict], **pragmas) -> Tuple[int, List[Tuple[str, str]]]:
+    """
+    在单个事务中批量索引文档（持有 index_lock，同时更新词存在性过滤器和索引清单）
+
+    Args:
+        docs: 文档字典的可迭代对象
+        **pragmas: 传给 IndexWriter 的 journal_mode / synchronous / cache_size
+
+    Returns:
+        (成功数量, [(doc_id, 错误信息), ...])
+    """
+    docs = list(docs)
+    with index_lock():
+        with IndexWriter(**pragmas) as writer:
+            indexed, failures = writer.index_documents(docs)
+            failed_ids = {doc_id for doc_id, _ in failures}
+            update_presence_filter(writer.conn, [doc for doc in docs if str(doc.get("id")) not in failed_ids])
+        _invalidate_manifest({str(doc.get("id")) for doc in docs},
+                             [(doc["path"], str(doc.get("id"))) for doc in docs if doc.get("path")])
+        return indexed, failures
 
 
 def index_document(doc: Dict) -> bool:
@@ -89,29 +839,11 @@ def index_document(doc: Dict) -> bool:
     Returns:
         是否成功
     """
-    conn = get_connection()
     try:
-        # 先删除旧的（如果存在）
-        conn.execute("DELETE FROM memories WHERE id = ?", (doc["id"],))
-
-        # 插入新的
-        keywords_str = " ".join(doc.get("keywords", []))
-        conn.execute("""
-            INSERT INTO memories(id, title, keywords, content, summary)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            doc["id"],
-            doc["title"],
-            keywords_str,
-            doc["content"],
-            doc["summary"]
-        ))
-        conn.commit()
-        return True
-    except Exception:
+        indexed, _ = index_documents([doc])
+        return indexed == 1
+    except (sqlite3.Error, OSError):
         return False
-    finally:
-        conn.close()
 
 
 def delete_document(doc_id: str) -> bool:
@@ -119,15 +851,16 @@ def delete_document(doc_id: str) -> bool:
     if not db_exists():
         return False
 
-    conn = get_connection()
     try:
-        conn.execute("DELETE FROM memories WHERE id = ?", (doc_id,))
-        conn.commit()
+        with index_lock():
+            with IndexWriter() as writer:
+                writer.delete_documents([doc_id])
+                # 过滤器中的词不用删除，只在过滤器不存在或已关闭时重新生成/删除
+                update_presence_filter(writer.conn, [])
+            _invalidate_manifest({doc_id})
         return True
     except Exception:
         return False
-    finally:
-        conn.close()
 
 
 def clear_all() -> bool:
@@ -135,15 +868,66 @@ def clear_all() -> bool:
     if not db_exists():
         return True
 
-    conn = get_connection()
     try:
-        conn.execute("DELETE FROM memories")
-        conn.commit()
+        with index_lock():
+            with IndexWriter() as writer:
+                writer.clear()
+                update_presence_filter(writer.conn)
+            _invalidate_manifest()
         return True
     except Exception:
         return False
-    finally:
-        conn.close()
+
+
+def get_documents(conn: sqlite3.Connection, doc_ids: List[str],
+                  scopes: Optional[Set[str]] = None) -> Dict[str, Dict]:
+    """
+    按 id 读取文档的 id, title, keywords, summary
+
+    Args:
+        scopes: 只返回 scope 在其中的文档（见 scope.scope_token），为空时不过滤
+
+    Returns:
+        {id: 文档}，不存在的（或不在 scopes 中的）id 不包含在内
+    """
+    docs = {}
+    for doc_id in doc_ids:
+        try:
+            row = conn.execute(
+                "SELECT id, title, keywords, summary, scope FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            if "documents" not in str(e):
+                raise
+            return _legacy_get_documents(conn, doc_ids, scopes)
+        if row and (not scopes or row["scope"] in scopes):
+            docs[doc_id] = {"id": row["id"], "title": row["title"],
+                            "keywords": row["keywords"], "summary": row["summary"]}
+    return docs
+
+
+def _legacy_get_documents(conn: sqlite3.Connection, doc_ids: List[str],
+                          scopes: Optional[Set[str]] = None) -> Dict[str, Dict]:
+    """结构版本 6 之前的索引的 get_documents（按 id 列短语匹配，不扫描全表）"""
+    sql = "SELECT id, title, keywords, summary, scope FROM memories WHERE memories MATCH ?"
+    docs = {}
+    for doc_id in doc_ids:
+        try:
+            rows = conn.execute(sql, (_id_match_query(doc_id),)).fetchall()
+        except sqlite3.OperationalError as e:
+            # 旧结构的索引没有 scope 列，不过滤
+            if "scope" not in str(e):
+                raise
+            sql = "SELECT id, title, keywords, summary, '' as scope FROM memories WHERE memories MATCH ?"
+            scopes = None
+            rows = conn.execute(sql, (_id_match_query(doc_id),)).fetchall()
+        for row in rows:
+            if row["id"] == doc_id:
+                if not scopes or row["scope"] in scopes:
+                    docs[doc_id] = {"id": row["id"], "title": row["title"],
+                                    "keywords": row["keywords"], "summary": row["summary"]}
+                break
+    return docs
 
 
 def get_all_ids() -> List[str]:
@@ -151,9 +935,139 @@ def get_all_ids() -> List[str]:
     if not db_exists():
         return []
 
-    conn = get_connection()
+    conn = get_read_connection()
     try:
-        cursor = conn.execute("SELECT id FROM memories")
+        try:
+            cursor = conn.execute("SELECT id FROM documents")
+        except sqlite3.OperationalError:
+            # 结构版本 6 之前的索引
+            cursor = conn.execute("SELECT DISTINCT id FROM memories")
         return [row["id"] for row in cursor]
     finally:
         conn.close()
+
+
+def needs_compaction() -> bool:
+    """倒排索引中已删除的旧行（见 IndexWriter.delete_documents）是否超过 STALE_ROWS_RATIO，需要全量重建"""
+    if not db_exists():
+        return False
+    try:
+        conn = get_read_connection()
+        try:
+            stale = get_meta(conn, "stale_rows", 0) or 0
+            rows = get_meta(conn, "doc_count", 0) or 0
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return stale > rows * STALE_ROWS_RATIO
+
+
+def get_meta(conn: sqlite3.Connection, key: str, default=None):
+    """读取 index_meta 中的值"""
+    try:
+        row = conn.execute("SELECT value FROM index_meta WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default
+    return row[0] if row else default
+
+
+def term_doc_freqs(conn: sqlite3.Connection, terms: Iterable[str]) -> Dict[str, int]:
+    """
+    从 memories_vocab 读取词的文档频率
+
+    Args:
+        terms: 索引中的词（已经过 FTS5 分词器处理，见 index_terms）
+
+    Returns:
+        {term: 包含该词的文档数}，不在索引中的词不出现在结果里
+    """
+    terms = list(dict.fromkeys(terms))
+    freqs: Dict[str, int] = {}
+    # SQLite 默认单条语句最多 999 个参数
+    for i in range(0, len(terms), 500):
+        chunk = terms[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"SELECT term, doc FROM memories_vocab WHERE term IN ({placeholders})",
+            chunk
+        )
+        for term, doc in cursor:
+            freqs[term] = doc
+    return freqs
+
+
+def index_terms(tokens: List[str]) -> Dict[str, List[str]]:
+    """
+    把查询词转换成索引中的词
+
+    索引使用 porter 词干化和 unicode61 分词（"running" -> "run"，"foo-bar" -> "foo", "bar"），
+    这里用一个内存中的同配置 FTS5 表做同样的处理，保证和 memories_vocab 中的词一致。
+
+    Returns:
+        {token: [term, ...]}
+    """
+    conn = getattr(_scratch, "terms", None)
+    if conn is None:
+        conn = _scratch.terms = sqlite3.connect(":memory:")
+        conn.execute(
+            "CREATE VIRTUAL TABLE t USING fts5(x, tokenize='porter unicode61')"
+        )
+        conn.execute("CREATE VIRTUAL TABLE t_vocab USING fts5vocab(t, instance)")
+
+    mapping: Dict[str, List[str]] = {t: [] for t in tokens}
+    if not tokens:
+        return mapping
+
+    try:
+        conn.executemany("INSERT INTO t(rowid, x) VALUES (?, ?)", enumerate(tokens))
+        for doc, term in conn.execute("SELECT doc, term FROM t_vocab ORDER BY doc, offset"):
+            mapping[tokens[doc]].append(term)
+    finally:
+        conn.execute("DELETE FROM t")
+        conn.commit()
+    return mapping
+
+
+def all_terms(conn: sqlite3.Connection) -> List[str]:
+    """索引中的全部词（用于生成存在性过滤器）"""
+    return [row[0] for row in conn.execute("SELECT term FROM memories_vocab")]
+
+
+def document_terms(doc: Dict) -> Set[str]:
+    """文档写入索引后会产生的全部词"""
+    fields = [f for row in document_rows(doc) for f in row[:len(RANK_COLUMNS)] if f]
+    terms: Set[str] = set()
+    for field_terms in index_terms(fields).values():
+        terms.update(field_terms)
+    return terms
+
+
+def update_presence_filter(conn: sqlite3.Connection, docs: Optional[List[Dict]] = None):
+    """
+    更新词存在性过滤器 terms.bloom（见 lib/presence.py）
+
+    必须在索引提交之前调用，保证过滤器总是索引的超集。删除文档不需要从过滤器中去掉词
+    （多出的词只会让预检查放行，不会漏掉文档）。
+
+    Args:
+        conn: 写入会话的连接（能看到未提交的改动）
+        docs: 增量更新时新写入的文档；为空或过滤器容量不足时按全部词重新生成
+    """
+    from config import get_config
+    from presence import add_terms, build_filter, remove_filter
+
+    config = get_config()
+    if not config.get("presence_filter", True):
+        remove_filter()
+        return
+
+    fp_rate = config.get("presence_filter_fp_rate", 0.01)
+    if docs is not None:
+        terms: Set[str] = set()
+        for doc in docs:
+            terms.update(document_terms(doc))
+        if add_terms(terms, fp_rate):
+            return
+
+    build_filter(all_terms(conn), fp_rate)
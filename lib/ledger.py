@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+分析台账：记录每个日志的分析状态
+
+替代 state.json 中不断增长的 analyzed_sessions 列表。每个日志一行，
+以日志 key（YYYY-MM-DD/HH-MM-SS_sessionid.jsonl）为主键，保存完整的 session id、
+状态、尝试次数、时间戳以及日志在归档中的位置。
+
+    pending  等待分析
+    running  已被某个分析进程领取（超过 STALE_SECONDS 未完成视为中断，attempts 未达到上限时可以重新领取，
+             达到上限的在下次领取时记为 failed）
+    done     分析完成
+    failed   分析失败，attempts 未达到上限时会重新领取
+
+领取在 BEGIN IMMEDIATE 事务中完成，两个同时启动的分析进程不会领到同一个日志。
+
+发现新日志时只扫描不早于高水位（meta.discovery_watermark，最近一次扫描到的最新日期分区）前一天的分区，
+耗时与新增日志数相关，而不是与全部历史相关；rescan=True 时重新扫描所有分区。
+
+数据保存在 ~/.gangsmem/state.db；第一次打开时导入旧的 state.json。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+LEDGER_DB = GANGSMEM_DIR / "state.db"
+LEGACY_STATE_FILE = GANGSMEM_DIR / "state.json"
+
+# 与单个分析进程的超时一致
+STALE_SECONDS = 600
+
+# 旧版 state.json 中的 session id 只保留了前 8 位
+LEGACY_ID_LENGTH = 8
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+WATERMARK_KEY = "discovery_watermark"
+
+# 逐页读取待分析日志时每页的行数
+PENDING_PAGE_SIZE = 256
+
+
+class Ledger:
+    """分析台账（可以在多个线程间共享）"""
+
+    def __init__(self, path: Path = LEDGER_DB):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses(
+                log_key TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                log_mtime REAL NOT NULL,
+                log_offset INTEGER NOT NULL DEFAULT 0,
+                log_length INTEGER NOT NULL DEFAULT 0,
+                discovered REAL NOT NULL,
+                claimed REAL,
+                finished REAL,
+                worker TEXT,
+                error TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS analyses_session ON analyses(session_id)")
+        # key 的字典序就是时间顺序，待分析日志按 key 分页读取
+        self.conn.execute("DROP INDEX IF EXISTS analyses_status")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS analyses_pending ON analyses(status, log_key)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta(
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """写事务（BEGIN IMMEDIATE）：出错时回滚，连接不会停在未结束的事务中占着写锁"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    def _legacy_analyzed(self) -> Optional[set]:
+        """还没有导入过旧的 state.json 时返回其中的 session id"""
+        if self.get_meta("legacy_state_imported") is not None:
+            return None
+        try:
+            state = json.loads(LEGACY_STATE_FILE.read_text())
+            return {s[:LEGACY_ID_LENGTH] for s in state.get("analyzed_sessions", [])}
+        except (OSError, json.JSONDecodeError, AttributeError):
+            return set()
+
+    def register(self, entries: Iterable) -> int:
+        """
+        登记发现的日志（LogEntry），已登记的只更新在归档中的位置
+
+        第一次登记时导入 state.json：其中记录的 session 直接标记为 done，
+        之后把 state.json 重命名为 state.json.migrated。
+
+        Returns:
+            新登记或位置发生变化（被归档）的日志数
+        """
+        now = time.time()
+        with self.lock:
+            legacy = self._legacy_analyzed()
+            rows = []
+            for entry in entries:
+                status = PENDING
+                if legacy and entry.session_id[:LEGACY_ID_LENGTH] in legacy:
+                    status = DONE
+                rows.append((entry.key, entry.session_id, status, entry.mtime,
+                             entry.offset, entry.length, now))
+
+            with self._transaction():
+                before = self.conn.total_changes
+                self.conn.executemany("""
+                    INSERT INTO analyses(log_key, session_id, status, log_mtime,
+                                         log_offset, log_length, discovered)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(log_key) DO UPDATE SET
+                        log_offset = excluded.log_offset,
+                        log_length = excluded.log_length
+                    WHERE log_offset != excluded.log_offset OR log_length != excluded.log_length
+                """, rows)
+                changed = self.conn.total_changes - before
+                if legacy is not None:
+                    self.set_meta("legacy_state_imported", now)
+
+            if legacy is not None and LEGACY_STATE_FILE.exists():
+                os.replace(LEGACY_STATE_FILE, LEGACY_STATE_FILE.with_suffix(".json.migrated"))
+
+        return changed
+
+    def discover(self, logs_dir: Optional[Path] = None, rescan: bool = False) -> int:
+        """
+        扫描日志目录，登记新日志
+
+        只扫描不早于高水位前一天的日期分区：高水位所在的分区可能还在写入；跨过午夜的 session
+        结束时写入开始那天的分区，这时后一天的分区可能已经出现。还没有高水位或 rescan=True 时扫描全部分区。
+
+        Returns:
+            新登记或位置发生变化的日志数
+        """
+        from logstore import LOGS_DIR, iter_day, list_days
+
+        logs_dir = logs_dir or LOGS_DIR
+        watermark = None if rescan else self.get_meta(WATERMARK_KEY)
+        since = None
+        if watermark:
+            since = (date.fromisoformat(watermark) - timedelta(days=1)).isoformat()
+        days = list_days(logs_dir, since=since)
+        if not days:
+            return 0
+
+        changed = self.register(entry for day in days for entry in iter_day(day, logs_dir))
+
+        newest = max(days[-1], watermark or days[-1])
+        with self.lock:
+            self.set_meta(WATERMARK_KEY, newest)
+        return changed
+
+    def _pending_where(self, max_attempts: int, stale: float) -> Tuple[str, tuple]:
+        # 领取超时的也要检查尝试次数：每次都让分析进程中断的日志不能无限重试（还会一直排在队首）
+        return """(status = ?
+                   OR (status IN (?, ?) AND attempts < ? AND (status = ? OR claimed < ?)))""", \
+            (PENDING, FAILED, RUNNING, max_attempts, FAILED, time.time() - stale)
+
+    def count_pending(self, max_attempts: int = 3, stale: float = STALE_SECONDS) -> int:
+        """可以领取的日志数"""
+        where, params = self._pending_where(max_attempts, stale)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM analyses WHERE {where}", params).fetchone()[0]
+
+    def iter_pending(self, max_attempts: int = 3, stale: float = STALE_SECONDS) -> Iterator[Tuple[str, str]]:
+        """
+        可以领取的日志（最早的优先），按 key 分页惰性读取
+
+        Yields:
+            (log_key, session_id)
+        """
+        where, params = self._pending_where(max_attempts, stale)
+        last = ""
+        while True:
+            with self.lock:
+                rows = self.conn.execute(f"""
+                    SELECT log_key, session_id FROM analyses
+                    WHERE log_key > ? AND {where}
+                    ORDER BY log_key LIMIT ?
+                """, (last, *params, PENDING_PAGE_SIZE)).fetchall()
+            yield from rows
+            if len(rows) < PENDING_PAGE_SIZE:
+                return
+            last = rows[-1][0]
+
+    def claim(self, keys: List[str], worker: str, max_attempts: int = 3,
+              stale: float = STALE_SECONDS) -> List[str]:
+        """
+        领取日志（只领取仍然可以领取的），返回实际领取到的 key
+
+        两个进程同时领取同一批日志时，只有先拿到写锁的一方成功。
+        """
+        now = time.time()
+        where, params = self._pending_where(max_attempts, stale)
+        claimed = []
+        with self.lock:
+            with self._transaction():
+                self._expire(max_attempts, now - stale)
+                for key in keys:
+                    cur = self.conn.execute(f"""
+                        UPDATE analyses
+                        SET status = ?, attempts = attempts + 1, claimed = ?, worker = ?, error = NULL
+                        WHERE log_key = ? AND {where}
+                    """, (RUNNING, now, worker, key, *params))
+                    if cur.rowcount:
+                        claimed.append(key)
+        return claimed
+
+    def _expire(self, max_attempts: int, before: float):
+        """领取超时、尝试次数已达到上限的日志记为失败（在写事务中调用）"""
+        self.conn.execute("""
+            UPDATE analyses SET status = ?, finished = ?, error = ?
+            WHERE status = ? AND claimed < ? AND attempts >= ?
+        """, (FAILED, time.time(), "claim expired (analysis interrupted)", RUNNING, before, max_attempts))
+
+    def finish(self, keys: List[str], ok: bool, error: Optional[str] = None):
+        """记录分析结果"""
+        now = time.time()
+        with self.lock:
+            with self._transaction():
+                self.conn.executemany(
+                    "UPDATE analyses SET status = ?, finished = ?, error = ? WHERE log_key = ?",
+                    [(DONE if ok else FAILED, now, None if ok else (error or "")[:1000], key)
+                     for key in keys]
+                )
+                if ok:
+                    self.set_meta("last_analyzed", now)
+
+    def release(self, keys: List[str]):
+        """把领取了但没有分析的日志放回待分析（不计入尝试次数）"""
+        with self.lock:
+            with self._transaction():
+                self.conn.executemany(
+                    "UPDATE analyses SET status = ?, attempts = MAX(attempts - 1, 0), claimed = NULL, "
+                    "worker = NULL WHERE log_key = ? AND status = ?",
+                    [(PENDING, key, RUNNING) for key in keys]
+                )
+
+    def mark_done(self, keys: List[str]) -> int:
+        """手动分析（/analyze）后把日志标记为完成"""
+        now = time.time()
+        with self.lock:
+            changed = 0
+            with self._transaction():
+                for key in keys:
+                    changed += self.conn.execute(
+                        "UPDATE analyses SET status = ?, finished = ?, error = NULL WHERE log_key = ?",
+                        (DONE, now, key)
+                    ).rowcount
+                self.set_meta("last_analyzed", now)
+        return changed
+
+    def reset(self):
+        """把所有日志重新标记为待分析（/analyze --all）"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE analyses SET status = ?, attempts = 0, claimed = NULL, "
+                "finished = NULL, worker = NULL, error = NULL",
+                (PENDING,)
+            )
+
+    def statuses(self) -> Dict[str, str]:
+        """{日志 key: 状态}"""
+        with self.lock:
+            return dict(self.conn.execute("SELECT log_key, status FROM analyses").fetchall())
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的日志数"""
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT status, COUNT(*) FROM analyses GROUP BY status"
+            ).fetchall())
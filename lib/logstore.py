@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+对话日志存储
+
+两种布局可以同时存在，读取时透明处理：
+
+    logs/YYYY-MM-DD/HH-MM-SS_sessionid.jsonl      每个 session 一个文件（SessionEnd 直接写入）
+    logs/YYYY-MM-DD.jsonl.gz + YYYY-MM-DD.idx.json 按天归档（log_storage = "rolled" 时）
+
+归档文件由多个 gzip member 首尾相接组成，每个 session 一个 member，
+整个文件仍然是合法的 gzip（可以直接 zcat）。索引文件记录每个 member 的偏移和长度，
+读取单个 session 时只需 seek 后解压这一段。
+
+只归档已经结束的日期（今天之前），当天的日志始终是普通文件。
+归档之后才写入的旧日期日志会在下次归档时追加到同一个文件。
+
+列出日志时不对单个文件 stat：日志时间由日期目录和文件名（HH-MM-SS）得出，
+key 的字典序就是时间顺序。
+"""
+
+import fcntl
+import gzip
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+LOGS_DIR = GANGSMEM_DIR / "logs"
+# 归档日志解压出来给 Read 工具读取的位置
+EXTRACT_DIR = GANGSMEM_DIR / "tmp" / "logs"
+ROLL_LOCK = LOGS_DIR / ".roll.lock"
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+
+
+class LogEntry(NamedTuple):
+    """一个 session 的日志"""
+    day: str                 # YYYY-MM-DD
+    name: str                # HH-MM-SS_sessionid.jsonl
+    mtime: float             # 日志时间（由日期和文件名得出）
+    path: Optional[Path]     # 普通文件的路径；归档的日志为 None
+    offset: int = 0          # 在归档文件中的偏移
+    length: int = 0          # 压缩后的长度
+    size: Optional[int] = None  # 解压后的大小（归档索引中记录；普通文件需要时再 stat）
+
+    @property
+    def key(self) -> str:
+        """日志的唯一标识: YYYY-MM-DD/HH-MM-SS_sessionid.jsonl"""
+        return f"{self.day}/{self.name}"
+
+    @property
+    def session_id(self) -> str:
+        # 文件名格式: HH-MM-SS_sessionid.jsonl（旧版本的日志只有 session id 的前 8 位）
+        return Path(self.name).stem.split("_")[-1]
+
+    @property
+    def rolled(self) -> bool:
+        return self.path is None
+
+
+def _is_day(name: str) -> bool:
+    try:
+        date.fromisoformat(name)
+        return True
+    except ValueError:
+        return False
+
+
+def log_time(day: str, name: str) -> float:
+    """由日期和文件名（HH-MM-SS_...）得出日志时间，文件名不符合格式时取当天 0 点"""
+    try:
+        return datetime.strptime(f"{day} {name[:8]}", "%Y-%m-%d %H-%M-%S").timestamp()
+    except ValueError:
+        return datetime.strptime(day, "%Y-%m-%d").timestamp()
+
+
+def list_days(logs_dir: Path = LOGS_DIR, since: Optional[str] = None) -> List[str]:
+    """
+    列出有日志的日期分区（普通目录或归档），按日期排序
+
+    Args:
+        since: 只返回不早于这个日期（YYYY-MM-DD）的分区
+    """
+    days = set()
+    try:
+        it = os.scandir(logs_dir)
+    except FileNotFoundError:
+        return []
+    with it:
+        for child in it:
+            name = child.name
+            if name.endswith(INDEX_SUFFIX):
+                name = name[:-len(INDEX_SUFFIX)]
+            elif not child.is_dir():
+                continue
+            if (since is None or name >= since) and _is_day(name):
+                days.add(name)
+    return sorted(days)
+
+
+def iter_day(day: str, logs_dir: Path = LOGS_DIR) -> Iterator[LogEntry]:
+    """列出某个日期分区中的日志（归档的和普通文件合并，按文件名即时间排序）"""
+    entries = [
+        LogEntry(day, item["name"], log_time(day, item["name"]), None,
+                 item["offset"], item["length"], item.get("size"))
+        for item in load_index(day, logs_dir)
+    ]
+    try:
+        names = [name for name in os.listdir(logs_dir / day) if name.endswith(".jsonl")]
+    except (FileNotFoundError, NotADirectoryError):
+        names = []
+    rolled = {entry.name for entry in entries}
+    entries.extend(
+        LogEntry(day, name, log_time(day, name), logs_dir / day / name)
+        for name in names if name not in rolled
+    )
+    entries.sort(key=lambda entry: entry.name)
+    yield from entries
+
+
+def get_log(key: str, logs_dir: Path = LOGS_DIR) -> Optional[LogEntry]:
+    """按 key 找到日志（普通文件优先，其次归档），不存在时返回 None"""
+    day, _, name = key.partition("/")
+    if not _is_day(day) or not name or "/" in name:
+        return None
+    path = logs_dir / day / name
+    if path.is_file():
+        return LogEntry(day, name, log_time(day, name), path)
+    for item in load_index(day, logs_dir):
+        if item["name"] == name:
+            return LogEntry(day, name, log_time(day, name), None,
+                            item["offset"], item["length"], item.get("size"))
+    return None
+
+
+def segment_path(day: str, logs_dir: Path = LOGS_DIR) -> Path:
+    return logs_dir / f"{day}{SEGMENT_SUFFIX}"
+
+
+def index_path(day: str, logs_dir: Path = LOGS_DIR) -> Path:
+    return logs_dir / f"{day}{INDEX_SUFFIX}"
+
+
+def load_index(day: str, logs_dir: Path = LOGS_DIR) -> List[Dict]:
+    """读取某天的归档索引，不存在或损坏时返回空列表"""
+    try:
+        data = json.loads(index_path(day, logs_dir).read_text())
+    except (OSError, json.JSONDecodeError):
+        return []
+    if data.get("version") != INDEX_VERSION:
+        return []
+    return data.get("entries", [])
+
+
+def _save_index(day: str, entries: List[Dict], logs_dir: Path):
+    path = index_path(day, logs_dir)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": INDEX_VERSION, "entries": entries}, ensure_ascii=False))
+    os.replace(tmp, path)
+
+
+def iter_logs(logs_dir: Path = LOGS_DIR, since: Optional[str] = None) -> Iterator[LogEntry]:
+    """
+    按时间顺序列出日志（普通文件和归档中的）
+
+    Args:
+        since: 只列出不早于这个日期（YYYY-MM-DD）的分区
+    """
+    for day in list_days(logs_dir, since):
+        yield from iter_day(day, logs_dir)
+
+
+def read_log(entry: LogEntry, logs_dir: Path = LOGS_DIR) -> bytes:
+    """读取一个日志的完整内容（JSONL）"""
+    if not entry.rolled:
+        return entry.path.read_bytes()
+    with open(segment_path(entry.day, logs_dir), "rb") as f:
+        f.seek(entry.offset)
+        return gzip.decompress(f.read(entry.length))
+
+
+def log_size(entry: LogEntry, logs_dir: Path = LOGS_DIR) -> int:
+    """日志内容的字节数（旧的归档索引没有记录大小时需要解压）"""
+    if entry.size is not None:
+        return entry.size
+    if not entry.rolled:
+        return entry.path.stat().st_size
+    return len(read_log(entry, logs_dir))
+
+
+def materialize(entry: LogEntry, logs_dir: Path = LOGS_DIR,
+                extract_dir: Path = EXTRACT_DIR) -> Path:
+    """
+    返回一个可以直接读取的文件路径
+
+    普通文件直接返回原路径；归档的日志解压到 extract_dir 下，用完后调用 cleanup_extracted()
+    """
+    if not entry.rolled:
+        return entry.path
+    target = extract_dir / entry.day / entry.name
+    if not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_bytes(read_log(entry, logs_dir))
+        os.replace(tmp, target)
+    return target
+
+
+def cleanup_extracted(extract_dir: Path = EXTRACT_DIR):
+    """删除解压出来的临时日志"""
+    shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+@contextmanager
+def roll_lock(logs_dir: Path = LOGS_DIR):
+    """归档互斥锁（定时分析和手动执行可能同时归档）"""
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    with open(logs_dir / ROLL_LOCK.name, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def roll_day(day: str, logs_dir: Path = LOGS_DIR, level: int = 6) -> int:
+    """
+    把某天的普通日志文件追加到当天的归档中
+
+    先写归档和索引，再删除原文件；中途失败时原文件还在，下次重新归档
+    （未进入索引的尾部数据会被截掉）。
+
+    Returns:
+        归档的文件数
+    """
+    day_dir = logs_dir / day
+    files = sorted(day_dir.glob("*.jsonl")) if day_dir.is_dir() else []
+    if not files:
+        return 0
+
+    entries = load_index(day, logs_dir)
+    known = {item["name"] for item in entries}
+    end = max((item["offset"] + item["length"] for item in entries), default=0)
+
+    segment = segment_path(day, logs_dir)
+    mode = "r+b" if segment.exists() else "wb"
+    with open(segment, mode) as out:
+        # 截掉上次中断时写了一半、没有进入索引的数据
+        out.truncate(end)
+        out.seek(end)
+        for log_file in files:
+            if log_file.name in known:
+                continue  # 已归档，上次删除原文件前中断
+            stat = log_file.stat()
+            raw = log_file.read_bytes()
+            data = gzip.compress(raw, compresslevel=level, mtime=0)
+            out.write(data)
+            entries.append({
+                "name": log_file.name,
+                "offset": end,
+                "length": len(data),
+                "size": len(raw),
+                "mtime": stat.st_mtime,
+            })
+            end += len(data)
+        out.flush()
+        os.fsync(out.fileno())
+
+    entries.sort(key=lambda item: item["name"])
+    _save_index(day, entries, logs_dir)
+
+    for log_file in files:
+        log_file.unlink(missing_ok=True)
+    try:
+        day_dir.rmdir()
+    except OSError:
+        pass  # 还有写了一半的 .tmp 文件
+    return len(files)
+
+
+def roll_logs(logs_dir: Path = LOGS_DIR, today: Optional[str] = None) -> Dict[str, int]:
+    """
+    归档今天之前所有日期的普通日志
+
+    Returns:
+        {日期: 归档的文件数}
+    """
+    today = today or date.today().isoformat()
+    rolled = {}
+    if not logs_dir.exists():
+        return rolled
+
+    with roll_lock(logs_dir):
+        for child in sorted(logs_dir.iterdir()):
+            if child.is_dir() and _is_day(child.name) and child.name < today:
+                count = roll_day(child.name, logs_dir)
+                if count:
+                    rolled[child.name] = count
+    return rolled
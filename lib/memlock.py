@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+记忆文档锁
+
+并行分析时多个 claude 进程可能同时修改同一个 memory/*.md。
+每个文档对应 memory/.locks/<id>.lock，用 O_EXCL 创建保证互斥，
+文件内容记录持有者和获取时间；持有者异常退出留下的锁超过 STALE_SECONDS 后视为失效。
+
+分析进程通过 scripts/memlock.py 获取和释放锁，调度方在 worker 结束后释放它遗留的所有锁。
+"""
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import List
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+LOCK_DIR = GANGSMEM_DIR / "memory" / ".locks"
+
+# 锁的最长持有时间（与单个分析进程的超时一致）
+STALE_SECONDS = 600
+POLL_INTERVAL = 0.2
+
+# 文档 id 就是文件名（不含 .md），可以是中文等任意字符；只拒绝会跳出 LOCK_DIR 或不能作为文件名的写法
+INVALID_ID_CHARS = re.compile(r'[/\\\x00]')
+
+
+def lock_path(doc_id: str, lock_dir: Path = LOCK_DIR) -> Path:
+    if doc_id.endswith(".md"):
+        doc_id = doc_id[:-3]
+    if not doc_id or doc_id.startswith(".") or ".." in doc_id or INVALID_ID_CHARS.search(doc_id):
+        raise ValueError(f"invalid document id: {doc_id!r}")
+    return lock_dir / f"{doc_id}.lock"
+
+
+def _read_lock(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _break_stale(path: Path, st: os.stat_result) -> bool:
+    """
+    删除失效的锁（st 为判断失效时看到的文件状态）
+
+    先 rename 成唯一的名字再确认：两个等待者同时看到同一个失效锁时，只有一个能 rename 成功；
+    如果 rename 走的已经不是那个失效锁（另一个等待者删掉它后刚获取了新锁），原样放回。
+
+    Returns:
+        是否删除了失效的锁（False 时调用方按锁被占用处理）
+    """
+    moved = path.with_name(f"{path.name}.stale.{os.getpid()}.{time.monotonic_ns()}")
+    try:
+        os.rename(path, moved)
+    except FileNotFoundError:
+        # 已被别人删除或释放
+        return True
+    current = moved.stat()
+    if (current.st_ino, current.st_mtime_ns) == (st.st_ino, st.st_mtime_ns):
+        moved.unlink(missing_ok=True)
+        return True
+    try:
+        # link 不会覆盖已存在的文件：这期间又有人获取了锁时，以它为准
+        os.link(moved, path)
+    except FileExistsError:
+        pass
+    moved.unlink(missing_ok=True)
+    return False
+
+
+def try_acquire(doc_id: str, owner: str, lock_dir: Path = LOCK_DIR,
+                stale: float = STALE_SECONDS) -> bool:
+    """尝试获取锁（不等待）。同一持有者重复获取视为成功"""
+    path = lock_path(doc_id, lock_dir)
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        info = _read_lock(path)
+        if info.get("owner") == owner:
+            return True
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return try_acquire(doc_id, owner, lock_dir, stale)
+        if time.time() - st.st_mtime > stale and _break_stale(path, st):
+            return try_acquire(doc_id, owner, lock_dir, stale)
+        return False
+
+    with os.fdopen(fd, "w") as f:
+        json.dump({"owner": owner, "pid": os.getpid(), "time": time.time()}, f)
+    return True
+
+
+def acquire(doc_id: str, owner: str, wait: float = 120, lock_dir: Path = LOCK_DIR,
+            stale: float = STALE_SECONDS) -> bool:
+    """
+    获取锁，最多等待 wait 秒
+
+    Returns:
+        是否获取成功
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        if try_acquire(doc_id, owner, lock_dir, stale):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+
+
+def release(doc_id: str, owner: str, lock_dir: Path = LOCK_DIR) -> bool:
+    """释放锁（只能释放自己持有的）"""
+    path = lock_path(doc_id, lock_dir)
+    if _read_lock(path).get("owner") != owner:
+        return False
+    path.unlink(missing_ok=True)
+    return True
+
+
+def release_owner(owner: str, lock_dir: Path = LOCK_DIR) -> List[str]:
+    """释放某个持有者的所有锁，返回被释放的文档 id"""
+    released = []
+    if not lock_dir.exists():
+        return released
+    for path in lock_dir.glob("*.lock"):
+        if _read_lock(path).get("owner") == owner:
+            path.unlink(missing_ok=True)
+            released.append(path.stem)
+    return released
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+查询规划：按 IDF 裁剪查询词
+
+长 prompt 会产生上百个中文 n-gram 和英文词，全部 OR 起来既慢又吵。
+这里根据 memories_vocab 中的文档频率给每个词打分，只保留区分度最高的 k 个：
+- 不在任何文档中出现的词直接丢弃（不可能命中）
+- 出现在绝大多数文档中的词丢弃（没有区分度）
+
+查询词到索引词的映射和文档频率缓存在常驻进程中跨请求复用：都有条数上限（最久未用的先淘汰），
+索引变化后失效（查询词映射按索引文件的 inode 和 mtime，文档频率按索引代数 index_meta.generation）。
+"""
+
+import math
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, List
+
+from db import DB_PATH, get_meta, index_terms, term_doc_freqs
+
+# 文档数少于这个值时不按比例过滤高频词（小语料中比例没有意义）
+MIN_DOCS_FOR_DF_RATIO = 20
+
+# 每个缓存最多保留的条数（常驻进程中不随出现过的词无限增长）
+CACHE_SIZE = 8192
+
+# 缓存：查询词 -> 索引词、索引词 -> 文档频率
+_terms_cache: "OrderedDict[str, List[str]]" = OrderedDict()
+_terms_key = None
+_df_cache: "OrderedDict[str, int]" = OrderedDict()
+_df_generation = None
+
+
+def _index_key() -> tuple:
+    """索引文件（主文件和 WAL）的 inode 和 mtime：全量重建替换文件或增量写入后变化"""
+    key = []
+    for path in (DB_PATH, f"{DB_PATH}-wal"):
+        try:
+            st = os.stat(path)
+            key.append((st.st_ino, st.st_mtime_ns))
+        except OSError:
+            key.append(None)
+    return tuple(key)
+
+
+def _cached(cache: OrderedDict, keys: List[str], fetch) -> Dict:
+    """从 LRU 缓存中取 keys，缺少的用 fetch(缺少的 keys) -> {key: 值} 补齐，超过 CACHE_SIZE 时淘汰最久未用的"""
+    missing = [k for k in dict.fromkeys(keys) if k not in cache]
+    if missing:
+        cache.update(fetch(missing))
+    result = {}
+    for k in keys:
+        cache.move_to_end(k)
+        result[k] = cache[k]
+    while len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+    return result
+
+
+def lookup_terms(tokens: List[str]) -> Dict[str, List[str]]:
+    """查询词 -> 索引词（带缓存，见 db.index_terms）"""
+    global _terms_key
+    key = _index_key()
+    if key != _terms_key:
+        _terms_cache.clear()
+        _terms_key = key
+    return _cached(_terms_cache, tokens, index_terms)
+
+
+def _lookup_freqs(conn: sqlite3.Connection, terms: List[str]) -> Dict[str, int]:
+    global _df_generation
+    generation = get_meta(conn, "generation")
+    if generation != _df_generation:
+        _df_cache.clear()
+        _df_generation = generation
+
+    def fetch(missing: List[str]) -> Dict[str, int]:
+        freqs = term_doc_freqs(conn, missing)
+        return {term: freqs.get(term, 0) for term in missing}
+
+    return _cached(_df_cache, terms, fetch)
+
+
+def idf(df: int, n_docs: int) -> float:
+    """bm25 的 IDF"""
+    return math.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+
+
+def token_doc_freqs(conn: sqlite3.Connection, tokens: List[str]) -> Dict[str, int]:
+    """
+    估算每个查询词的文档频率
+
+    一个查询词可能对应多个索引词（如 "foo-bar"），取其中最小的文档频率作为估计。
+    """
+    mapping = lookup_terms(tokens)
+    all_terms = [term for terms in mapping.values() for term in terms]
+    freqs = _lookup_freqs(conn, all_terms)
+
+    token_df = {}
+    for token, terms in mapping.items():
+        token_df[token] = min((freqs[t] for t in terms), default=0)
+    return token_df
+
+
+def plan_query(conn: sqlite3.Connection, tokens: List[str], config: dict) -> List[str]:
+    """
+    选出区分度最高的查询词
+
+    Args:
+        conn: 索引连接
+        tokens: 分词结果
+        config: 配置，使用 query_max_terms / query_max_df_ratio
+
+    Returns:
+        保留的查询词（按 IDF 从高到低）；没有可能命中的词时返回空列表
+    """
+    if not tokens:
+        return []
+
+    max_terms = config.get("query_max_terms", 32)
+    max_df_ratio = config.get("query_max_df_ratio", 0.5)
+
+    n_docs = get_meta(conn, "doc_count")
+    if n_docs is None:
+        # 旧索引没有统计信息，不做裁剪
+        return tokens
+    n_docs = int(n_docs)
+    if n_docs <= 0:
+        return []
+
+    token_df = token_doc_freqs(conn, tokens)
+
+    candidates = []
+    for token in tokens:
+        df = token_df[token]
+        if df <= 0:
+            continue
+        if n_docs >= MIN_DOCS_FOR_DF_RATIO and df / n_docs > max_df_ratio:
+            continue
+        candidates.append((idf(df, n_docs), token))
+
+    # IDF 相同时按词本身排序，保证结果稳定
+    candidates.sort(key=lambda x: (-x[0], x[1]))
+    if max_terms and max_terms > 0:
+        candidates = candidates[:max_terms]
+    return [token for _, token in candidates]
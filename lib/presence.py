@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+词存在性过滤器（Bloom filter）
+
+大多数 prompt 在记忆库中没有任何匹配，但仍要打开 search.db 执行 MATCH。
+重建索引时把索引中所有的词写入 ~/.gangsmem/terms.bloom，
+搜索前先检查 prompt 的词是否可能存在，全部不存在就直接返回，不碰 SQLite。
+
+Bloom filter 只有假阳性没有假阴性：检查通过不代表一定命中，检查不通过一定不会命中。
+为此文件必须在索引包含新词之前更新（先写过滤器，再提交索引）。
+
+文件格式（小端）：
+    magic(4) "GMBF" | version(u8) | k(u8) | reserved(u16) | m_bits(u64) | n_items(u64) | bits...
+"""
+
+import math
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    # 内置的 blake2 实现；hashlib 还会加载 OpenSSL（hook 冷启动多约 3 ms）
+    from _blake2 import blake2b
+except ImportError:
+    from hashlib import blake2b
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+FILTER_PATH = GANGSMEM_DIR / "terms.bloom"
+
+MAGIC = b"GMBF"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHQQ")
+
+# 过滤器最少的位数，避免空索引时退化
+MIN_BITS = 1024
+
+
+def optimal_params(n_items: int, fp_rate: float):
+    """根据元素个数和假阳性率计算 (m_bits, k)"""
+    n_items = max(n_items, 1)
+    fp_rate = min(max(fp_rate, 1e-6), 0.5)
+    m_bits = int(math.ceil(-n_items * math.log(fp_rate) / (math.log(2) ** 2)))
+    m_bits = max(MIN_BITS, (m_bits + 7) // 8 * 8)
+    k = max(1, int(round(m_bits / n_items * math.log(2))))
+    return m_bits, min(k, 32)
+
+
+def _positions(term: str, m_bits: int, k: int) -> List[int]:
+    """双重哈希生成 k 个位置"""
+    digest = blake2b(term.encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % m_bits for i in range(k)]
+
+
+class PresenceFilter:
+    """Bloom filter，读取时使用 mmap，写入时整体替换文件"""
+
+    def __init__(self, m_bits: int, k: int, bits, n_items: int = 0):
+        self.m_bits = m_bits
+        self.k = k
+        self.bits = bits
+        self.n_items = n_items
+
+    @classmethod
+    def create(cls, n_items: int, fp_rate: float) -> "PresenceFilter":
+        m_bits, k = optimal_params(n_items, fp_rate)
+        return cls(m_bits, k, bytearray(m_bits // 8))
+
+    @classmethod
+    def load(cls, path: Path = FILTER_PATH, writable: bool = False) -> Optional["PresenceFilter"]:
+        """读取过滤器文件，不存在或格式不对时返回 None"""
+        try:
+            with open(path, "rb") as f:
+                if writable:
+                    data = f.read()
+                    bits_source = data
+                else:
+                    bits_source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(bits_source) < HEADER.size:
+            return None
+        magic, version, k, _, m_bits, n_items = HEADER.unpack_from(bits_source, 0)
+        if magic != MAGIC or version != VERSION or len(bits_source) < HEADER.size + m_bits // 8:
+            return None
+
+        if writable:
+            bits = bytearray(bits_source[HEADER.size:HEADER.size + m_bits // 8])
+        else:
+            bits = memoryview(bits_source)[HEADER.size:HEADER.size + m_bits // 8]
+        return cls(m_bits, k, bits, n_items)
+
+    def add(self, term: str):
+        for pos in _positions(term, self.m_bits, self.k):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.n_items += 1
+
+    def __contains__(self, term: str) -> bool:
+        bits = self.bits
+        for pos in _positions(term, self.m_bits, self.k):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def might_match(self, token_terms: Dict[str, List[str]]) -> bool:
+        """
+        查询是否可能命中：任一查询词的所有索引词都可能存在
+
+        Args:
+            token_terms: {查询词: [索引词, ...]}（见 db.index_terms）
+        """
+        for terms in token_terms.values():
+            if terms and all(term in self for term in terms):
+                return True
+        return False
+
+    def save(self, path: Path = FILTER_PATH):
+        """原子写入文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.k, 0, self.m_bits, self.n_items))
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+
+def build_filter(terms: Iterable[str], fp_rate: float, path: Path = FILTER_PATH) -> PresenceFilter:
+    """用索引中的全部词重新生成过滤器"""
+    terms = list(terms)
+    # 预留一半容量给之后的增量更新
+    presence = PresenceFilter.create(int(len(terms) * 1.5), fp_rate)
+    for term in terms:
+        presence.add(term)
+    presence.save(path)
+    return presence
+
+
+def add_terms(terms: Iterable[str], fp_rate: float, path: Path = FILTER_PATH) -> bool:
+    """
+    把新词加入已有的过滤器（增量更新）
+
+    Returns:
+        False 表示过滤器不存在或已超出设计容量，调用方应重新生成
+    """
+    presence = PresenceFilter.load(path, writable=True)
+    if presence is None:
+        return False
+
+    terms = list(dict.fromkeys(terms))
+    capacity_m, _ = optimal_params(presence.n_items + len(terms), fp_rate)
+    if capacity_m > presence.m_bits:
+        return False
+
+    for term in terms:
+        if term not in presence:
+            presence.add(term)
+    presence.save(path)
+    return True
+
+
+def remove_filter(path: Path = FILTER_PATH):
+    """删除过滤器（之后的搜索不再预检查）"""
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+_cached = None
+_cached_key = None
+
+
+def load_cached(path: Path = FILTER_PATH) -> Optional[PresenceFilter]:
+    """读取过滤器，文件未变化时复用（常驻进程中避免重复 mmap）"""
+    global _cached, _cached_key
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if key != _cached_key:
+        _cached = PresenceFilter.load(path)
+        _cached_key = key
+    return _cached
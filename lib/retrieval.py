@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+记忆检索流程：分词 -> 构建查询 -> 搜索 -> 生成注入内容
+
+inject_memory.py（进程内）和常驻搜索进程（daemon.py）共用这一套逻辑，
+保证两种模式的结果一致。定时分析用同样的流程为每个日志找出候选文档（find_candidates）。
+
+开启 vector_search 时，bm25 的结果再与本地向量索引（lib/vectors.py）的近邻按
+RRF（reciprocal rank fusion）融合：没有相同词、只是写法相近的 prompt 也能找到文档。
+
+bm25 的列权重、时间衰减和使用加权来自配置（rank_*，见 ranking_from_config 和 db.Ranking），
+每次注入的文档记入 injections.log（见 lib/usage.py），重建索引时汇总成使用加权。
+
+索引按 ## 小节分行，每篇文档取得分最好的一节；注入的是该节中与 prompt 匹配的片段
+（inject_excerpt_chars），没有片段时（如只由向量检索找到的文档）退回文档的固定摘要。
+
+开启 project_scope 且知道 cwd 时按项目范围检索（见 lib/scope.py）：先搜索当前项目的文档，
+不够 max_inject_results 篇时再搜索通用文档，其他项目的文档不参与。
+"""
+
+import sqlite3
+from typing import List, Dict, Optional
+
+from config import DEFAULT_CONFIG
+from db import RANK_COLUMNS, Ranking, db_exists, get_documents, get_read_connection, search
+from planner import lookup_terms, plan_query
+from presence import load_cached
+from scope import GLOBAL_SCOPE, project_root, scope_token
+from tokenizer import tokenize, build_fts_query
+
+
+def ranking_from_config(config: dict) -> Ranking:
+    """配置中的排序参数（rank_weights 中没写的列使用默认权重）"""
+    weights = dict(DEFAULT_CONFIG["rank_weights"])
+    weights.update(config.get("rank_weights") or {})
+    return Ranking(
+        weights=tuple(float(weights.get(column, 1.0)) for column in RANK_COLUMNS),
+        recency_weight=float(config.get("rank_recency_weight", 0.0)),
+        half_life_days=float(config.get("rank_half_life_days", 180)),
+        usage_weight=float(config.get("rank_usage_weight", 0.0)),
+    )
+
+
+def search_scopes(query: str, limit: int, enough: int, config: dict, conn: sqlite3.Connection,
+                  scopes: Optional[List[str]] = None, trace=None) -> List[Dict]:
+    """
+    依次在各个范围中搜索（当前项目 -> 通用文档），结果已有 enough 篇时不再搜索后面的范围
+
+    Args:
+        scopes: scope 标记词（见 scope.scope_token），为空时搜索整个索引
+
+    Returns:
+        最多 limit 篇文档，前面范围的结果排在前面
+    """
+    options = dict(conn=conn, ranking=ranking_from_config(config), trace=trace,
+                   excerpt_chars=config.get("inject_excerpt_chars", 200))
+    if not scopes:
+        return search(query, limit=limit, **options)
+
+    results: List[Dict] = []
+    for i, scope in enumerate(scopes):
+        if i > 0:
+            if len(results) >= enough:
+                break
+            if trace is not None:
+                trace.count("scope_fallback")
+        found = {doc["id"] for doc in results}
+        # 旧结构的索引没有 scope 列时每个范围都是整个索引，按 id 去重
+        results += [doc for doc in search(query, limit=limit - len(results), scope=scope, **options)
+                    if doc["id"] not in found]
+    return results
+
+
+def find_memories(prompt: str, config: dict,
+                  conn: Optional[sqlite3.Connection] = None, trace=None, cwd: str = "") -> List[Dict]:
+    """
+    搜索与 prompt 相关的记忆
+
+    Args:
+        prompt: 用户输入
+        config: 配置（见 config.get_config）
+        conn: 复用的数据库连接（常驻进程传入），为空则临时打开
+        trace: telemetry.Trace，记录 tokenize / filter / open_db / query 各段耗时和出错
+        cwd: 当前工作目录，开启 project_scope 时先搜索它所在项目的文档
+
+    Returns:
+        匹配的文档列表
+    """
+    tokens = tokenize(prompt, use_jieba=config.get("use_jieba", False))
+    if trace is not None:
+        trace.mark("tokenize")
+    vector = config.get("vector_search", False)
+    if not tokens and not vector:
+        return []
+
+    # 存在性预检查：所有词都不在索引中时不打开数据库（开启向量检索时只跳过 bm25）
+    lexical = bool(tokens)
+    if lexical and config.get("presence_filter", True):
+        presence = load_cached()
+        if presence is not None and not presence.might_match(lookup_terms(tokens)):
+            if not vector:
+                if trace is not None:
+                    trace.mark("filter")
+                return []
+            lexical = False
+        if trace is not None:
+            trace.mark("filter")
+
+    own_conn = conn is None
+    if own_conn:
+        if not db_exists():
+            return []
+        try:
+            conn = get_read_connection()
+        except sqlite3.OperationalError as e:
+            if trace is not None:
+                trace.error(e)
+            return []
+        if trace is not None:
+            trace.mark("open_db")
+
+    try:
+        max_results = config.get("max_inject_results", 3)
+        limit = config.get("fusion_candidates", 20) if vector else max_results
+        scopes = None
+        if cwd and config.get("project_scope", True):
+            scopes = [scope_token(project_root(cwd)), GLOBAL_SCOPE]
+        results = []
+        if lexical:
+            # 只保留区分度高的词
+            query = build_fts_query(plan_query(conn, tokens, config), "OR")
+            if query:
+                results = search_scopes(query, limit, max_results, config, conn, scopes, trace)
+        if vector:
+            results = fuse_vector_results(prompt, results, config, conn, max_results, scopes)
+        return results[:max_results]
+    except sqlite3.Error as e:
+        if trace is not None:
+            trace.error(e)
+        return []
+    finally:
+        if own_conn:
+            conn.close()
+        if trace is not None:
+            trace.mark("query")
+
+
+# RRF 的平滑常数（排名靠后的结果之间差别不大）
+RRF_K = 60
+
+
+def fuse_vector_results(prompt: str, lexical: List[Dict], config: dict,
+                        conn: sqlite3.Connection, limit: int,
+                        scopes: Optional[List[str]] = None) -> List[Dict]:
+    """
+    把 bm25 结果与向量近邻按 RRF 融合（向量近邻中不在 scopes 范围内的文档跳过）
+
+    Returns:
+        融合后的前 limit 篇文档，score 为 RRF 得分（越大越相关）；没有向量索引时原样返回 lexical
+    """
+    from vectors import load_cached as load_vectors
+
+    index = load_vectors()
+    if index is None:
+        return lexical
+    hits = index.search(prompt, limit=config.get("fusion_candidates", 20),
+                        min_score=config.get("vector_min_score", 0.1),
+                        noise_margin=config.get("vector_noise_margin", 1.5))
+    if not hits:
+        return lexical
+
+    scores: Dict[str, float] = {}
+    for ranking in ([doc["id"] for doc in lexical], [doc_id for doc_id, _ in hits]):
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+
+    docs = {doc["id"]: doc for doc in lexical}
+    results = []
+    for doc_id in sorted(scores, key=lambda d: (-scores[d], d)):
+        if doc_id not in docs:
+            # 只有向量命中的文档，从索引中读出标题和摘要（向量索引可能比 FTS 索引新，找不到或
+            # 属于其他项目时跳过）
+            docs.update(get_documents(conn, [doc_id], set(scopes) if scopes else None))
+        if doc_id in docs:
+            results.append(dict(docs[doc_id], score=scores[doc_id]))
+            if len(results) >= limit:
+                break
+    return results
+
+
+# 为日志找候选文档时只对开头这么多字符分词（查询词最终由 plan_query 裁剪）
+CANDIDATE_MAX_CHARS = 20000
+
+
+def find_candidates(texts: List[str], config: dict, per_text: int = 3,
+                    conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
+    """
+    为一组文本（如一批日志的摘要）分别搜索最相关的文档，合并去重
+
+    Args:
+        texts: 文本列表
+        config: 配置（见 config.get_config）
+        per_text: 每个文本最多取的文档数
+        conn: 复用的数据库连接，为空则临时打开
+
+    Returns:
+        候选文档（id, title, keywords, summary, score），按在各自结果中的名次、再按得分排序
+    """
+    own_conn = conn is None
+    if own_conn:
+        if not db_exists():
+            return []
+        try:
+            conn = get_read_connection()
+        except sqlite3.OperationalError:
+            return []
+
+    best: Dict[str, tuple] = {}
+    ranking = ranking_from_config(config)
+    try:
+        for text in texts:
+            tokens = tokenize(text[:CANDIDATE_MAX_CHARS], use_jieba=config.get("use_jieba", False))
+            query = build_fts_query(plan_query(conn, tokens, config), "OR")
+            if not query:
+                continue
+            for rank, doc in enumerate(search(query, limit=per_text, conn=conn, ranking=ranking)):
+                key = (rank, doc["score"], doc["id"])
+                if doc["id"] not in best or key < best[doc["id"]][0]:
+                    best[doc["id"]] = (key, doc)
+    except sqlite3.Error:
+        pass
+    finally:
+        if own_conn:
+            conn.close()
+
+    return [doc for _, doc in sorted(best.values(), key=lambda item: item[0])]
+
+
+def format_inject_content(results: List[Dict], max_chars: int) -> str:
+    """生成注入到 Claude 上下文的文本"""
+    if not results:
+        return ""
+
+    lines = [
+        "<related-memories>",
+        "以下是可能相关的历史知识，请自行判断是否有用：",
+        "",
+    ]
+
+    total_chars = 0
+    for i, r in enumerate(results, 1):
+        title = r.get("title", "Untitled")
+        # 匹配到的小节片段（带小节标题），没有时用固定摘要
+        summary = r.get("excerpt") or r.get("summary", "")
+        if r.get("excerpt") and r.get("section"):
+            summary = f"{r['section']}: {summary}"
+
+        # 截断摘要
+        remaining = max_chars - total_chars
+        if remaining <= 0:
+            break
+
+        if len(summary) > remaining:
+            summary = summary[:remaining] + "..."
+
+        lines.append(f"[{i}] {title}")
+        lines.append(f"    {summary}")
+        lines.append("")
+
+        total_chars += len(summary)
+
+    lines.append("</related-memories>")
+    return "\n".join(lines)
+
+
+def render_for_prompt(prompt: str, config: dict,
+                      conn: Optional[sqlite3.Connection] = None, trace=None, cwd: str = "") -> str:
+    """完整流程：返回需要输出的注入文本（无结果时为空字符串）"""
+    if not prompt or not config.get("auto_inject", True):
+        return ""
+
+    results = find_memories(prompt, config, conn=conn, trace=trace, cwd=cwd)
+    output = format_inject_content(results, config.get("max_inject_chars", 1000))
+    if output:
+        from usage import record_injection
+        record_injection(doc["id"] for doc in results)
+    if trace is not None:
+        trace.count("results", len(results))
+        trace.mark("render")
+    return output
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+记忆的项目范围
+
+记忆文档的 frontmatter 可以带有 project（产生这条知识的项目根目录）和 files（涉及的文件，
+项目内的文件为相对路径）。索引中 scope 列保存 project 对应的标记词（scope_token），
+files 列保存文件路径；不属于任何项目的通用文档标记为 GLOBAL_SCOPE。
+
+搜索时先在当前项目的文档中查找，结果不够时再查找通用文档（见 retrieval.find_memories），
+其他项目的文档不参与，项目越多，每次搜索的候选集合也不会变大。
+
+项目根目录是 cwd 向上最近的包含 .git 的目录（没有时就是 cwd 本身）。
+捕获日志（transcript.py）和注入（inject_memory.py 的 cwd）用同一个函数，两边一致。
+"""
+
+import os
+
+try:
+    # 内置的 blake2 实现，不加载 hashlib 和 OpenSSL（见 presence.py）
+    from _blake2 import blake2b
+except ImportError:
+    from hashlib import blake2b
+
+# 通用文档（没有 project）的标记词
+GLOBAL_SCOPE = "scopeglobal"
+# 标记项目根目录的文件或目录
+PROJECT_MARKERS = (".git", ".hg", ".svn")
+
+
+def normalize_project(path: str) -> str:
+    """统一项目路径的写法（展开 ~，去掉末尾的 /）"""
+    return os.path.normpath(os.path.expanduser(path)) if path else ""
+
+
+def project_root(cwd: str) -> str:
+    """
+    cwd 所在项目的根目录
+
+    Returns:
+        最近的包含 PROJECT_MARKERS 的上级目录（不含 HOME 本身），没有时为 cwd；cwd 为空时为空字符串
+    """
+    if not cwd:
+        return ""
+    path = normalize_project(cwd)
+    home = os.path.expanduser("~")
+    current = path
+    while current != home:
+        if any(os.path.exists(os.path.join(current, marker)) for marker in PROJECT_MARKERS):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            break
+        current = parent
+    return path
+
+
+def scope_token(project: str) -> str:
+    """
+    project 在索引 scope 列中的标记词（一个 FTS5 词：字母和数字）
+
+    路径中的 / 等字符会被分词器拆开，这里用路径的哈希，保证不同项目的标记词互不包含
+    """
+    if not project:
+        return GLOBAL_SCOPE
+    digest = blake2b(normalize_project(project).encode("utf-8"), digest_size=8).hexdigest()
+    return "scope" + digest
+
+
+def relative_files(paths, root: str) -> list:
+    """项目内的文件转换成相对路径（项目外的保留原样），去重并排序"""
+    files = set()
+    for path in paths:
+        if root and os.path.isabs(path):
+            try:
+                relative = os.path.relpath(path, root)
+            except ValueError:
+                relative = path
+            if not relative.startswith(".."):
+                path = relative
+        files.add(path)
+    return sorted(files)
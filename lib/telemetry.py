@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+hook 的分段耗时和结果记录（汇总见 scripts/stats.py）
+
+每次运行结束时向 ~/.gangsmem/metrics.log 追加一行 JSON：
+    {"t": 时间戳, "hook": "inject", "outcome": "hit", "ms": {"tokenize": 0.08, ..., "total": 2.1},
+     "n": {"results": 3}, "error": "OperationalError: ..."}
+outcome 由各个 hook 决定（inject: hit / empty / skipped，session_end: saved / empty / skipped，
+rebuild: full / incremental），出错时另有 error 字段（只记第一个错误）。
+
+记录只有一次 json.dumps 和一次 O_APPEND 的 write，开销在几十微秒以内；不打开数据库，不加锁。
+文件超过 MAX_BYTES 时改名为 metrics.log.1（覆盖更早的一份），总大小不超过 2 × MAX_BYTES。
+
+hook 一启动就导入这个模块，只依赖内置模块（不导入 pathlib、typing，路径用字符串）。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+GANGSMEM_DIR = os.path.join(os.path.expanduser("~"), ".gangsmem")
+METRICS_LOG = os.path.join(GANGSMEM_DIR, "metrics.log")
+MAX_BYTES = 1024 * 1024
+MAX_ERROR_CHARS = 200
+
+
+class Trace:
+    """
+    一次运行的分段计时
+
+    mark(stage) 把距上一次 mark（或创建）的时间计入 stage，同一个 stage 可以多次累加；
+    record() 时 total 为从创建到记录的总时间。
+    """
+
+    __slots__ = ("hook", "start", "last", "spans", "counts", "errors")
+
+    def __init__(self, hook: str):
+        self.hook = hook
+        self.start = self.last = time.perf_counter()
+        self.spans: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.errors: list[str] = []
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.spans[stage] = self.spans.get(stage, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def error(self, exc: BaseException):
+        """记录一个被处理掉的错误（例如搜索时的 OperationalError）"""
+        self.errors.append(f"{type(exc).__name__}: {exc}"[:MAX_ERROR_CHARS])
+
+    def merge(self, spans: dict[str, float], counts: dict[str, int] | None = None,
+              error: str | None = None, within: str | None = None):
+        """
+        合并其他进程（常驻搜索进程）返回的分段耗时（毫秒）、计数和错误
+
+        Args:
+            within: 这些耗时已经计入了本进程的哪一段（如等待响应的 ipc），从该段中扣除
+        """
+        for stage, ms in spans.items():
+            self.spans[stage] = self.spans.get(stage, 0.0) + float(ms)
+            if within in self.spans:
+                self.spans[within] = max(0.0, self.spans[within] - float(ms))
+        for name, n in (counts or {}).items():
+            self.count(name, int(n))
+        if error:
+            self.errors.append(str(error)[:MAX_ERROR_CHARS])
+
+    def rounded(self) -> dict[str, float]:
+        return {stage: round(ms, 3) for stage, ms in self.spans.items()}
+
+    def record(self, outcome: str, path: str = METRICS_LOG):
+        """追加一行记录（失败时忽略，不影响 hook）"""
+        spans = self.rounded()
+        spans["total"] = round((time.perf_counter() - self.start) * 1000, 3)
+        entry = {"t": round(time.time(), 3), "hook": self.hook, "outcome": outcome, "ms": spans}
+        if self.counts:
+            entry["n"] = self.counts
+        if self.errors:
+            entry["error"] = self.errors[0]
+        append(entry, path)
+
+
+def append(entry: dict, path: str = METRICS_LOG):
+    """追加一行 JSON，文件超过 MAX_BYTES 时先轮转"""
+    data = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except OSError:
+        return
+    try:
+        if os.fstat(fd).st_size >= MAX_BYTES:
+            # 其他进程可能同时轮转或还在向旧文件追加，最多丢失或错放几行记录
+            os.close(fd)
+            fd = -1
+            os.replace(path, rotated_path(path))
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.write(fd, data)
+    except OSError:
+        pass
+    finally:
+        if fd >= 0:
+            os.close(fd)
+
+
+def rotated_path(path: str = METRICS_LOG) -> str:
+    return path + ".1"
+
+
+def read_entries(path: str = METRICS_LOG, since: float = 0.0) -> list[dict]:
+    """读取记录（包括轮转出的旧文件），按时间排序，只保留 since 之后的"""
+    entries = []
+    for file in (rotated_path(path), path):
+        try:
+            with open(file, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            continue
+        for line in text.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and entry.get("t", 0) >= since:
+                entries.append(entry)
+    entries.sort(key=lambda e: e["t"])
+    return entries
@@ -24,6 +24,39 @@ STOP_WORDS_ZH = {
 
 STOP_WORDS = STOP_WORDS_EN | STOP_WORDS_ZH
 
+# 连续的中文字符
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+# 英文单词（至少 2 个字符）
+EN_WORD_PATTERN = re.compile(r'[a-zA-Z][a-zA-Z0-9_-]{1,}')
+
+
+def cjk_ngrams(chars: str) -> List[str]:
+    """
+    中文片段的 2-4 字组合
+
+    查询端（tokenize_simple）和索引端（segment_cjk）共用，保证两边切分一致
+    """
+    grams = []
+    for n in (2, 3, 4):
+        for i in range(len(chars) - n + 1):
+            grams.append(chars[i:i+n])
+    return grams
+
+
+def segment_cjk(text: str) -> str:
+    """
+    索引端中文预切分：把文本中的中文片段展开成空格分隔的 2-4 字组合
+
+    FTS5 的 unicode61 会把一整段连续中文当作一个词，
+    写入这个结果后，查询端的 n-gram 才能命中索引
+    """
+    if not text:
+        return ""
+    grams = []
+    for chars in CJK_PATTERN.findall(text):
+        grams.extend(cjk_ngrams(chars))
+    return " ".join(grams)
+
 
 def tokenize_simple(text: str) -> List[str]:
     """
@@ -41,21 +74,12 @@ def tokenize_simple(text: str) -> List[str]:
     tokens: Set[str] = set()
 
     # 英文单词（至少2个字符）
-    english_words = re.findall(r'[a-zA-Z][a-zA-Z0-9_-]{1,}', text.lower())
+    english_words = EN_WORD_PATTERN.findall(text.lower())
     tokens.update(english_words)
 
     # 中文：提取2-4字的连续片段
-    chinese_chars = re.findall(r'[\u4e00-\u9fff]+', text)
-    for chars in chinese_chars:
-        # 2字组合
-        for i in range(len(chars) - 1):
-            tokens.add(chars[i:i+2])
-        # 3字组合
-        for i in range(len(chars) - 2):
-            tokens.add(chars[i:i+3])
-        # 4字组合
-        for i in range(len(chars) - 3):
-            tokens.add(chars[i:i+4])
+    for chars in CJK_PATTERN.findall(text):
+        tokens.update(cjk_ngrams(chars))
 
     # 过滤停用词
     tokens = {t for t in tokens if t not in STOP_WORDS}
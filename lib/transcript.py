@@ -7,66 +7,150 @@ Transcript JSONL 解析工具
 - Claude 的回复（完整保留）
 - 使用的 tools/skills/mcp（只记录名称）
 - 不记录 tool 的返回结果（如文件内容、搜索结果等）
+- 会话所在的项目（cwd 所在的项目根目录）和工具读写过的文件路径（见 lib/scope.py）
 """
 
 import json
 from pathlib import Path
-from typing import List, Dict, Optional, Set
+from typing import Iterator, List, Dict, Optional, Set
 
+from scope import project_root, relative_files
 
-def parse_transcript_simplified(transcript_path: str) -> List[Dict]:
+
+# 行级预筛选：只有包含这些标记的行才可能是 user / assistant 记录。
+# JSON 字符串内部的引号会被转义成 \"，所以未转义的 "type":"user" 只会出现在结构中。
+USER_MARKERS = (b'"type":"user"', b'"type": "user"')
+ASSISTANT_MARKERS = (b'"type":"assistant"', b'"type": "assistant"')
+# 第一个内容块就是 tool_result 的用户消息（工具返回结果，通常只包含这一个块）
+TOOL_RESULT_MARKERS = (
+    b'"content":[{"tool_use_id"', b'"content": [{"tool_use_id"',
+    b'"content":[{"type":"tool_result"', b'"content": [{"type": "tool_result"',
+)
+# 文本块（"type":"text" 的值，或者它的 "text" 字段）：工具返回结果的消息中同时有用户输入
+# （或结果本身是文本块列表）时出现，这样的行要解码。只匹配一个标记，大行只扫描一遍
+TEXT_BLOCK_MARKER = b'"text"'
+
+
+# tool_use 输入中表示文件路径的字段（Read / Edit / Write / MultiEdit / NotebookEdit）
+FILE_INPUT_KEYS = ("file_path", "notebook_path")
+# 会话摘要中最多记录的文件数
+MAX_SESSION_FILES = 100
+
+
+def _has_marker(line: bytes, markers: tuple) -> bool:
+    return any(m in line for m in markers)
+
+
+class TranscriptCursor:
     """
-    解析 transcript，提取简化的对话记录
+    记录读取位置（字节偏移）
 
-    Returns:
-        简化的消息列表，像人的记忆一样模糊但关键
+    末尾没有换行且无法解析的行（还在写入中）不会被消费，留到下次读取。
     """
-    path = Path(transcript_path)
-    if not path.exists():
-        return []
 
-    messages = []
-    tools_used: Set[str] = set()
-    skills_used: Set[str] = set()
-    mcp_used: Set[str] = set()
+    def __init__(self, offset: int = 0):
+        self.offset = offset
 
-    with open(path, "r", encoding="utf-8") as f:
+
+def iter_records(path: Path, cursor: Optional[TranscriptCursor] = None) -> Iterator[Dict]:
+    """
+    逐行读取 transcript，只解码可能是 user / assistant 的记录
+
+    在 json.loads 之前用字节匹配跳过其他记录，以及只有工具返回结果的用户消息
+    （这类行通常是体积最大的文件内容、命令输出）。同时带有文本块的行仍然解码，
+    由 parse_user_message 只去掉其中的 tool_result 块，不会丢掉一起发送的用户输入。
+
+    Args:
+        cursor: 从 cursor.offset 开始读取，并随读取推进
+    """
+    cursor = cursor or TranscriptCursor()
+    with open(path, "rb") as f:
+        f.seek(cursor.offset)
         for line in f:
-            line = line.strip()
-            if not line:
+            if not line.endswith(b"\n"):
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+            cursor.offset += len(line)
+
+            is_user = _has_marker(line, USER_MARKERS)
+            if not is_user and not _has_marker(line, ASSISTANT_MARKERS):
+                continue
+            if (is_user and _has_marker(line, TOOL_RESULT_MARKERS)
+                    and TEXT_BLOCK_MARKER not in line):
                 continue
 
             try:
                 obj = json.loads(line)
-            except json.JSONDecodeError:
+            except ValueError:
                 continue
+            if isinstance(obj, dict):
+                yield obj
+
 
-            msg_type = obj.get("type")
+def iter_transcript_simplified(transcript_path: str,
+                               cursor: Optional[TranscriptCursor] = None) -> Iterator[Dict]:
+    """
+    流式解析 transcript，逐条产出简化的对话记录
 
-            if msg_type == "user":
-                msg = parse_user_message(obj)
-                if msg:
-                    messages.append(msg)
+    内存占用与 transcript 大小无关：只保留已使用工具的名称和读写过的文件路径集合，
+    会话摘要（使用的工具、项目根目录、文件）在最后产出。
 
-            elif msg_type == "assistant":
-                msg, tools, skills, mcps = parse_assistant_message_simplified(obj)
-                if msg:
-                    messages.append(msg)
-                tools_used.update(tools)
-                skills_used.update(skills)
-                mcp_used.update(mcps)
+    Args:
+        cursor: 从指定字节偏移开始解析（增量捕获），解析完成后指向已消费的末尾
+    """
+    path = Path(transcript_path)
+    if not path.exists():
+        return
 
-    # 添加会话摘要（使用的工具）
-    if tools_used or skills_used or mcp_used:
+    tools_used: Set[str] = set()
+    skills_used: Set[str] = set()
+    mcp_used: Set[str] = set()
+    files: Set[str] = set()
+    cwd = ""
+
+    for obj in iter_records(path, cursor):
+        msg_type = obj.get("type")
+        if not cwd and isinstance(obj.get("cwd"), str):
+            cwd = obj["cwd"]
+
+        if msg_type == "user":
+            msg = parse_user_message(obj)
+            if msg:
+                yield msg
+
+        elif msg_type == "assistant":
+            msg, tools, skills, mcps = parse_assistant_message_simplified(obj, files)
+            if msg:
+                yield msg
+            tools_used.update(tools)
+            skills_used.update(skills)
+            mcp_used.update(mcps)
+
+    # 添加会话摘要（使用的工具、项目和文件）
+    if tools_used or skills_used or mcp_used or cwd:
         summary = {
             "type": "session_summary",
             "tools": sorted(tools_used),
             "skills": sorted(skills_used),
             "mcp": sorted(mcp_used)
         }
-        messages.append(summary)
+        if cwd:
+            summary["project"] = project_root(cwd)
+        if files:
+            summary["files"] = relative_files(files, summary.get("project", ""))[:MAX_SESSION_FILES]
+        yield summary
+
+
+def parse_transcript_simplified(transcript_path: str) -> List[Dict]:
+    """
+    解析 transcript，提取简化的对话记录
 
-    return messages
+    Returns:
+        简化的消息列表，像人的记忆一样模糊但关键
+    """
+    return list(iter_transcript_simplified(transcript_path))
 
 
 def parse_user_message(obj: Dict) -> Optional[Dict]:
@@ -74,6 +158,13 @@ def parse_user_message(obj: Dict) -> Optional[Dict]:
     message = obj.get("message", {})
     content = message.get("content", "")
 
+    # 去掉 tool 的返回结果，只保留用户输入的内容
+    if isinstance(content, list):
+        content = [
+            block for block in content
+            if not (isinstance(block, dict) and block.get("type") == "tool_result")
+        ]
+
     if not content:
         return None
 
@@ -85,10 +176,13 @@ def parse_user_message(obj: Dict) -> Optional[Dict]:
     }
 
 
-def parse_assistant_message_simplified(obj: Dict) -> tuple:
+def parse_assistant_message_simplified(obj: Dict, files: Optional[Set[str]] = None) -> tuple:
     """
     解析 assistant 消息（简化版）
 
+    Args:
+        files: 不为空时把 tool_use 输入中的文件路径（FILE_INPUT_KEYS）加入其中
+
     Returns:
         (message_dict, tools_set, skills_set, mcp_set)
     """
@@ -116,6 +210,11 @@ def parse_assistant_message_simplified(obj: Dict) -> tuple:
 
         elif block_type == "tool_use":
             tool_name = block.get("name", "")
+            tool_input = block.get("input")
+            if files is not None and isinstance(tool_input, dict):
+                for key in FILE_INPUT_KEYS:
+                    if isinstance(tool_input.get(key), str) and tool_input[key]:
+                        files.add(tool_input[key])
             if tool_name:
                 # 分类工具
                 if tool_name.startswith("mcp__"):
@@ -154,33 +253,7 @@ def parse_transcript(transcript_path: str) -> List[Dict]:
     """
     解析完整的 transcript（向后兼容）
     """
-    path = Path(transcript_path)
-    if not path.exists():
-        return []
-
-    messages = []
-
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            msg_type = obj.get("type")
-
-            if msg_type == "user":
-                msg = parse_user_message(obj)
-                if msg:
-                    messages.append(msg)
-
-            elif msg_type == "assistant":
-                msg, _, _, _ = parse_assistant_message_simplified(obj)
-                if msg:
-                    messages.append(msg)
-
-    return messages
+    return [
+        msg for msg in iter_transcript_simplified(transcript_path)
+        if msg.get("type") != "session_summary"
+    ]
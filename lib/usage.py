@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+记忆文档的注入次数（排序时的使用加权，见 db.Ranking）
+
+注入时（hook 热路径）只向 injections.log 追加 "<id>\\t1" 行，不打开数据库；
+重建索引时 fold_counts() 把日志汇总成每篇文档一行（"<id>\\t<次数>"，以 FOLDED_MARK 行结尾）
+后原子替换，文件大小只与被注入过的文档数有关。汇总后的次数写入索引的 doc_signals 表。
+
+追加和汇总之间不加锁：汇总过程中追加的记录可能丢失，只会让次数略少，不影响正确性。
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+USAGE_LOG = GANGSMEM_DIR / "injections.log"
+# 汇总结果的结束标记，之后的行是上次汇总以来的新注入
+FOLDED_MARK = "#folded"
+
+
+def record_injection(doc_ids: Iterable[str], path: Path = USAGE_LOG):
+    """记录一次注入（一次 write 调用，失败时忽略）"""
+    data = "".join(f"{doc_id}\t1\n" for doc_id in doc_ids).encode("utf-8")
+    if not data:
+        return
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    except OSError:
+        return
+    try:
+        os.write(fd, data)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_counts(path: Path = USAGE_LOG) -> Tuple[Dict[str, int], int]:
+    """
+    读取注入次数
+
+    Returns:
+        ({文档 id: 次数}, 上次汇总之后新增的记录数)
+    """
+    counts: Dict[str, int] = {}
+    new = 0
+    try:
+        text = path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return counts, 0
+    for line in text.splitlines():
+        if line == FOLDED_MARK:
+            new = 0
+            continue
+        doc_id, _, count = line.rpartition("\t")
+        if not doc_id:
+            continue
+        try:
+            counts[doc_id] = counts.get(doc_id, 0) + int(count)
+        except ValueError:
+            continue
+        new += 1
+    return counts, new
+
+
+def fold_counts(path: Path = USAGE_LOG) -> Tuple[Dict[str, int], bool]:
+    """
+    汇总注入日志
+
+    Returns:
+        ({文档 id: 次数}, 上次汇总之后是否有新的注入)
+    """
+    counts, new = read_counts(path)
+    if not new:
+        return counts, False
+    tmp = path.with_suffix(".tmp")
+    try:
+        tmp.write_text("".join(f"{doc_id}\t{count}\n" for doc_id, count in sorted(counts.items()))
+                       + FOLDED_MARK + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return counts, True
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+本地向量索引（可选，需要 numpy）
+
+FTS5 只能找到与 prompt 有相同词的文档。向量索引把每篇文档表示成字符 n-gram 的
+哈希 TF-IDF 向量，拼写错误、词形变化、连写的标识符（"webpackconfig"）、部分重叠的中文
+也能得到相近的向量，作为 bm25 之外的第二路召回（融合见 lib/retrieval.py）。
+
+特征：
+- 英文词：整词 + 加上边界符（<word>）后的 4、5 字符片段
+- 中文：单字 + 相邻两字
+每个特征用 crc32 哈希：低 IDF_BITS 位对应 IDF 表中的位置，其余位决定落在哪一维和正负号
+（signed feature hashing），权重为 (1 + log tf) * idf，向量按 L2 归一化，点积即余弦相似度。
+标题和 keywords 中的特征计 FIELD_WEIGHT 次，短 prompt 与文档主题的相似度不会被长正文稀释。
+
+文件（~/.gangsmem/vectors/，重建索引时生成）：
+    meta.json         代数、维度、各矩阵的文档 id 列表（列号即下标）、基础矩阵中已失效的列
+    matrix-<代>.npy   基础矩阵：float32（维度 × 文档数，同一维的所有文档连续存放），搜索时 mmap 只读打开
+    delta-<代>.npy    增量矩阵：上次全量写入以来新增或修改的文档，格式相同
+    idf-<代>.npy      IDF 表（增量更新时沿用，全量重建时重新统计）
+
+按维存放时追加一篇文档要重写整个矩阵，所以增量更新不动基础矩阵：修改和删除的文档只把
+基础矩阵中的列记为失效（dead），新的向量写入小的增量矩阵。增量矩阵和失效列超过基础矩阵
+文档数的 COMPACT_RATIO 时合并成新的基础矩阵，每次增量更新的读写量与改动的文档数成正比。
+
+先写新一代的 .npy，再原子替换 meta.json，最后删除不再引用的文件；
+正在读旧文件的进程通过 mmap 保有旧 inode，不受影响。
+
+prompt 很短，查询向量通常只有几十维非零，搜索时只读取矩阵中这些维对应的行做点积，
+结果与完整的矩阵乘法相同，读取量和计算量只有几十分之一。随机投影 LSH 在这种相似度
+（相关文档的余弦约 0.2~0.4）下分桶几乎不会碰撞，召回率太低，所以不用。
+
+无关的 prompt 也会因为共有的常见 n-gram 与很多文档有 0.1 左右的相似度，文档越多，
+其中最高的一个越高，单靠余弦下限挡不住。所以还要求命中的文档是离群值：N 篇文档的
+相似度中随机噪声的最大值约为 平均值 + sqrt(2 ln N) 个标准差，命中的文档至少还要再高
+noise_margin 个标准差（文档少于 ZSCORE_MIN_DOCS 时不检查）。
+"""
+
+import json
+import math
+import os
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+VECTOR_DIR = GANGSMEM_DIR / "vectors"
+
+META_VERSION = 2
+DEFAULT_DIM = 1024
+# 增量矩阵的文档数 + 失效列数超过基础矩阵文档数的这个比例（且不少于 COMPACT_MIN）时合并
+COMPACT_RATIO = 0.1
+COMPACT_MIN = 64
+IDF_BITS = 18
+FIELD_WEIGHT = 6
+ZSCORE_MIN_DOCS = 100
+
+NGRAM_SIZES = (4, 5)
+WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+CJK_PATTERN = re.compile(r"[一-鿿]+")
+
+
+def available() -> bool:
+    """是否安装了 numpy"""
+    return np is not None
+
+
+def features(text: str) -> Counter:
+    """文本 -> 字符 n-gram 计数"""
+    counts = Counter()
+    text = text.lower()
+    for word in WORD_PATTERN.findall(text):
+        counts[word] += 1
+        bounded = f"<{word}>"
+        for n in NGRAM_SIZES:
+            for i in range(len(bounded) - n + 1):
+                counts[bounded[i:i + n]] += 1
+    for chars in CJK_PATTERN.findall(text):
+        counts.update(chars)
+        counts.update(chars[i:i + 2] for i in range(len(chars) - 1))
+    return counts
+
+
+def hashed(counts: Counter) -> Tuple["np.ndarray", "np.ndarray"]:
+    """(特征哈希 uint32, 次数的 1 + log) 两个数组"""
+    hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in counts), dtype=np.uint32, count=len(counts))
+    tf = np.fromiter((1.0 + math.log(c) for c in counts.values()), dtype=np.float32, count=len(counts))
+    return hashes, tf
+
+
+def _embed(hashes, tf, idf, dim: int):
+    """一篇文档的向量（已归一化；没有任何特征时为全零）"""
+    vec = np.zeros(dim, dtype=np.float32)
+    if len(hashes):
+        bucket = hashes & np.uint32((1 << IDF_BITS) - 1)
+        rest = hashes >> np.uint32(IDF_BITS)
+        sign = np.where(rest & np.uint32(1), np.float32(-1.0), np.float32(1.0))
+        np.add.at(vec, (rest >> np.uint32(1)) % np.uint32(dim), sign * tf * idf[bucket])
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+    return vec
+
+
+def document_features(doc: Dict) -> Counter:
+    """文档的特征计数（标题和 keywords 加权）"""
+    keywords = doc.get("keywords", [])
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    counts = features(str(doc.get("content", "")))
+    for feature, count in features(f"{doc.get('title', '')} {' '.join(keywords)}").items():
+        counts[feature] += count * FIELD_WEIGHT
+    return counts
+
+
+def _write(ids: List[str], rows, idf, dim: int, vector_dir: Path):
+    """写入新的基础矩阵（没有增量和失效列）并切换 meta.json（rows 为 文档数 × 维度）"""
+    vector_dir.mkdir(parents=True, exist_ok=True)
+    generation = (_read_meta(vector_dir) or {}).get("generation", 0) + 1
+    for name, array in (("matrix", np.ascontiguousarray(rows.T)), ("idf", idf)):
+        _save(vector_dir / f"{name}-{generation}.npy", array)
+    _switch(vector_dir, {
+        "version": META_VERSION, "generation": generation, "dim": dim, "base": generation,
+        "ids": ids, "dead": [], "delta": None, "delta_ids": [],
+    })
+
+
+def _save(path: Path, array):
+    tmp = path.with_name(path.name[:-len(".npy")] + ".tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def _switch(vector_dir: Path, meta: Dict):
+    """原子替换 meta.json，删除新 meta 不再引用的 .npy"""
+    meta_tmp = vector_dir / "meta.json.tmp"
+    meta_tmp.write_text(json.dumps(meta, ensure_ascii=False))
+    os.replace(meta_tmp, vector_dir / "meta.json")
+
+    used = {f"matrix-{meta['base']}.npy", f"idf-{meta['base']}.npy"}
+    if meta["delta"] is not None:
+        used.add(f"delta-{meta['delta']}.npy")
+    for path in vector_dir.glob("*.npy"):
+        if path.name not in used:
+            path.unlink(missing_ok=True)
+
+
+def _read_meta(vector_dir: Path) -> Optional[Dict]:
+    try:
+        meta = json.loads((vector_dir / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == META_VERSION else None
+
+
+def build(docs: Iterable[Dict], dim: int = DEFAULT_DIM, vector_dir: Path = VECTOR_DIR) -> int:
+    """
+    全量生成向量索引（重新统计 IDF）
+
+    Returns:
+        文档数
+    """
+    ids, feats = [], []
+    for doc in docs:
+        ids.append(str(doc["id"]))
+        feats.append(hashed(document_features(doc)))
+
+    df = np.zeros(1 << IDF_BITS, dtype=np.int64)
+    mask = np.uint32((1 << IDF_BITS) - 1)
+    for hashes, _ in feats:
+        df[np.unique(hashes & mask)] += 1
+    idf = (np.log((len(ids) + 1) / (df + 1)) + 1.0).astype(np.float32)
+
+    rows = np.zeros((len(ids), dim), dtype=np.float32)
+    for row, (hashes, tf) in enumerate(feats):
+        rows[row] = _embed(hashes, tf, idf, dim)
+    _write(ids, rows, idf, dim, vector_dir)
+    return len(ids)
+
+
+def update(docs: Iterable[Dict], removed_ids: Iterable[str], dim: int = DEFAULT_DIM,
+           vector_dir: Path = VECTOR_DIR) -> bool:
+    """
+    增量更新：替换或追加 docs 的向量，删除 removed_ids（沿用现有的 IDF 表）
+
+    只读写增量矩阵和 meta.json，基础矩阵不动（见模块说明）；需要合并时才重写基础矩阵。
+
+    Returns:
+        是否更新成功；没有现有索引或维度不同时返回 False，调用方应改为 build()
+    """
+    meta = _read_meta(vector_dir)
+    if meta is None or meta["dim"] != dim:
+        return False
+    try:
+        idf = np.load(vector_dir / f"idf-{meta['base']}.npy")
+        delta = np.zeros((dim, 0), dtype=np.float32)
+        if meta["delta"] is not None:
+            delta = np.load(vector_dir / f"delta-{meta['delta']}.npy")
+    except (OSError, ValueError):
+        return False
+
+    docs = list(docs)
+    drop = set(removed_ids) | {str(doc["id"]) for doc in docs}
+    dead = set(meta["dead"])
+    dead.update(i for i, doc_id in enumerate(meta["ids"]) if doc_id in drop)
+    keep = [j for j, doc_id in enumerate(meta["delta_ids"]) if doc_id not in drop]
+    delta_ids = [meta["delta_ids"][j] for j in keep] + [str(doc["id"]) for doc in docs]
+    new_columns = [_embed(*hashed(document_features(doc)), idf, dim) for doc in docs]
+    delta = np.hstack([delta[:, keep]] + ([np.stack(new_columns, axis=1)] if new_columns else []))
+
+    if len(delta_ids) + len(dead) > max(COMPACT_MIN, COMPACT_RATIO * len(meta["ids"])):
+        base = np.load(vector_dir / f"matrix-{meta['base']}.npy", mmap_mode="r")
+        alive = [i for i in range(len(meta["ids"])) if i not in dead]
+        rows = np.vstack([base.T[alive], delta.T])
+        _write([meta["ids"][i] for i in alive] + delta_ids, rows.astype(np.float32), idf, dim, vector_dir)
+        return True
+
+    generation = meta["generation"] + 1
+    _save(vector_dir / f"delta-{generation}.npy", np.ascontiguousarray(delta, dtype=np.float32))
+    _switch(vector_dir, dict(meta, generation=generation, dead=sorted(dead),
+                             delta=generation, delta_ids=delta_ids))
+    return True
+
+
+def index_exists(dim: Optional[int] = None, vector_dir: Path = VECTOR_DIR) -> bool:
+    """是否有可用的向量索引（指定 dim 时还要求维度相同）"""
+    meta = _read_meta(vector_dir)
+    return meta is not None and (dim is None or meta["dim"] == dim)
+
+
+def remove(vector_dir: Path = VECTOR_DIR):
+    """删除向量索引"""
+    for path in list(vector_dir.glob("*")) if vector_dir.exists() else []:
+        path.unlink(missing_ok=True)
+
+
+class VectorIndex:
+    """只读的向量索引（矩阵通过 mmap 读取）"""
+
+    def __init__(self, vector_dir: Path = VECTOR_DIR):
+        meta = _read_meta(vector_dir)
+        if meta is None:
+            raise FileNotFoundError(vector_dir / "meta.json")
+        self.dim: int = meta["dim"]
+        self.matrix = np.load(vector_dir / f"matrix-{meta['base']}.npy", mmap_mode="r")
+        self.idf = np.load(vector_dir / f"idf-{meta['base']}.npy", mmap_mode="r")
+        self.delta = None
+        if meta["delta"] is not None:
+            self.delta = np.load(vector_dir / f"delta-{meta['delta']}.npy", mmap_mode="r")
+        if (self.matrix.shape != (self.dim, len(meta["ids"]))
+                or (self.delta is not None and self.delta.shape != (self.dim, len(meta["delta_ids"])))):
+            raise ValueError("vector index is inconsistent")
+        # 基础矩阵中仍然有效的列（没有失效列时为 None）
+        dead = set(meta["dead"])
+        self.alive = None
+        if dead:
+            self.alive = np.array([i for i in range(len(meta["ids"])) if i not in dead], dtype=np.int64)
+        self.ids: List[str] = [doc_id for i, doc_id in enumerate(meta["ids"]) if i not in dead]
+        self.ids += meta["delta_ids"]
+
+    def embed(self, text: str):
+        return _embed(*hashed(features(text)), self.idf, self.dim)
+
+    def search(self, text: str, limit: int = 10, min_score: float = 0.0,
+               noise_margin: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        余弦相似度最高的文档
+
+        Args:
+            text: 查询文本
+            limit: 最多返回的文档数
+            min_score: 余弦相似度下限
+            noise_margin: 相似度至少比噪声的最大值高出几个标准差（None 表示不检查）
+
+        Returns:
+            [(文档 id, 相似度)]，相似度从高到低
+        """
+        if not self.ids:
+            return []
+        query = self.embed(text)
+        dims = np.flatnonzero(query)
+        if not len(dims):
+            return []
+
+        scores = query[dims] @ self.matrix[dims]
+        if self.alive is not None:
+            scores = scores[self.alive]
+        if self.delta is not None:
+            scores = np.concatenate([scores, query[dims] @ self.delta[dims]])
+        if noise_margin is not None and len(scores) >= ZSCORE_MIN_DOCS:
+            z = math.sqrt(2 * math.log(len(scores))) + noise_margin
+            min_score = max(min_score, float(scores.mean() + z * scores.std()))
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        result = []
+        for i in top:
+            score = float(scores[i])
+            if score < min_score:
+                break
+            result.append((self.ids[i], score))
+        return result
+
+
+_cached = None
+_cached_key = None
+
+
+def load_cached(vector_dir: Path = VECTOR_DIR) -> Optional[VectorIndex]:
+    """读取向量索引，meta.json 未变化时复用（常驻进程中避免重复打开）"""
+    global _cached, _cached_key
+    if np is None:
+        return None
+    try:
+        st = (vector_dir / "meta.json").stat()
+    except OSError:
+        return None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if key != _cached_key:
+        try:
+            _cached = VectorIndex(vector_dir)
+        except (OSError, ValueError):
+            _cached = None
+        _cached_key = key
+    return _cached
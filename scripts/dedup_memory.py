@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+查找并合并近似重复的记忆文档（MinHash + LSH，见 lib/dedup.py）
+
+用法:
+    python3 dedup_memory.py [--threshold 0.8] [--json]    # 输出合并计划，不修改文件
+    python3 dedup_memory.py --apply [--threshold 0.8]     # 执行合并，然后增量重建索引
+
+每组相似文档保留一篇（sources 最多的，其次正文最长的），其余文档合并进来：
+- frontmatter 的 keywords、sources 取并集，updated 改为今天，created 取最早的
+- 都属于同一个项目时保留 project，files 取并集；否则合并后的文档是通用的，去掉 project 和 files
+- 正文中保留文档没有的段落（相同或几乎相同的段落跳过，小标题不保留）追加到 "## 补充（合并自 <id>）" 下
+- 被合并的文档删除
+
+合并时持有相关文档的锁（见 lib/memlock.py），不会与并行分析同时修改同一文档。
+"""
+
+import json
+import os
+import re
+import sys
+from contextlib import nullcontext, redirect_stdout
+from datetime import datetime
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List
+
+PLUGIN_DIR = Path(__file__).parent.parent
+GANGSMEM_DIR = Path.home() / ".gangsmem"
+MEMORY_DIR = GANGSMEM_DIR / "memory"
+
+# 添加 lib 到 path
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+sys.path.insert(0, str(PLUGIN_DIR / "scripts"))
+
+from rebuild_index import log, parse_frontmatter
+from scope import normalize_project
+
+FRONTMATTER_PATTERN = re.compile(r'^---\s*\n(.*?)\n---[ \t]*\n', re.DOTALL)
+HEADING_PATTERN = re.compile(r'^#{1,6}\s')
+LOCK_WAIT = 30
+# 与保留文档中某个段落的相似度不低于这个值时视为重复
+PARAGRAPH_RATIO = 0.9
+
+
+def arg_value(name: str, default):
+    """读取命令行参数 name 后面的值"""
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return default
+
+
+def as_list(value) -> List[str]:
+    if isinstance(value, list):
+        return value
+    return [value] if value else []
+
+
+def load_docs() -> List[Dict]:
+    """读取所有记忆文档（文件名排序）"""
+    docs = []
+    for md_file in sorted(MEMORY_DIR.glob("*.md")) if MEMORY_DIR.exists() else []:
+        try:
+            content = md_file.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            continue
+        frontmatter, body = parse_frontmatter(content)
+        docs.append({
+            "id": md_file.stem,
+            "path": md_file,
+            "frontmatter": frontmatter,
+            "body": body,
+            "text": "\n".join([str(frontmatter.get("title", "")),
+                               " ".join(as_list(frontmatter.get("keywords"))), body]),
+        })
+    return docs
+
+
+def plan_merges(docs: List[Dict], threshold: float) -> List[Dict]:
+    """
+    生成合并计划
+
+    Returns:
+        [{keep, merge: [{id, similarity}]}]，只包含与保留文档的相似度不低于阈值的文档
+    """
+    from dedup import MinHashIndex
+
+    index = MinHashIndex([doc["text"] for doc in docs], threshold)
+    plan = []
+    for cluster in index.clusters():
+        keep = max(cluster, key=lambda i: (len(as_list(docs[i]["frontmatter"].get("sources"))),
+                                           len(docs[i]["body"]), -i))
+        merge = sorted(
+            ({"id": docs[i]["id"], "similarity": round(index.similarity(keep, i), 3)}
+             for i in cluster if i != keep and index.similarity(keep, i) >= threshold),
+            key=lambda m: (-m["similarity"], m["id"])
+        )
+        if merge:
+            plan.append({"keep": docs[keep]["id"], "merge": merge})
+    log(f"Scanned {index.stats['docs']} docs: {index.stats['candidate_pairs']} candidate pairs, "
+        f"{index.stats['similar_pairs']} similar pairs, {len(plan)} merge groups")
+    return plan
+
+
+def union(*lists: List[str]) -> List[str]:
+    return list(dict.fromkeys(item for items in lists for item in items if item))
+
+
+def set_field(yaml: str, key: str, value: str) -> str:
+    """替换 frontmatter 中的一行（不存在时追加），其余行保持原样"""
+    pattern = re.compile(rf'^{re.escape(key)}\s*:.*$', re.MULTILINE)
+    line = f"{key}: {value}"
+    if pattern.search(yaml):
+        return pattern.sub(lambda _: line, yaml, count=1)
+    return f"{yaml}\n{line}"
+
+
+def remove_field(yaml: str, key: str) -> str:
+    """删除 frontmatter 中的一行"""
+    return re.sub(rf'^{re.escape(key)}\s*:.*(\n|$)', "", yaml, flags=re.MULTILINE).rstrip("\n")
+
+
+def paragraphs(body: str) -> List[str]:
+    """按空行切分段落（代码块内部不切分），标题行单独成段"""
+    result, current, fence = [], [], False
+    for line in body.splitlines():
+        if line.lstrip().startswith(("```", "~~~")):
+            fence = not fence
+        if not fence and (not line.strip() or HEADING_PATTERN.match(line)):
+            if current:
+                result.append("\n".join(current))
+                current = []
+            if line.strip():
+                result.append(line.strip())
+            continue
+        current.append(line)
+    if current:
+        result.append("\n".join(current))
+    return result
+
+
+def normalize(paragraph: str) -> str:
+    return " ".join(paragraph.split())
+
+
+def is_duplicate(paragraph: str, existing: List[str]) -> bool:
+    """paragraph（已规范化）与 existing 中某个段落相同或几乎相同"""
+    for other in existing:
+        if paragraph == other:
+            return True
+        if abs(len(paragraph) - len(other)) > max(len(paragraph), len(other)) * (1 - PARAGRAPH_RATIO):
+            continue
+        matcher = SequenceMatcher(None, paragraph, other, autojunk=False)
+        if matcher.quick_ratio() >= PARAGRAPH_RATIO and matcher.ratio() >= PARAGRAPH_RATIO:
+            return True
+    return False
+
+
+def merge_documents(keep_path: Path, merge_paths: List[Path]) -> str:
+    """合并后的保留文档内容"""
+    content = keep_path.read_text(encoding="utf-8")
+    frontmatter, _ = parse_frontmatter(content)
+    others = [parse_frontmatter(p.read_text(encoding="utf-8")) for p in merge_paths]
+
+    match = FRONTMATTER_PATTERN.match(content)
+    body = content[match.end():] if match else content
+    yaml = match.group(1) if match else f"id: {keep_path.stem}"
+    keywords = union(as_list(frontmatter.get("keywords")), *(as_list(fm.get("keywords")) for fm, _ in others))
+    sources = union(as_list(frontmatter.get("sources")), *(as_list(fm.get("sources")) for fm, _ in others))
+    yaml = set_field(yaml, "keywords", f"[{', '.join(keywords)}]")
+    yaml = set_field(yaml, "sources", f"[{', '.join(sources)}]")
+    projects = {normalize_project(str(fm.get("project", ""))) for fm in [frontmatter] + [fm for fm, _ in others]}
+    if len(projects) == 1 and "" not in projects:
+        files = union(as_list(frontmatter.get("files")), *(as_list(fm.get("files")) for fm, _ in others))
+        if files:
+            yaml = set_field(yaml, "files", f"[{', '.join(files)}]")
+    else:
+        yaml = remove_field(remove_field(yaml, "project"), "files")
+    created = sorted(str(fm["created"]) for fm, _ in [(frontmatter, body)] + others if fm.get("created"))
+    if created:
+        yaml = set_field(yaml, "created", created[0])
+    yaml = set_field(yaml, "updated", datetime.now().strftime("%Y-%m-%d"))
+
+    seen = [normalize(p) for p in paragraphs(body) if not HEADING_PATTERN.match(p)]
+    body = body.rstrip() + "\n"
+    for path, (_, other_body) in zip(merge_paths, others):
+        new = []
+        for p in paragraphs(other_body):
+            if HEADING_PATTERN.match(p) or is_duplicate(normalize(p), seen):
+                continue
+            new.append(p)
+            seen.append(normalize(p))
+        if new:
+            body += f"\n## 补充（合并自 {path.stem}）\n\n" + "\n\n".join(new) + "\n"
+
+    return f"---\n{yaml}\n---\n{body}" if match else body
+
+
+def merge_group(group: Dict, owner: str) -> int:
+    """
+    合并一组文档（持有组内所有文档的锁）
+
+    Returns:
+        删除的文档数（文档被其他进程锁定时跳过，为 0）
+    """
+    from memlock import acquire, release
+
+    ids = [group["keep"]] + [m["id"] for m in group["merge"]]
+    locked = []
+    try:
+        for doc_id in ids:
+            if not acquire(doc_id, owner, wait=LOCK_WAIT):
+                log(f"Skipped {group['keep']}: documents are locked by another process")
+                return 0
+            locked.append(doc_id)
+
+        keep_path = MEMORY_DIR / f"{group['keep']}.md"
+        merge_paths = [MEMORY_DIR / f"{doc_id}.md" for doc_id in ids[1:]]
+        merge_paths = [p for p in merge_paths if p.exists()]
+        if not keep_path.exists() or not merge_paths:
+            return 0
+
+        tmp = keep_path.with_suffix(".md.tmp")
+        tmp.write_text(merge_documents(keep_path, merge_paths), encoding="utf-8")
+        os.replace(tmp, keep_path)
+        for path in merge_paths:
+            path.unlink()
+        log(f"Merged {', '.join(p.stem for p in merge_paths)} into {group['keep']}")
+        return len(merge_paths)
+    finally:
+        for doc_id in locked:
+            release(doc_id, owner)
+
+
+def apply_merges(plan: List[Dict]) -> int:
+    """
+    执行合并计划（某一组出错时记录并跳过，不影响其他组）
+
+    Returns:
+        删除的文档数
+    """
+    owner = f"dedup-{os.getpid()}"
+    removed = 0
+    for group in plan:
+        try:
+            removed += merge_group(group, owner)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            # ValueError：不能作为锁文件名的 id（见 memlock.lock_path）
+            log(f"Skipped {group['keep']}: {e}")
+    return removed
+
+
+def print_plan(plan: List[Dict]):
+    for i, group in enumerate(plan, 1):
+        print(f"[{i}] keep {group['keep']}")
+        for m in group["merge"]:
+            print(f"    merge {m['id']}  (~{m['similarity']:.2f})")
+
+
+def main():
+    threshold = float(arg_value("--threshold", 0.8))
+    json_output = "--json" in sys.argv and "--apply" not in sys.argv
+    # --json 时 stdout 只输出 JSON，日志写到 stderr
+    with redirect_stdout(sys.stderr) if json_output else nullcontext():
+        plan = plan_merges(load_docs(), threshold)
+
+    if "--apply" not in sys.argv:
+        if json_output:
+            print(json.dumps(plan, ensure_ascii=False, indent=2))
+        else:
+            print_plan(plan)
+        return
+
+    if not plan:
+        return
+    removed = apply_merges(plan)
+    if removed:
+        from rebuild_index import rebuild_index
+        rebuild_index()
+    log(f"Done. Removed {removed} duplicate documents.")
+
+
+if __name__ == "__main__":
+    main()
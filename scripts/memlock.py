@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+记忆文档锁（并行分析时由分析进程调用）
+
+用法:
+    python3 memlock.py acquire OWNER DOC_ID [--wait 120]   # 获取锁，超时退出码为 1
+    python3 memlock.py release OWNER DOC_ID                # 释放锁
+    python3 memlock.py release-all OWNER                   # 释放 OWNER 持有的所有锁
+
+DOC_ID 为文档 id（即 memory/ 下的文件名，不含 .md）
+"""
+
+import sys
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).parent.parent
+
+# 添加 lib 到 path
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+
+
+def main():
+    from memlock import acquire, release, release_owner
+
+    args = sys.argv[1:]
+    wait = 120.0
+    if "--wait" in args:
+        i = args.index("--wait")
+        wait = float(args[i + 1])
+        del args[i:i + 2]
+
+    command = args[0] if args else ""
+    try:
+        if command == "acquire" and len(args) == 3:
+            if not acquire(args[2], args[1], wait=wait):
+                print(f"gangsmem: {args[2]} is locked by another worker", file=sys.stderr)
+                sys.exit(1)
+            print(f"locked {args[2]}")
+        elif command == "release" and len(args) == 3:
+            release(args[2], args[1])
+            print(f"released {args[2]}")
+        elif command == "release-all" and len(args) == 2:
+            for doc_id in release_owner(args[1]):
+                print(f"released {doc_id}")
+        else:
+            print(__doc__)
+            sys.exit(1)
+    except ValueError as e:
+        print(f"gangsmem: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
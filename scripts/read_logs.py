@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+读取对话日志（同时支持普通文件和按天归档的压缩日志）
+
+用法:
+    python3 read_logs.py list [--pending]    # 列出日志: key<TAB>session_id<TAB>layout<TAB>status
+    python3 read_logs.py cat KEY...          # 输出日志内容（JSONL）
+    python3 read_logs.py path KEY...         # 输出可用 Read 工具读取的文件路径（归档的日志会解压）
+    python3 read_logs.py digest KEY...       # 输出本地压缩后的日志摘要（压缩前后的字节数输出到 stderr）
+    python3 read_logs.py done KEY...         # 把日志标记为已分析
+    python3 read_logs.py reset               # 把所有日志重新标记为待分析
+    python3 read_logs.py cleanup             # 删除 path 解压出来的临时文件
+    python3 read_logs.py roll                # 立即归档今天之前的日志
+
+KEY 为 list 输出的第一列，格式 YYYY-MM-DD/HH-MM-SS_sessionid.jsonl
+"""
+
+import sys
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).parent.parent
+
+# 添加 lib 到 path
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+
+
+def find_entries(keys: list) -> list:
+    from logstore import iter_logs
+
+    by_key = {entry.key: entry for entry in iter_logs()}
+    missing = [key for key in keys if key not in by_key]
+    if missing:
+        print(f"gangsmem: log not found: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+    return [by_key[key] for key in keys]
+
+
+def main():
+    from ledger import Ledger, DONE
+    from logstore import iter_logs, read_log, materialize, cleanup_extracted, roll_logs
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    args = sys.argv[2:]
+
+    if command == "list":
+        entries = list(iter_logs())
+        ledger = Ledger()
+        ledger.register(entries)
+        status = ledger.statuses()
+        ledger.close()
+        for entry in entries:
+            if "--pending" in args and status.get(entry.key) == DONE:
+                continue
+            layout = "rolled" if entry.rolled else "file"
+            print(f"{entry.key}\t{entry.session_id}\t{layout}\t{status.get(entry.key, '')}")
+    elif command == "cat":
+        for entry in find_entries(args):
+            sys.stdout.buffer.write(read_log(entry))
+    elif command == "path":
+        for entry in find_entries(args):
+            print(materialize(entry))
+    elif command == "digest":
+        from condense import condense_log
+
+        for entry in find_entries(args):
+            raw = read_log(entry)
+            digest = condense_log(raw, entry.session_id)
+            sys.stdout.buffer.write(digest)
+            print(f"{entry.key}: {len(raw)} -> {len(digest)} bytes", file=sys.stderr)
+    elif command == "done":
+        ledger = Ledger()
+        ledger.register(iter_logs())
+        print(f"marked {ledger.mark_done(args)} logs as analyzed")
+        ledger.close()
+    elif command == "reset":
+        ledger = Ledger()
+        ledger.reset()
+        ledger.close()
+    elif command == "cleanup":
+        cleanup_extracted()
+    elif command == "roll":
+        for day, count in roll_logs().items():
+            print(f"{day}\t{count}")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,33 @@
 重建 FTS5 搜索索引
 
 扫描 memory/*.md 文件，解析 frontmatter，构建全文索引
+
+默认增量更新：通过 index_manifest.json 记录每个文件的 mtime、大小和内容哈希，
+只重新索引新增或修改的文件，并删除已不存在文件的索引。
+增量更新删除的旧行仍留在倒排索引中（见 lib/db.py），超过一定比例时自动改为全量重建。
+
+每次重建的分段耗时（lock / scan / index / vectors）和结果记入 metrics.log（见 lib/telemetry.py）。
+
+用法:
+    python3 rebuild_index.py          # 增量更新
+    python3 rebuild_index.py --full   # 全量重建
 """
 
 import sys
+import os
 import re
+import json
+import hashlib
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Iterable, List, Optional
 
 PLUGIN_DIR = Path(__file__).parent.parent
 GANGSMEM_DIR = Path.home() / ".gangsmem"
 MEMORY_DIR = GANGSMEM_DIR / "memory"
+# 与 db.MANIFEST_PATH 相同（db 的单篇写入接口会把写入的文档标记为已修改）
+MANIFEST_FILE = GANGSMEM_DIR / "index_manifest.json"
+MANIFEST_VERSION = 1
 
 # 添加 lib 到 path
 sys.path.insert(0, str(PLUGIN_DIR / "lib"))
@@ -82,62 +99,296 @@ def extract_summary(content: str, max_length: int = 200) -> str:
     return summary
 
 
-def rebuild_index() -> int:
-    """重建索引，返回索引的文档数量"""
-    from db import init_db, clear_all, index_document
+def load_document(md_file: Path, content: str) -> Dict:
+    """把 markdown 文件解析成索引文档"""
+    frontmatter, body = parse_frontmatter(content)
+
+    doc_id = frontmatter.get("id", md_file.stem)
+    title = frontmatter.get("title", md_file.stem)
+    keywords = frontmatter.get("keywords", [])
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    files = frontmatter.get("files", [])
+    if isinstance(files, str):
+        files = [files]
+
+    return {
+        "id": doc_id,
+        "title": title,
+        "keywords": keywords,
+        "content": body,
+        "summary": extract_summary(body),
+        "updated": frontmatter.get("updated") or frontmatter.get("created", ""),
+        "project": frontmatter.get("project", ""),
+        "files": files,
+        "path": md_file.name
+    }
+
+
+def content_hash(data: bytes) -> str:
+    """文件内容哈希"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def load_manifest() -> Optional[Dict]:
+    """读取索引清单，不存在或损坏时返回 None"""
+    if not MANIFEST_FILE.exists():
+        return None
+    try:
+        manifest = json.loads(MANIFEST_FILE.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(files: Dict[str, Dict]):
+    """原子写入索引清单"""
+    manifest = {"version": MANIFEST_VERSION, "files": files}
+    tmp = MANIFEST_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, MANIFEST_FILE)
+
+
+def manifest_entry(doc_id: str, data: bytes, st: os.stat_result) -> Dict:
+    """生成清单条目"""
+    return {
+        "id": doc_id,
+        "mtime": st.st_mtime_ns,
+        "size": st.st_size,
+        "hash": content_hash(data)
+    }
+
+
+def update_vectors(docs: List[Dict], removed_ids: Iterable[str] = (), full: bool = False,
+                   trace=None):
+    """
+    更新向量索引（vector_search 开启且安装了 numpy 时，见 lib/vectors.py）
 
-    # 初始化数据库
-    init_db()
+    Args:
+        docs: 全量重建时为全部文档；增量更新时为新写入的文档
+        removed_ids: 增量更新时删除的文档 id
+        full: 是否全量重建（重新统计 IDF）
+        trace: telemetry.Trace，失败时记入其中
+    """
+    from config import get_config
+    import vectors
+
+    config = get_config()
+    if not config.get("vector_search", False) or not vectors.available():
+        vectors.remove()
+        return
+    dim = int(config.get("vector_dim", vectors.DEFAULT_DIM))
+
+    try:
+        if not full:
+            removed_ids = list(removed_ids)
+            if not docs and not removed_ids and vectors.index_exists(dim):
+                return
+            if vectors.update(docs, removed_ids, dim):
+                return
+            # 还没有向量索引或改了维度：读取全部文档生成
+            docs = [load_document(f, f.read_text(encoding="utf-8")) for f in MEMORY_DIR.glob("*.md")]
+        count = vectors.build(docs, dim)
+        log(f"Built vector index ({count} documents)")
+    except Exception as e:
+        log(f"Failed to update vector index: {e}")
+        if trace is not None:
+            trace.error(e)
+
+
+def full_rebuild(trace) -> int:
+    """
+    全量重建：写入影子库后原子替换当前索引
 
-    # 清空现有索引
-    clear_all()
+    重建期间搜索仍读取旧索引，不会看到空的或不完整的结果
+    """
+    from db import IndexWriter, SHADOW_PATH, discard_shadow, swap_in_shadow, update_presence_filter
+    from usage import fold_counts
 
+    md_files = list(MEMORY_DIR.glob("*.md")) if MEMORY_DIR.exists() else []
     if not MEMORY_DIR.exists():
         log("Memory directory does not exist")
-        return 0
-
-    # 扫描所有 markdown 文件
-    md_files = list(MEMORY_DIR.glob("*.md"))
-    log(f"Found {len(md_files)} memory files")
+    else:
+        log(f"Found {len(md_files)} memory files")
 
-    indexed = 0
+    docs = []
+    entries: Dict[str, Dict] = {}
     for md_file in md_files:
         try:
-            content = md_file.read_text(encoding="utf-8")
-            frontmatter, body = parse_frontmatter(content)
-
-            doc_id = frontmatter.get("id", md_file.stem)
-            title = frontmatter.get("title", md_file.stem)
-            keywords = frontmatter.get("keywords", [])
-            if isinstance(keywords, str):
-                keywords = [keywords]
-
-            summary = extract_summary(body)
-
-            doc = {
-                "id": doc_id,
-                "title": title,
-                "keywords": keywords,
-                "content": body,
-                "summary": summary
-            }
-
-            if index_document(doc):
-                indexed += 1
-                log(f"  Indexed: {title}")
-            else:
-                log(f"  Failed: {title}")
-
+            data = md_file.read_bytes()
+            doc = load_document(md_file, data.decode("utf-8"))
+            docs.append(doc)
+            entries[md_file.name] = manifest_entry(doc["id"], data, md_file.stat())
         except Exception as e:
             log(f"  Error processing {md_file.name}: {e}")
-
+            trace.error(e)
+    trace.mark("scan")
+
+    discard_shadow()
+    with IndexWriter(db_path=SHADOW_PATH) as writer:
+        indexed, failures = writer.index_documents(docs, replace=False)
+        writer.set_usage(fold_counts()[0])
+        update_presence_filter(writer.conn)
+    swap_in_shadow()
+    trace.mark("index")
+    update_vectors(docs, full=True, trace=trace)
+    trace.mark("vectors")
+    trace.count("changed", indexed)
+    trace.count("failed", len(failures))
+
+    failed_ids = set()
+    for doc_id, error in failures:
+        log(f"  Failed: {doc_id} ({error})")
+        failed_ids.add(doc_id)
+
+    files = {name: e for name, e in entries.items() if e["id"] not in failed_ids}
+    save_manifest(files)
     log(f"Indexed {indexed} documents")
     return indexed
 
 
+def incremental_rebuild(manifest: Dict, trace) -> int:
+    """
+    增量重建：只处理新增、修改和删除的文件
+
+    先比较 mtime 和 size，变化了再比较内容哈希，哈希相同则只更新清单。
+    所有改动在一个写入事务中完成。
+    """
+    from db import IndexWriter, update_presence_filter
+    from usage import fold_counts
+
+    old_files: Dict[str, Dict] = manifest.get("files", {})
+    files: Dict[str, Dict] = {}
+    changed: Dict[str, tuple] = {}
+    stale_ids = set()
+
+    md_files = list(MEMORY_DIR.glob("*.md")) if MEMORY_DIR.exists() else []
+
+    for md_file in md_files:
+        name = md_file.name
+        old = old_files.get(name)
+        try:
+            st = md_file.stat()
+            if old and old["mtime"] == st.st_mtime_ns and old["size"] == st.st_size:
+                files[name] = old
+                continue
+
+            data = md_file.read_bytes()
+            if old and old["hash"] == content_hash(data):
+                files[name] = dict(old, mtime=st.st_mtime_ns, size=st.st_size)
+                continue
+
+            doc = load_document(md_file, data.decode("utf-8"))
+            changed[name] = (doc, manifest_entry(doc["id"], data, st))
+
+            # 文档 id 变化时删除旧条目
+            if old and old["id"] != doc["id"]:
+                stale_ids.add(old["id"])
+        except Exception as e:
+            log(f"  Error processing {name}: {e}")
+            trace.error(e)
+            if old:
+                # 保留旧索引，下次重试
+                files[name] = dict(old, mtime=None)
+
+    # 已不存在的文件对应的索引
+    removed = [name for name in old_files if name not in files and name not in changed]
+    stale_ids.update(old_files[name]["id"] for name in removed)
+    live_ids = {e["id"] for e in files.values()}
+    live_ids.update(doc["id"] for doc, _ in changed.values())
+    stale_ids -= live_ids
+
+    # 上次重建以来的注入次数（只有新的注入时才需要写入）
+    usage, usage_changed = fold_counts()
+    trace.mark("scan")
+
+    if not changed and not stale_ids:
+        if usage_changed:
+            with IndexWriter() as writer:
+                writer.set_usage(usage)
+        trace.mark("index")
+        update_vectors([], trace=trace)
+        trace.mark("vectors")
+        save_manifest(files)
+        log(f"No changes ({len(files)} documents)")
+        return len(files)
+
+    with IndexWriter() as writer:
+        writer.delete_documents(stale_ids)
+        _, failures = writer.index_documents(doc for doc, _ in changed.values())
+        writer.set_usage(usage)
+        update_presence_filter(writer.conn, [doc for doc, _ in changed.values()])
+    trace.mark("index")
+    failed_ids = {doc_id for doc_id, _ in failures}
+    update_vectors([doc for doc, _ in changed.values() if doc["id"] not in failed_ids], stale_ids,
+                   trace=trace)
+    trace.mark("vectors")
+    trace.count("changed", len(changed) - len(failed_ids))
+    trace.count("failed", len(failed_ids))
+    trace.count("removed", len(stale_ids))
+
+    added = updated = 0
+    for name, (doc, entry) in changed.items():
+        old = old_files.get(name)
+        if doc["id"] in failed_ids:
+            log(f"  Failed: {doc['title']}")
+            if old:
+                files[name] = dict(old, mtime=None)
+            continue
+        files[name] = entry
+        log(f"  Indexed: {doc['title']}")
+        if old:
+            updated += 1
+        else:
+            added += 1
+
+    for name in removed:
+        log(f"  Removed: {name}")
+
+    save_manifest(files)
+    log(f"Added {added}, updated {updated}, removed {len(removed)}, unchanged "
+        f"{len(files) - added - updated}")
+    return len(files)
+
+
+def rebuild_index(full: bool = False) -> int:
+    """
+    重建索引，返回索引中的文档数量
+
+    Args:
+        full: 强制全量重建；默认根据清单增量更新
+    """
+    from db import schema_is_current, index_lock, needs_compaction
+    from telemetry import Trace
+
+    trace = Trace("rebuild")
+    try:
+        with index_lock():
+            trace.mark("lock")
+            # 索引结构升级后、已删除的旧行过多时需要全量重建
+            if not full and needs_compaction():
+                log("Too many deleted rows in the index, rebuilding in full")
+                full = True
+            manifest = None if full or not schema_is_current() else load_manifest()
+            if manifest is None:
+                outcome, count = "full", full_rebuild(trace)
+            else:
+                outcome, count = "incremental", incremental_rebuild(manifest, trace)
+    except Exception as e:
+        trace.error(e)
+        trace.record("error")
+        raise
+    trace.count("documents", count)
+    trace.record(outcome)
+    return count
+
+
 def main():
-    log("Rebuilding FTS5 index...")
-    count = rebuild_index()
+    full = "--full" in sys.argv[1:]
+    log("Rebuilding FTS5 index (full)..." if full else "Updating FTS5 index...")
+    count = rebuild_index(full=full)
     log(f"Done. Total: {count} documents")
 
 
@@ -5,24 +5,58 @@
 功能：
 1. 检查未分析的日志
 2. 调用 Claude CLI 分析日志
-3. 更新状态文件
-4. 重建索引
+3. 更新分析台账（~/.gangsmem/state.db，见 lib/ledger.py）
+4. 重建索引（所有分析完成后统一重建一次）
+5. 归档已结束日期的日志（log_storage = "rolled" 时，见 lib/logstore.py）
+
+并行模式：analyze_workers 大于 1 时，同时运行多个 claude 进程分析互不重叠的批次，
+分析进程修改 memory/*.md 前通过 scripts/memlock.py 获取文档锁（见 lib/memlock.py）。
+
+批次按日志大小打包：每批不超过 analyze_batch_bytes 字节、analyze_batch_size 个日志，
+超过预算的单个日志按行切分成多段（见 lib/batching.py）。一次运行持续分析，
+直到没有待分析的日志或 analyze_time_budget 秒的时间预算用完，最后报告吞吐量。
+
+日志压缩：analyze_condense 开启时（默认），先在本地把日志整理成紧凑的摘要（见 lib/condense.py），
+摘要直接放进 prompt（通过 stdin 传给 claude），不再让模型逐个 Read 原始日志。
+
+候选文档：analyze_route_top_k 大于 0 时，先用本地搜索索引为每个日志找出最相关的几篇记忆文档，
+把 id、标题、关键词和摘要放进 prompt，模型只需读取其中相关的文档，不再 Glob 整个 memory 目录。
+claude 以 --output-format json 运行，每批记录对话轮数和耗时，结束时汇总（可与 --no-routing 对比）。
+
+用法:
+    python3 scheduled_analyze.py [--workers N] [--budget SECONDS] [--rescan] [--no-routing]
+
+--budget      本次运行的时间预算（秒），0 表示每个 worker 只分析一批
+--rescan      重新扫描全部日期分区（默认只扫描上次扫描到的最新分区及之后的分区）
+--no-routing  不在 prompt 中给出候选文档（由模型自己列出并判断 memory 目录中的文档）
 """
 
 import subprocess
 import json
 import sys
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional
 
 GANGSMEM_DIR = Path.home() / ".gangsmem"
-STATE_FILE = GANGSMEM_DIR / "state.json"
 CONFIG_FILE = GANGSMEM_DIR / "config.json"
 LOGS_DIR = GANGSMEM_DIR / "logs"
 MEMORY_DIR = GANGSMEM_DIR / "memory"
 PLUGIN_DIR = Path(__file__).parent.parent
 
+# 添加 lib 到 path
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+
+from batching import BatchPlanner, Progress, WorkItem
+from condense import condense_log
+from ledger import Ledger
+from retrieval import find_candidates
+from logstore import get_log, cleanup_extracted, roll_logs
+
 
 def log(msg: str):
     """输出带时间戳的日志"""
@@ -30,6 +64,15 @@ def log(msg: str):
     print(f"[{timestamp}] {msg}")
 
 
+def arg_value(name: str, default):
+    """读取命令行参数 name 后面的值"""
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return default
+
+
 def get_claude_path() -> str:
     """获取 claude 可执行文件路径"""
     # 优先从环境变量获取
@@ -49,72 +92,154 @@ def get_claude_path() -> str:
     return "claude"
 
 
-def get_state() -> dict:
-    """读取状态文件"""
-    if STATE_FILE.exists():
-        try:
-            return json.loads(STATE_FILE.read_text())
-        except Exception:
-            pass
-    return {"analyzed_sessions": [], "last_analyzed": None}
+def get_pending_logs(ledger: Ledger, max_attempts: int = 3, rescan: bool = False) -> Iterator:
+    """
+    获取未分析的日志（普通文件和按天归档的都包括）
 
+    先把高水位前一天及之后的日期分区中新出现的日志登记到分析台账（rescan=True 时扫描全部分区），
+    再返回按时间顺序惰性读出的待分析日志，调用方取够即可停止。
 
-def save_state(state: dict):
-    """保存状态文件"""
-    state["last_analyzed"] = datetime.now().isoformat()
-    STATE_FILE.write_text(json.dumps(state, indent=2, ensure_ascii=False))
+    Returns:
+        (LogEntry, session_id) 的迭代器
+    """
+    ledger.discover(LOGS_DIR, rescan=rescan)
+    entries = ((get_log(key, LOGS_DIR), session_id)
+               for key, session_id in ledger.iter_pending(max_attempts))
+    # 台账中有记录但日志已被删除的跳过
+    return ((entry, session_id) for entry, session_id in entries if entry is not None)
 
 
-def get_pending_logs(state: dict) -> list:
-    """获取未分析的日志文件"""
-    analyzed = set(state.get("analyzed_sessions", []))
-    pending = []
+class BatchResult(NamedTuple):
+    """一批的分析结果"""
+    ok: bool
+    error: Optional[str] = None
+    turns: Optional[int] = None         # claude 报告的对话轮数（无法解析输出时为 None）
+    max_turns_hit: bool = False         # 是否因达到 --max-turns 而结束
+    candidates: int = 0                 # prompt 中给出的候选文档数
+    routing_ms: float = 0.0             # 查找候选文档的耗时
 
-    if not LOGS_DIR.exists():
-        return []
 
-    for log_file in LOGS_DIR.rglob("*.jsonl"):
-        # 文件名格式: HH-MM-SS_sessionid.jsonl
-        session_id = log_file.stem.split("_")[-1][:8]
-        if session_id not in analyzed:
-            pending.append((log_file, session_id))
+def route_candidates(batch: List[WorkItem], condensed: bool, top_k: int) -> List[Dict]:
+    """用搜索索引为批次中的每个日志找出最相关的 top_k 篇文档（合并去重）"""
+    from config import get_config
 
-    # 按时间排序（旧的优先）
-    pending.sort(key=lambda x: x[0].stat().st_mtime)
+    texts = []
+    for item in batch:
+        data = item.path.read_bytes()
+        if not condensed:
+            data = condense_log(data, item.session_id)
+        texts.append(data.decode("utf-8", errors="replace"))
+    return find_candidates(texts, get_config(), per_text=top_k)
 
-    return pending
 
+def format_candidates(candidates: List[Dict]) -> str:
+    """prompt 中的候选文档列表"""
+    lines = []
+    for doc in candidates:
+        keywords = ", ".join(doc["keywords"].split())
+        lines.append(f"- **{doc['id']}**: {doc['title']}（keywords: {keywords}）\n  {doc['summary']}")
+    return "\n".join(lines)
 
-def analyze_batch(pending: list, state: dict) -> bool:
-    """分析一批日志"""
-    # 每次最多分析 5 个，避免超时
-    batch = pending[:5]
 
-    log_paths = "\n".join(f"- {p[0]}" for p in batch)
+def parse_result(stdout: str) -> Dict:
+    """解析 claude --output-format json 的输出（result 消息），无法解析时返回空字典"""
+    try:
+        data = json.loads(stdout)
+    except ValueError:
+        return {}
+    if isinstance(data, list):
+        # 部分版本输出整个消息列表
+        data = next((m for m in reversed(data) if isinstance(m, dict) and m.get("type") == "result"), {})
+    return data if isinstance(data, dict) else {}
+
+
+def lock_rules(worker: str) -> str:
+    """并行分析时附加到 prompt 中的文档锁说明"""
+    memlock = f"python3 {PLUGIN_DIR}/scripts/memlock.py"
+    return f"""
+### 文档锁（重要）
+有其他分析进程同时在修改记忆文档。对任何文档执行 Edit 或 Write（包括创建新文档）之前，
+必须先获取该文档的锁，修改完成后立即释放：
+```bash
+{memlock} acquire {worker} <文档id>
+{memlock} release {worker} <文档id>
+```
+- 获取锁之后重新 Read 文档（或重新检查文档是否已存在），再进行修改
+- acquire 失败（退出码 1）表示文档正被其他进程长时间占用，跳过这个文档
+- 同一时间只持有一个文档的锁
+"""
+
 
-    session_ids = ", ".join(s for _, s in batch)
+def analyze_batch(batch: List[WorkItem], worker: str = None,
+                  condensed: bool = False, top_k: int = 0) -> BatchResult:
+    """
+    分析一批日志（调用前已在台账中领取）
+
+    Args:
+        batch: 工作项（日志或日志的一段，归档的日志已解压成临时文件）
+        worker: 并行模式下的 worker 名称（用作文档锁的持有者）；None 表示单进程
+        condensed: 工作项是压缩后的摘要（内容直接放进 prompt）
+        top_k: 每个日志在 prompt 中给出的候选文档数，0 表示不给出
+
+    Returns:
+        BatchResult
+    """
+    prefix = f"[{worker}] " if worker else ""
+
+    candidates, routing_ms = [], 0.0
+    if top_k > 0:
+        start = time.perf_counter()
+        candidates = route_candidates(batch, condensed, top_k)
+        routing_ms = (time.perf_counter() - start) * 1000
+        log(f"{prefix}Routed {len(candidates)} candidate docs in {routing_ms:.0f} ms")
+
+    if candidates:
+        check_step = f"""以下是根据日志内容从搜索索引中找出的候选文档（文档文件一般为 {MEMORY_DIR}/<id>.md）：
+
+{format_candidates(candidates)}
+
+根据标题、关键词和摘要判断每个知识点是否与某个候选文档相关，只 Read 相关的候选文档，
+不需要列出或逐个读取 memory 目录。候选中没有相关文档时，用 Grep 在 {MEMORY_DIR} 中按关键词查找；
+创建新文档前用 Glob 确认没有同名文件（本次运行中其他批次新建的文档还不在索引中）。"""
+    else:
+        check_step = f"""使用 Glob 工具列出 {MEMORY_DIR}/*.md 所有现有文档。
+对于每个提取的知识点，判断是否与现有文档相关（通过标题、关键词判断）。"""
+
+    if condensed:
+        sources = "## 日志摘要\n以下是在本地整理过的对话摘要（重复提问已合并，长代码和调用栈已截断）：\n\n" + \
+            "\n".join(item.path.read_text(encoding="utf-8", errors="replace") for item in batch)
+        read_step = "直接阅读上面的日志摘要（不需要再读取原始日志），识别有价值的知识点："
+    else:
+        sources = "## 日志文件\n" + "\n".join(f"- {item.path}" for item in batch)
+        read_step = "使用 Read 工具读取上述日志文件，识别有价值的知识点："
+
+    session_ids = ", ".join(dict.fromkeys(item.session_id for item in batch))
+
+    split = [item for item in batch if item.parts > 1]
+    split_note = ""
+    if split:
+        split_note = "\n## 分段日志\n过长的会话被按行切成了多段，其余分段在其他批次中分析，只需处理这里给出的部分：\n" + \
+            "\n".join(f"- {item.path.name}: 第 {item.part}/{item.parts} 段" for item in split) + "\n"
 
     prompt = f"""
 你是一个知识管理助手。请分析以下对话日志，提取可复用的知识点。
 
-## 日志文件
-{log_paths}
+{sources}
 
 ## 本次分析的 Session IDs
 {session_ids}
-
+{split_note}
 ## 任务流程
 
 ### 第一步：读取并分析日志
-使用 Read 工具读取上述日志文件，识别有价值的知识点：
+{read_step}
 - 解决的问题和方案
 - 可泛化的技巧、模式、最佳实践
 - 重要的代码片段或命令
 - 工具使用方法和配置
 
 ### 第二步：检查现有记忆
-使用 Glob 工具列出 {MEMORY_DIR}/*.md 所有现有文档。
-对于每个提取的知识点，判断是否与现有文档相关（通过标题、关键词判断）。
+{check_step}
 
 ### 第三步：更新或创建文档
 
@@ -124,6 +249,8 @@ def analyze_batch(pending: list, state: dict) -> bool:
    - 在 frontmatter 的 `sources` 列表中添加新的 session ID
    - 更新 `updated` 日期为 {datetime.now().strftime("%Y-%m-%d")}
    - 在 `keywords` 中添加新的关键词（如果有）
+   - 在 `files` 中添加新涉及的文件（如果有）；文档的 `project` 与本次日志的项目不同时，
+     说明这条知识在多个项目中都用得到，删除 `project` 和 `files`
    - 在文档正文中追加新的内容（使用 "## 补充" 或整合到现有章节）
    - 如果新内容与现有内容重复，则整合去重
    - 如果新内容是对现有内容的补充或修正，直接修改原文
@@ -139,6 +266,8 @@ keywords: [关键词1, 关键词2, 关键词3]
 created: {datetime.now().strftime("%Y-%m-%d")}
 updated: {datetime.now().strftime("%Y-%m-%d")}
 sources: [{session_ids}]
+project: /path/to/project
+files: [src/example.py]
 ---
 
 # 标题
@@ -155,11 +284,15 @@ sources: [{session_ids}]
 ...
 ```
 
-### 第四步：重建索引
-完成所有文档操作后，运行以下命令重建搜索索引：
-```bash
-python3 {PLUGIN_DIR}/scripts/rebuild_index.py
-```
+**项目范围（project / files）**
+日志中的 `project` 是会话所在的项目根目录，`files` 是会话中读写过的文件。
+- 只适用于这个项目的知识（项目的代码结构、配置、约定、特有的问题）：`project` 照抄日志中的路径，
+  `files` 写与这条知识直接相关的文件（照抄日志中的写法），只在这个项目中注入
+- 通用的知识（语言、工具、库的用法，换一个项目也成立）：不写 `project` 和 `files`，在所有项目中注入
+
+{lock_rules(worker) if worker else ""}
+### 第四步：完成
+完成所有文档操作后直接结束，搜索索引由调度脚本统一重建。
 
 ## 重要原则
 - 只提取真正有价值、可复用的知识
@@ -172,50 +305,208 @@ python3 {PLUGIN_DIR}/scripts/rebuild_index.py
 """
 
     claude_path = get_claude_path()
-    log(f"Using claude at: {claude_path}")
-    log(f"Analyzing {len(batch)} logs...")
+    log(f"{prefix}Using claude at: {claude_path}")
+    size = sum(item.size for item in batch)
+    if condensed:
+        log(f"{prefix}Analyzing {len(batch)} logs ({size} bytes, condensed from "
+            f"{sum(item.raw_size for item in batch)} bytes)...")
+    else:
+        log(f"{prefix}Analyzing {len(batch)} logs ({size} bytes)...")
 
     try:
+        # prompt 通过 stdin 传入（内嵌摘要时可能超过命令行参数的长度限制）
         result = subprocess.run(
             [
                 claude_path,
-                "-p", prompt,
+                "-p",
                 "--allowedTools", "Read,Write,Edit,Glob,Grep,Bash",
-                "--max-turns", "30"
+                "--max-turns", "30",
+                "--output-format", "json"
             ],
+            input=prompt,
             capture_output=True,
             text=True,
             timeout=600  # 10分钟超时
         )
 
+        usage = parse_result(result.stdout)
+        turns = usage.get("num_turns")
+        max_turns_hit = usage.get("subtype") == "error_max_turns"
+        if turns is not None:
+            log(f"{prefix}Turns: {turns}, duration: {usage.get('duration_ms', 0) / 1000:.1f}s"
+                + (" (hit --max-turns)" if max_turns_hit else ""))
+        stats = dict(turns=turns, max_turns_hit=max_turns_hit,
+                     candidates=len(candidates), routing_ms=routing_ms)
+
         if result.returncode == 0:
-            # 更新已分析列表
-            for _, session_id in batch:
-                if session_id not in state["analyzed_sessions"]:
-                    state["analyzed_sessions"].append(session_id)
-            save_state(state)
-            log(f"Analysis complete. Processed {len(batch)} sessions.")
+            log(f"{prefix}Analysis complete. Processed {len(batch)} sessions.")
 
             # 输出部分结果
-            if result.stdout:
-                output = result.stdout
+            output = usage.get("result", result.stdout) if usage else result.stdout
+            if output:
                 if len(output) > 1000:
                     output = output[:500] + "\n...\n" + output[-500:]
-                log(f"Output:\n{output}")
+                log(f"{prefix}Output:\n{output}")
 
-            return True
+            return BatchResult(True, **stats)
         else:
-            log(f"Error (exit code {result.returncode}):")
+            log(f"{prefix}Error (exit code {result.returncode}):")
             if result.stderr:
                 log(result.stderr[:1000])
-            return False
+            return BatchResult(False, f"exit code {result.returncode}: {result.stderr}", **stats)
 
     except subprocess.TimeoutExpired:
-        log("Error: Analysis timed out after 10 minutes")
-        return False
+        log(f"{prefix}Error: Analysis timed out after 10 minutes")
+        return BatchResult(False, "timeout", candidates=len(candidates), routing_ms=routing_ms)
+    except Exception as e:
+        log(f"{prefix}Error: {e}")
+        return BatchResult(False, str(e), candidates=len(candidates), routing_ms=routing_ms)
+    finally:
+        if worker:
+            from memlock import release_owner
+            for doc_id in release_owner(worker):
+                log(f"{prefix}Released stale lock on {doc_id}")
+
+
+class Throughput:
+    """一次运行的统计"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.batches = 0
+        self.failed_batches = 0
+        self.sessions = 0
+        self.bytes = 0
+        self.raw_bytes = 0
+        self.longest_batch = 0.0
+        self.batch_seconds = 0.0
+        self.turns: List[int] = []
+        self.max_turns_hits = 0
+        self.candidates = 0
+        self.routing_ms = 0.0
+
+    def record(self, result: BatchResult, elapsed: float):
+        self.longest_batch = max(self.longest_batch, elapsed)
+        self.batch_seconds += elapsed
+        if result.turns is not None:
+            self.turns.append(result.turns)
+        self.max_turns_hits += result.max_turns_hit
+        self.candidates += result.candidates
+        self.routing_ms += result.routing_ms
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        minutes = elapsed / 60
+        return (f"Throughput: {self.sessions} sessions, {self.bytes / 1024:.1f} KB in {elapsed:.0f}s "
+                f"({self.batches} batches, {self.failed_batches} failed) -> "
+                f"{self.sessions / minutes:.1f} sessions/min, {self.bytes / 1024 / minutes:.1f} KB/min")
+
+    def turns_report(self) -> str:
+        batches = max(self.batches, 1)
+        turns = (f"{sum(self.turns) / len(self.turns):.1f} turns/batch (max {max(self.turns)}), "
+                 if self.turns else "turns unknown, ")
+        return (f"Per batch: {turns}{self.batch_seconds / batches:.1f}s wall-clock, "
+                f"{self.max_turns_hits} hit --max-turns; "
+                f"{self.candidates / batches:.1f} candidate docs routed in {self.routing_ms / batches:.0f} ms")
+
+    def condense_report(self) -> str:
+        ratio = self.bytes / self.raw_bytes if self.raw_bytes else 1.0
+        return (f"Condensed: {self.raw_bytes / 1024:.1f} KB of logs -> {self.bytes / 1024:.1f} KB "
+                f"in prompts ({ratio:.1%})")
+
+
+def drain(planner: BatchPlanner, ledger: Ledger, workers: int, time_budget: float,
+          condensed: bool = False, top_k: int = 0) -> Throughput:
+    """
+    持续分析，直到没有待分析的日志或时间预算用完
+
+    每个 worker 分析完一批后立即领取下一批。剩余时间不足以完成一个批次
+    （按目前最长的批次耗时估计）时不再开始新的批次；time_budget <= 0 时每个 worker 只分析一批。
+    """
+    stats = Throughput()
+    progress = Progress()
+    deadline = stats.start + time_budget
+    lock = threading.Lock()
+
+    def has_time(started: int) -> bool:
+        if time_budget <= 0:
+            return started < workers
+        return started == 0 or time.monotonic() + stats.longest_batch <= deadline
+
+    def work(worker: Optional[str]):
+        while True:
+            with lock:
+                if not has_time(stats.batches):
+                    return
+                batch = planner.next_batch()
+                if not batch:
+                    return
+                stats.batches += 1
+
+            start = time.monotonic()
+            try:
+                result = analyze_batch(batch, worker, condensed, top_k)
+            except Exception as e:
+                # 调用 claude 之前的准备（查找候选文档、读取日志摘要）出错：这一批记为失败，
+                # 不让异常中断其他 worker 和后面的释放、重建索引
+                log(f"[{worker}] Error preparing batch: {e}" if worker else f"Error preparing batch: {e}")
+                result = BatchResult(False, f"{type(e).__name__}: {e}")
+            elapsed = time.monotonic() - start
+
+            succeeded, failed = progress.record(batch, result.ok, result.error)
+            if succeeded:
+                ledger.finish(succeeded, True)
+            for key in failed:
+                ledger.finish([key], False, progress.error(key))
+
+            with lock:
+                stats.record(result, elapsed)
+                stats.sessions += len(succeeded)
+                if result.ok:
+                    stats.bytes += sum(item.size for item in batch)
+                    stats.raw_bytes += sum(item.raw_size for item in batch)
+                else:
+                    stats.failed_batches += 1
+
+    try:
+        if workers == 1:
+            work(None)
+        else:
+            names = [f"w{i + 1}-{os.getpid()}" for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(work, names))
+    finally:
+        # 领取了但没来得及分析的日志（包括只分析了部分分段的）放回待分析，
+        # 出现意外的异常时也要放回，否则要等领取超时（ledger.STALE_SECONDS）后才能重新分析
+        unfinished = list(dict.fromkeys(planner.leftover_keys() + progress.incomplete_keys()))
+        if unfinished:
+            ledger.release(unfinished)
+            log(f"Released {len(unfinished)} claimed logs that did not fit in the time budget")
+    return stats
+
+
+def rebuild_search_index():
+    """所有分析完成后统一重建一次索引（增量）"""
+    try:
+        from rebuild_index import rebuild_index
+        rebuild_index()
+    except Exception as e:
+        log(f"Failed to rebuild index: {e}")
+
+
+def roll_finished_days():
+    """log_storage 为 "rolled" 时，把今天之前的日志归档成每天一个压缩文件"""
+    from config import get_config
+
+    if get_config().get("log_storage", "files") != "rolled":
+        return
+    try:
+        rolled = roll_logs(LOGS_DIR)
     except Exception as e:
-        log(f"Error: {e}")
-        return False
+        log(f"Failed to roll logs: {e}")
+        return
+    for day, count in rolled.items():
+        log(f"Rolled {count} logs of {day}")
 
 
 def main():
@@ -226,20 +517,67 @@ def main():
     GANGSMEM_DIR.mkdir(exist_ok=True)
     MEMORY_DIR.mkdir(exist_ok=True)
 
-    state = get_state()
-    pending = get_pending_logs(state)
+    roll_finished_days()
 
-    if not pending:
-        log("No pending logs to analyze.")
-        return
+    from config import get_config
 
-    log(f"Found {len(pending)} pending logs.")
+    config = get_config()
+    workers = max(1, int(arg_value("--workers", config.get("analyze_workers", 1))))
+    # 每批的字节预算和日志数上限
+    batch_bytes = max(1024, int(config.get("analyze_batch_bytes", 300000)))
+    batch_size = max(1, int(config.get("analyze_batch_size", 20)))
+    max_attempts = max(1, int(config.get("analyze_max_attempts", 3)))
+    time_budget = float(arg_value("--budget", config.get("analyze_time_budget", 1800)))
+    condensed = bool(config.get("analyze_condense", True))
+    top_k = 0 if "--no-routing" in sys.argv else max(0, int(config.get("analyze_route_top_k", 3)))
 
-    # 分批处理
-    success = analyze_batch(pending, state)
+    ledger = Ledger()
+    try:
+        pending = get_pending_logs(ledger, max_attempts, rescan="--rescan" in sys.argv)
+        # 在台账中逐个领取（另一个同时运行的分析进程可能已经领走了一部分）
+        owner = f"run-{os.getpid()}"
+
+        def fail(key: str, error: str):
+            log(f"Failed to read log {key}: {error}")
+            ledger.finish([key], False, error)
+
+        planner = BatchPlanner(
+            pending,
+            lambda key: bool(ledger.claim([key], owner, max_attempts)),
+            batch_bytes, batch_size, LOGS_DIR,
+            condense=condense_log if condensed else None, fail=fail
+        )
 
-    if success and len(pending) > 5:
-        log(f"Note: {len(pending) - 5} more logs will be analyzed in the next run.")
+        total = ledger.count_pending(max_attempts)
+        if not total:
+            log("No pending logs to analyze.")
+            return
+        log(f"Found {total} pending logs.")
+        if workers > 1:
+            log(f"Running with {workers} workers...")
+
+        try:
+            stats = drain(planner, ledger, workers, time_budget, condensed, top_k)
+        finally:
+            cleanup_extracted()
+
+        log(stats.report())
+        log(stats.turns_report())
+        if condensed:
+            log(stats.condense_report())
+        counts = ledger.counts()
+        log("Ledger: " + ", ".join(f"{status}={counts[status]}" for status in sorted(counts)))
+        remaining = ledger.count_pending(max_attempts)
+    finally:
+        ledger.close()
+
+    # 失败的批次、还没有分析完所有分段的日志也可能已经修改了记忆文档：只要有批次运行过就更新索引
+    # （增量更新只重新索引清单中有变化的文件，没有变化时只检查 mtime 和大小）
+    if stats.batches:
+        rebuild_search_index()
+
+    if remaining:
+        log(f"Note: {remaining} more logs will be analyzed in the next run.")
 
     log("Done.")
 
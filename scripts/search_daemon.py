@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+常驻搜索进程管理
+
+用法:
+    python3 search_daemon.py start    # 后台启动
+    python3 search_daemon.py stop     # 停止
+    python3 search_daemon.py status   # 查看状态
+    python3 search_daemon.py run      # 前台运行（由 start 调用）
+
+在 config.json 中设置 "use_daemon": true 后，SessionStart hook 会自动启动。
+"""
+
+import sys
+from pathlib import Path
+from datetime import datetime
+
+PLUGIN_DIR = Path(__file__).parent.parent
+
+# 添加 lib 到 path
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+
+
+def log(msg: str):
+    """输出日志"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {msg}", flush=True)
+
+
+def main():
+    from daemon import SearchDaemon, start_daemon, stop_daemon, is_running
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+
+    if command == "run":
+        log("Search daemon starting...")
+        SearchDaemon().serve_forever()
+        log("Search daemon stopped")
+    elif command == "start":
+        if start_daemon():
+            print("gangsmem: search daemon running")
+        else:
+            print("gangsmem: failed to start search daemon", file=sys.stderr)
+            sys.exit(1)
+    elif command == "stop":
+        if stop_daemon():
+            print("gangsmem: search daemon stopped")
+        else:
+            print("gangsmem: search daemon not running")
+    elif command == "status":
+        print("running" if is_running() else "stopped")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
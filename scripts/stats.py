@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+汇总 hook 的耗时和结果（数据来自 ~/.gangsmem/metrics.log，见 lib/telemetry.py）
+
+用法:
+    python3 stats.py [--windows 1h,24h,7d] [--hook inject] [--errors 5] [--json]
+
+对每个 hook（inject、session_end、rebuild）和每个时间窗口（最近 1 小时、24 小时、7 天，
+all 表示全部记录）报告：
+- 运行次数和各种结果的比例（inject: hit / empty / skipped，session_end: saved / empty / skipped，
+  rebuild: full / incremental），error 为带有错误（包括搜索时被处理掉的 OperationalError）的比例
+- 每个阶段的 p50 / p95 / p99 耗时（毫秒），total 为整个 hook 的耗时（不含 Python 解释器启动）
+最后列出最近的几条错误。
+"""
+
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+PLUGIN_DIR = Path(__file__).parent.parent
+
+# 添加 lib 到 path
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+
+WINDOW_PATTERN = re.compile(r"^(\d+)([mhd])$")
+WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400}
+# 各阶段的显示顺序（未列出的阶段排在后面）
+STAGE_ORDER = ["import", "ipc", "config", "tokenize", "filter", "open_db", "query", "render",
+               "open", "capture", "commit", "lock", "scan", "index", "vectors", "total"]
+
+
+def arg_value(name: str, default):
+    """读取命令行参数 name 后面的值"""
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return default
+
+
+def window_seconds(window: str) -> float:
+    """"30m" / "24h" / "7d" -> 秒数，"all" -> 0（不限）"""
+    if window == "all":
+        return 0
+    match = WINDOW_PATTERN.match(window)
+    if not match:
+        raise ValueError(f"invalid window: {window}")
+    return int(match.group(1)) * WINDOW_UNITS[match.group(2)]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """百分位数（最近秩）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def summarize(entries: List[Dict]) -> Dict:
+    """一组记录的结果比例和各阶段耗时分位数"""
+    n = len(entries)
+    outcomes: Dict[str, int] = {}
+    stages: Dict[str, List[float]] = {}
+    errors = 0
+    for entry in entries:
+        outcome = entry.get("outcome", "?")
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        errors += "error" in entry
+        for stage, ms in (entry.get("ms") or {}).items():
+            stages.setdefault(stage, []).append(float(ms))
+
+    order = {stage: i for i, stage in enumerate(STAGE_ORDER)}
+    return {
+        "runs": n,
+        "outcomes": {name: round(count / n, 4) for name, count in sorted(outcomes.items())},
+        "error_rate": round(errors / n, 4),
+        "stages": {
+            stage: {
+                "n": len(values),
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+                "p99_ms": round(percentile(values, 99), 3),
+            }
+            for stage, values in sorted(stages.items(), key=lambda item: (order.get(item[0], 99), item[0]))
+        },
+    }
+
+
+def build_report(entries: List[Dict], windows: List[str], now: float) -> Dict:
+    report: Dict[str, Dict] = {}
+    hooks = sorted({entry.get("hook", "?") for entry in entries})
+    for hook in hooks:
+        hook_entries = [e for e in entries if e.get("hook") == hook]
+        report[hook] = {}
+        for window in windows:
+            seconds = window_seconds(window)
+            selected = [e for e in hook_entries if not seconds or e["t"] >= now - seconds]
+            if selected:
+                report[hook][window] = summarize(selected)
+    return report
+
+
+def recent_errors(entries: List[Dict], limit: int) -> List[Dict]:
+    errors = [e for e in entries if "error" in e]
+    return [{"t": e["t"], "hook": e.get("hook"), "outcome": e.get("outcome"), "error": e["error"]}
+            for e in errors[-limit:]] if limit > 0 else []
+
+
+def print_report(report: Dict, errors: List[Dict]):
+    if not report:
+        print("No metrics recorded yet")
+        return
+    for hook, windows in report.items():
+        for window, summary in windows.items():
+            outcomes = "  ".join(f"{name} {rate:.1%}" for name, rate in summary["outcomes"].items())
+            print(f"{hook}  [{window}]  {summary['runs']} runs  {outcomes}  "
+                  f"| error rate {summary['error_rate']:.1%}")
+            print(f"  {'stage':<10}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            for stage, s in summary["stages"].items():
+                print(f"  {stage:<10}{s['n']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+        print()
+
+    if errors:
+        print("Recent errors:")
+        for e in errors:
+            stamp = datetime.fromtimestamp(e["t"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"  {stamp}  {e['hook']:<12}{e['error']}")
+
+
+def main():
+    from telemetry import read_entries
+
+    windows = arg_value("--windows", "1h,24h,7d").split(",")
+    hook = arg_value("--hook", None)
+    try:
+        longest = [window_seconds(w) for w in windows]
+        limit = int(arg_value("--errors", 5))
+    except ValueError as e:
+        print(f"gangsmem: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    now = time.time()
+    since = 0 if 0 in longest else now - max(longest)
+    entries = read_entries(since=since)
+    if hook:
+        entries = [e for e in entries if e.get("hook") == hook]
+
+    report = build_report(entries, windows, now)
+    errors = recent_errors(entries, limit)
+    if "--json" in sys.argv:
+        print(json.dumps({"windows": report, "errors": errors}, ensure_ascii=False, indent=2))
+    else:
+        print_report(report, errors)
+
+
+if __name__ == "__main__":
+    main()
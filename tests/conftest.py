@@ -0,0 +1,14 @@
+"""测试公共设置：lib/ 和 scripts/ 加入导入路径，HOME 指向临时目录"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).parent.parent
+
+# lib 模块在导入时由 HOME 得出 ~/.gangsmem 下的路径，必须在导入之前设置，不读写真实的记忆库
+os.environ["HOME"] = tempfile.mkdtemp(prefix="gm-test-")
+
+sys.path.insert(0, str(PLUGIN_DIR / "lib"))
+sys.path.insert(0, str(PLUGIN_DIR / "scripts"))
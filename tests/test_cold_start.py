@@ -0,0 +1,37 @@
+"""hooks/inject_memory.py 的冷启动预算（benchmarks/check_cold_start.py 的检查，超出预算时测试失败）"""
+
+import compileall
+import sys
+
+import pytest
+
+from conftest import PLUGIN_DIR
+
+sys.path.insert(0, str(PLUGIN_DIR / "benchmarks"))
+
+import check_cold_start  # noqa: E402
+
+# 比命令行默认的 30 次少，整个模块约 2 秒
+RUNS = 10
+
+
+@pytest.fixture(scope="module")
+def report(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("HOME", str(tmp_path_factory.mktemp("home")))
+        compileall.compile_dir(str(PLUGIN_DIR / "lib"), maxlevels=0, quiet=2)
+        yield check_cold_start.check(RUNS)
+
+
+def test_empty_prompt_imports_no_heavy_modules(report):
+    assert report["modules"]["forbidden"] == []
+
+
+def test_import_time_within_budget(report):
+    imports = report["imports"]
+    assert imports["ok"], f"{imports['ms']} ms > {imports['budget_ms']} ms, slowest: {imports['slowest']}"
+
+
+def test_wall_time_within_budget(report):
+    wall = report["wall"]
+    assert wall["ok"], f"{wall['overhead_ms']} ms > {wall['budget_ms']} ms ({wall})"
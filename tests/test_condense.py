@@ -0,0 +1,110 @@
+"""lib/condense.py：日志压缩的确定性，以及不能丢掉的内容"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import PLUGIN_DIR
+from condense import CODE_MAX_LINES, condense_log, drop_chatter, is_chatter
+
+TRACEBACK = "\n".join(
+    ["Traceback (most recent call last):"]
+    + [f'  File "/app/mod{i}.py", line {i + 1}, in f{i}\n    f{i + 1}()' for i in range(12)]
+    + ["KeyError: 'DATABASE_URL'"]
+)
+
+
+def make_log(records) -> bytes:
+    return "\n".join(json.dumps(r, ensure_ascii=False) for r in records).encode("utf-8")
+
+
+def sample_log() -> bytes:
+    long_code = "\n".join(f"    step_{i} = run({i})" for i in range(CODE_MAX_LINES + 20))
+    return make_log([
+        {"role": "user", "content": "为什么 pytest 找不到 conftest.py？"},
+        {"role": "assistant", "content": "Let me check the file.", "used": ["Read"]},
+        {"role": "assistant", "content": "`rootdir` 是 /srv/app，conftest.py 需要放在 tests/ 下。\n\n"
+                                         "```ini\n[pytest]\ntestpaths = tests\n```", "used": ["Edit"]},
+        {"role": "user", "content": "为什么 pytest 找不到 conftest.py?"},
+        {"role": "user", "content": "启动时报错了"},
+        {"role": "assistant", "content": TRACEBACK, "used": ["Bash"]},
+        {"role": "assistant", "content": f"```python\ndef main():\n{long_code}\n```"},
+        {"role": "assistant", "content": "Error: ENOENT: no such file or directory, open '/etc/app/config.yml'"},
+        {"type": "session_summary", "tools": ["Bash", "Edit", "Read"], "project": "/srv/app",
+         "files": ["/srv/app/tests/conftest.py", "pytest.ini"]},
+    ])
+
+
+def test_output_is_deterministic_across_processes():
+    data = sample_log()
+    expected = condense_log(data, "s1")
+    assert condense_log(data, "s1") == expected
+
+    # 不同的 PYTHONHASHSEED（集合、字典的顺序不能影响输出）
+    code = ("import sys; sys.path.insert(0, 'lib'); from condense import condense_log; "
+            "sys.stdout.buffer.write(condense_log(sys.stdin.buffer.read(), 's1'))")
+    for seed in ("1", "2"):
+        result = subprocess.run([sys.executable, "-c", code], input=data, capture_output=True,
+                                cwd=PLUGIN_DIR, env=dict(os.environ, PYTHONHASHSEED=seed), check=True)
+        assert result.stdout == expected
+
+
+def test_keeps_code_errors_and_paths():
+    digest = condense_log(sample_log(), "s1").decode("utf-8")
+
+    # 短代码块原样保留，长代码块保留开头和结尾
+    assert "```ini\n[pytest]\ntestpaths = tests\n```" in digest
+    assert "step_0 = run(0)" in digest
+    assert f"step_{CODE_MAX_LINES + 19} = run({CODE_MAX_LINES + 19})" in digest
+    assert "lines omitted" in digest
+
+    # 调用栈截断，但保留异常本身和两端的帧
+    assert "KeyError: 'DATABASE_URL'" in digest
+    assert 'File "/app/mod0.py", line 1' in digest
+    assert "frames omitted" in digest
+
+    # 工具报错和文件路径
+    assert "Error: ENOENT: no such file or directory, open '/etc/app/config.yml'" in digest
+    assert "/srv/app" in digest
+    assert "files: /srv/app/tests/conftest.py, pytest.ini" in digest
+
+    # 重复提问合并，过渡句去掉
+    assert digest.count("为什么 pytest 找不到") == 1
+    assert "（重复 1 次）" in digest
+    assert "Let me check the file." not in digest
+    assert "*tools: Edit, Read*" in digest
+
+
+@pytest.mark.parametrize("text", [
+    "OkHttp needs a custom interceptor to retry on 503.",
+    "Surefire skips tests when skipTests is set.",
+    "Sure-fire fix: pin the plugin version.",
+    "Greatest common divisor is computed by math.gcd.",
+    "现在的默认端口是 8443，旧配置要改。",
+    "首先需要安装 libpq-dev。",
+    "我会在启动前检查 DATABASE_URL。",
+    "Let me check config.py first.",
+    "I'll run `npm test` with --runInBand.",
+    "Okay, the limit is 100 requests per minute.",
+])
+def test_keeps_answers_that_look_like_chatter(text):
+    assert not is_chatter(text)
+    answer, dropped = drop_chatter(text)
+    assert answer == text and dropped == 0
+
+
+@pytest.mark.parametrize("text", [
+    "Let me check the file.",
+    "Now let me run the tests.",
+    "I'll update the function now.",
+    "Perfect!",
+    "OK, got it.",
+    "好的，我先看一下配置。",
+    "让我确认一下。",
+])
+def test_drops_chatter(text):
+    answer, dropped = drop_chatter(f"{text}\n\nThe fix is to set `timeout=30`.")
+    assert answer == "The fix is to set `timeout=30`." and dropped == 1
@@ -0,0 +1,55 @@
+"""lib/daemon.py 和 lib/planner.py：常驻进程遵守 use_daemon，跨请求的缓存有上限并随索引失效"""
+
+import json
+import os
+
+import pytest
+
+import config
+import planner
+from daemon import SearchDaemon
+
+
+@pytest.fixture
+def write_config():
+    config.GANGSMEM_DIR.mkdir(parents=True, exist_ok=True)
+
+    def write(**values):
+        config.CONFIG_FILE.write_text(json.dumps(values))
+        # 同一秒内改写时 mtime 可能不变
+        stat = config.CONFIG_FILE.stat()
+        os.utime(config.CONFIG_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    yield write
+    config.CONFIG_FILE.unlink(missing_ok=True)
+
+
+def test_daemon_exits_when_disabled(write_config):
+    write_config(use_daemon=True)
+    daemon = SearchDaemon()
+    daemon.running = True
+    assert "output" in daemon.handle({"prompt": "nginx"})
+    assert daemon.running
+
+    write_config(use_daemon=False)
+    response = daemon.handle({"prompt": "nginx"})
+    assert "output" not in response and response["disabled"]
+    assert not daemon.running
+
+
+def test_terms_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(planner, "CACHE_SIZE", 10)
+    for i in range(50):
+        planner.lookup_terms([f"word{i}", "shared"])
+    assert len(planner._terms_cache) == 10
+    assert "shared" in planner._terms_cache  # 最近用过的保留
+
+
+def test_terms_cache_cleared_when_index_changes(monkeypatch):
+    key = [("db", 1)]
+    monkeypatch.setattr(planner, "_index_key", lambda: tuple(key))
+    planner.lookup_terms(["running"])
+    assert "running" in planner._terms_cache
+    key.append(("wal", 2))
+    planner.lookup_terms(["nginx"])
+    assert list(planner._terms_cache) == ["nginx"]
@@ -0,0 +1,72 @@
+"""lib/db.py 的单篇写入接口：持有索引写锁，写入的文档在下次增量重建时按文件重新索引"""
+
+import json
+import shutil
+import threading
+
+import pytest
+
+import db
+from rebuild_index import load_document, rebuild_index
+
+
+@pytest.fixture
+def memory_dir():
+    shutil.rmtree(db.GANGSMEM_DIR, ignore_errors=True)
+    db.MEMORY_DIR.mkdir(parents=True)
+    (db.MEMORY_DIR / "a.md").write_text("---\nid: a\ntitle: Alpha\n---\n\nuse pgbouncer for pooling\n")
+    (db.MEMORY_DIR / "b.md").write_text("---\nid: b\ntitle: Beta\n---\n\nrestart nginx after reload\n")
+    rebuild_index()
+    return db.MEMORY_DIR
+
+
+def ids(query: str):
+    return [r["id"] for r in db.search(query)]
+
+
+def manifest_files():
+    return json.loads(db.MANIFEST_PATH.read_text())["files"]
+
+
+def test_index_document_waits_for_index_lock(memory_dir):
+    doc = load_document(memory_dir / "a.md", (memory_dir / "a.md").read_text())
+    done = threading.Event()
+    with db.index_lock():
+        thread = threading.Thread(target=lambda: (db.index_document(doc), done.set()))
+        thread.start()
+        assert not done.wait(0.3)
+    thread.join(5)
+    assert done.is_set()
+
+
+def test_index_document_is_reconciled_with_file(memory_dir):
+    # 写入的内容与文件不同：清单中的条目标记为已修改，下次增量重建按文件恢复
+    doc = dict(load_document(memory_dir / "a.md", (memory_dir / "a.md").read_text()),
+               content="use haproxy", summary="use haproxy")
+    assert db.index_document(doc)
+    assert ids("haproxy") == ["a"] and ids("pgbouncer") == []
+    assert manifest_files()["a.md"]["hash"] is None
+
+    rebuild_index()
+    assert ids("pgbouncer") == ["a"] and ids("haproxy") == []
+    assert manifest_files()["a.md"]["hash"] is not None
+
+
+def test_new_document_is_removed_with_its_file(memory_dir):
+    (memory_dir / "c.md").write_text("---\nid: c\ntitle: Gamma\n---\n\ntune vacuum settings\n")
+    assert db.index_document(load_document(memory_dir / "c.md", (memory_dir / "c.md").read_text()))
+    assert ids("vacuum") == ["c"]
+    (memory_dir / "c.md").unlink()
+    rebuild_index()
+    assert ids("vacuum") == []
+
+
+def test_delete_and_clear(memory_dir):
+    assert db.delete_document("b")
+    assert ids("nginx") == []
+    rebuild_index()  # 文件还在：按文件重新索引
+    assert ids("nginx") == ["b"]
+
+    assert db.clear_all()
+    assert not db.MANIFEST_PATH.exists()
+    assert rebuild_index() == 2
@@ -0,0 +1,30 @@
+"""lib/db.py：注入片段以查询的命中词为中心（包括只命中中文 n-gram 的查询）"""
+
+import pytest
+
+import db
+
+FILLER = "这里是一些无关的背景说明文字，" * 10
+TEXT = f"# 笔记\n\n## 部署\n\n{FILLER}线上数据库连接池耗尽时需要调大 max_connections 参数。\n"
+
+
+@pytest.fixture
+def memory_dir(tmp_path, monkeypatch):
+    (tmp_path / "a.md").write_text(TEXT, encoding="utf-8")
+    monkeypatch.setattr(db, "MEMORY_DIR", tmp_path)
+    return tmp_path
+
+
+def excerpt(query: str) -> str:
+    results = [{"path": "a.md", "part": 0, "section": "部署"}]
+    db._add_excerpts(query, results, 60)
+    return results[0]["excerpt"]
+
+
+@pytest.mark.parametrize("query", ["max_connections", "数据库 OR 连接池", '"连接池"', "连接池 OR nomatch"])
+def test_excerpt_centred_on_match(memory_dir, query):
+    assert "数据库连接池耗尽" in excerpt(query)
+
+
+def test_excerpt_without_match_starts_at_section(memory_dir):
+    assert excerpt('"不存在的"').startswith(FILLER[:20])
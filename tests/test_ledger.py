@@ -0,0 +1,85 @@
+"""lib/ledger.py：领取、领取超时后的重新领取和尝试次数上限"""
+
+import time
+
+import pytest
+
+from ledger import DONE, FAILED, PENDING, RUNNING, STALE_SECONDS, Ledger
+from logstore import LogEntry
+
+KEYS = ["2026-01-01/10-00-00_a.jsonl", "2026-01-01/11-00-00_b.jsonl"]
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = Ledger(tmp_path / "state.db")
+    ledger.register(LogEntry(*key.split("/"), 0.0, None) for key in KEYS)
+    yield ledger
+    ledger.close()
+
+
+def expire_claims(ledger: Ledger):
+    """把领取时间改到 STALE_SECONDS 之前（模拟分析进程中断）"""
+    ledger.conn.execute("UPDATE analyses SET claimed = ? WHERE status = ?",
+                        (time.time() - STALE_SECONDS - 1, RUNNING))
+
+
+def test_claim_is_exclusive(ledger):
+    assert ledger.claim(KEYS, "w1") == KEYS
+    assert ledger.claim(KEYS, "w2") == []
+    assert ledger.count_pending() == 0
+    assert set(ledger.statuses().values()) == {RUNNING}
+
+
+def test_release_and_finish(ledger):
+    ledger.claim(KEYS, "w1")
+    ledger.release([KEYS[0]])
+    ledger.finish([KEYS[1]], True)
+    assert ledger.statuses() == {KEYS[0]: PENDING, KEYS[1]: DONE}
+    assert [key for key, _ in ledger.iter_pending()] == [KEYS[0]]
+    # release 不计入尝试次数
+    assert ledger.conn.execute("SELECT attempts FROM analyses WHERE log_key = ?", (KEYS[0],)).fetchone()[0] == 0
+
+
+def test_stale_claim_is_recovered(ledger):
+    ledger.claim([KEYS[0]], "w1")
+    assert ledger.claim([KEYS[0]], "w2") == []
+    expire_claims(ledger)
+    assert [key for key, _ in ledger.iter_pending()] == KEYS
+    assert ledger.claim([KEYS[0]], "w2") == [KEYS[0]]
+
+
+def test_failed_is_retried_until_max_attempts(ledger):
+    for _ in range(3):
+        assert ledger.claim([KEYS[0]], "w1", max_attempts=3) == [KEYS[0]]
+        ledger.finish([KEYS[0]], False, "boom")
+    assert ledger.claim([KEYS[0]], "w1", max_attempts=3) == []
+    assert ledger.count_pending(max_attempts=3) == 1
+
+
+def test_stale_claim_respects_max_attempts(ledger):
+    # 每次都让分析进程中断的日志：达到上限后不再领取，记为失败，后面的日志照常领取
+    for _ in range(3):
+        assert ledger.claim([KEYS[0]], "w1", max_attempts=3) == [KEYS[0]]
+        expire_claims(ledger)
+    assert ledger.count_pending(max_attempts=3) == 1
+    assert [key for key, _ in ledger.iter_pending(max_attempts=3)] == [KEYS[1]]
+    assert ledger.claim(KEYS, "w2", max_attempts=3) == [KEYS[1]]
+    assert ledger.statuses()[KEYS[0]] == FAILED
+
+
+def test_discover_rescans_day_before_watermark(tmp_path, ledger):
+    logs_dir = tmp_path / "logs"
+    for key in ("2026-01-01/09-00-00_old.jsonl", "2026-01-02/09-00-00_c.jsonl"):
+        (logs_dir / key).parent.mkdir(parents=True, exist_ok=True)
+        (logs_dir / key).write_text("{}\n")
+    ledger.discover(logs_dir)
+
+    # 跨过午夜的 session 结束时写入前一天的分区（后一天的分区已经存在）
+    (logs_dir / "2026-01-01/23-50-00_late.jsonl").write_text("{}\n")
+    # 更早的分区不再扫描
+    (logs_dir / "2025-12-31/23-00-00_older.jsonl").parent.mkdir()
+    (logs_dir / "2025-12-31/23-00-00_older.jsonl").write_text("{}\n")
+    assert ledger.discover(logs_dir) == 1
+    assert "2026-01-01/23-50-00_late.jsonl" in ledger.statuses()
+    assert ledger.discover(logs_dir, rescan=True) == 1
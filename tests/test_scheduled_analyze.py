@@ -0,0 +1,74 @@
+"""scripts/scheduled_analyze.py：一个日志读不出来时，其他日志照常分析"""
+
+import json
+
+import pytest
+
+import scheduled_analyze
+from batching import BatchPlanner
+from condense import condense_log
+from ledger import DONE, FAILED, Ledger
+from logstore import roll_day, segment_path
+
+
+def write_log(logs_dir, key: str):
+    path = logs_dir / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"role": "user", "content": f"question in {key}"}) + "\n")
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    logs_dir = tmp_path / "logs"
+    # 最早的日志归档后损坏（解压失败）
+    write_log(logs_dir, "2026-01-01/10-00-00_bad.jsonl")
+    roll_day("2026-01-01", logs_dir)
+    segment_path("2026-01-01", logs_dir).write_bytes(b"not gzip" * 16)
+    write_log(logs_dir, "2026-01-02/10-00-00_good1.jsonl")
+    write_log(logs_dir, "2026-01-02/11-00-00_good2.jsonl")
+
+    analyzed = []
+
+    def analyze_batch(batch, worker, condensed, top_k):
+        analyzed.extend(item.entry.key for item in batch)
+        return scheduled_analyze.BatchResult(True)
+
+    monkeypatch.setattr(scheduled_analyze, "LOGS_DIR", logs_dir)
+    monkeypatch.setattr(scheduled_analyze, "analyze_batch", analyze_batch)
+    ledger = Ledger(tmp_path / "state.db")
+    yield tmp_path, ledger, analyzed
+    ledger.close()
+
+
+def test_unreadable_log_fails_and_others_are_analyzed(setup):
+    tmp_path, ledger, analyzed = setup
+    planner = BatchPlanner(
+        scheduled_analyze.get_pending_logs(ledger),
+        lambda key: bool(ledger.claim([key], "test")),
+        1 << 20, 1, scheduled_analyze.LOGS_DIR, tmp_path / "extract",
+        condense=condense_log, fail=lambda key, error: ledger.finish([key], False, error),
+    )
+
+    stats = scheduled_analyze.drain(planner, ledger, workers=1, time_budget=60, condensed=True)
+
+    assert analyzed == ["2026-01-02/10-00-00_good1.jsonl", "2026-01-02/11-00-00_good2.jsonl"]
+    assert stats.sessions == 2
+    assert ledger.statuses() == {
+        "2026-01-01/10-00-00_bad.jsonl": FAILED,
+        "2026-01-02/10-00-00_good1.jsonl": DONE,
+        "2026-01-02/11-00-00_good2.jsonl": DONE,
+    }
+
+
+def test_index_rebuilt_when_only_failed_batches_ran(monkeypatch):
+    # 失败的批次也可能已经修改了记忆文档
+    write_log(scheduled_analyze.LOGS_DIR, "2026-01-03/10-00-00_s1.jsonl")
+    monkeypatch.setattr(scheduled_analyze, "analyze_batch",
+                        lambda batch, worker, condensed, top_k: scheduled_analyze.BatchResult(False, "boom"))
+    rebuilt = []
+    monkeypatch.setattr(scheduled_analyze, "rebuild_search_index", lambda: rebuilt.append(True))
+    monkeypatch.setattr(scheduled_analyze.sys, "argv", ["scheduled_analyze.py", "--budget", "0"])
+
+    scheduled_analyze.main()
+
+    assert rebuilt == [True]
@@ -0,0 +1,30 @@
+"""lib/transcript.py：工具返回结果不进入捕获，和它一起发送的用户输入保留"""
+
+import json
+
+from transcript import parse_transcript_simplified
+
+
+def user(content, spaced=False):
+    record = {"type": "user", "message": {"role": "user", "content": content}}
+    return json.dumps(record, ensure_ascii=False, separators=(", ", ": ") if spaced else (",", ":"))
+
+
+def test_user_text_sent_with_tool_result_is_kept(tmp_path):
+    payload = 'file contents with "text" and {"type":"text"} inside\n' * 100
+    path = tmp_path / "t.jsonl"
+    path.write_text("\n".join([
+        user("为什么测试失败？"),
+        user([{"type": "tool_result", "tool_use_id": "u1", "content": payload}]),
+        user([{"tool_use_id": "u2", "type": "tool_result", "content": payload},
+              {"type": "text", "text": "别改这个文件，改 conftest.py"}]),
+        user([{"type": "tool_result", "tool_use_id": "u3", "content": [{"type": "text", "text": payload}]}],
+             spaced=True),
+    ]) + "\n")
+
+    messages = [m for m in parse_transcript_simplified(str(path)) if m.get("role") == "user"]
+
+    assert [m["content"] for m in messages] == [
+        "为什么测试失败？",
+        [{"type": "text", "text": "别改这个文件，改 conftest.py"}],
+    ]